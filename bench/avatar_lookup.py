@@ -0,0 +1,170 @@
+"""
+Throughput benchmark for avatar blocklist lookups
+
+Builds an AvatarBlocklist of random 64-bit hashes (in families of
+near-duplicates, like re-encoded copies of one spam avatar) and measures:
+
+    - lookups/s and p50/p99 latency of the multi-index table against a linear scan,
+      for near-duplicate queries (should match) and unrelated ones (should not)
+    - photos/s for compute_hashes on 160x160 JPEG thumbnails
+
+No MongoDB or Telegram connection is needed; Pillow is.
+
+Usage:
+    python -m bench.avatar_lookup
+    python -m bench.avatar_lookup --entries 100000 --queries 20000 --json avatar.json
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+import time
+
+from helper.avatar_hash import HASHING_AVAILABLE, AvatarBlocklist, compute_hashes, hamming
+
+import config
+
+
+def _flip_bits(rng: random.Random, value: int, bits: int) -> int:
+    for position in rng.sample(range(64), bits):
+        value ^= 1 << position
+    return value
+
+
+def build_blocklist(rng: random.Random, entries: int, family_size: int):
+    blocklist = AvatarBlocklist()
+    originals = []
+    while len(blocklist) < entries:
+        phash, dhash = rng.getrandbits(64), rng.getrandbits(64)
+        originals.append((phash, dhash))
+        for member in range(family_size):
+            blocklist.add(_flip_bits(rng, phash, rng.randint(0, 3)) if member else phash,
+                          _flip_bits(rng, dhash, rng.randint(0, 3)) if member else dhash,
+                          f"family {len(originals)}")
+    return blocklist, originals
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _time_lookups(lookup, queries: list) -> dict:
+    latencies = []
+    matched = 0
+    started = time.perf_counter()
+    for phash, dhash in queries:
+        call_started = time.perf_counter()
+        if lookup(phash, dhash) is not None:
+            matched += 1
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    return {
+        'lookups_per_second': round(len(queries) / elapsed),
+        'p50_us': round(_percentile(latencies, 0.5) * 1e6, 1),
+        'p99_us': round(_percentile(latencies, 0.99) * 1e6, 1),
+        'matched': matched,
+    }
+
+
+def bench_lookups(entries: int, queries: int, family_size: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    phash_distance, dhash_distance = config.AVATAR_PHASH_DISTANCE, config.AVATAR_DHASH_DISTANCE
+
+    started = time.perf_counter()
+    blocklist, originals = build_blocklist(rng, entries, family_size)
+    build_seconds = time.perf_counter() - started
+
+    near = [(_flip_bits(rng, phash, rng.randint(0, phash_distance // 2)),
+             _flip_bits(rng, dhash, rng.randint(0, dhash_distance // 2)))
+            for phash, dhash in (rng.choice(originals) for _ in range(queries // 2))]
+    unrelated = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(queries - len(near))]
+
+    def index_lookup(phash, dhash):
+        return blocklist.match(phash, dhash, phash_distance, dhash_distance)
+
+    flat = list(blocklist._entries.items())
+
+    def linear_lookup(phash, dhash):
+        for stored, (stored_dhash, label) in flat:
+            if hamming(phash, stored) <= phash_distance and hamming(dhash, stored_dhash) <= dhash_distance:
+                return label
+        return None
+
+    linear_queries = max(1, min(len(near), 200))
+    return {
+        'entries': len(blocklist),
+        'build_seconds': round(build_seconds, 3),
+        'multi_index': {
+            'near_duplicates': _time_lookups(index_lookup, near),
+            'unrelated': _time_lookups(index_lookup, unrelated),
+        },
+        'linear_scan': {
+            'near_duplicates': _time_lookups(linear_lookup, near[:linear_queries]),
+            'unrelated': _time_lookups(linear_lookup, unrelated[:linear_queries]),
+        },
+    }
+
+
+def bench_hashing(photos: int, seed: int) -> dict:
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    thumbnails = []
+    for _ in range(min(photos, 50)):
+        # Smooth random images compress and hash like real avatars, unlike pure noise
+        small = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        image = Image.fromarray(small).resize((160, 160), Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        thumbnails.append(buffer.getvalue())
+
+    started = time.perf_counter()
+    for index in range(photos):
+        compute_hashes(thumbnails[index % len(thumbnails)])
+    elapsed = time.perf_counter() - started
+    return {
+        'photos': photos,
+        'photos_per_second': round(photos / elapsed),
+        'ms_per_photo': round(elapsed / photos * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=50000, help="Blocked avatars in the index")
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--family-size', type=int, default=5, help="Near-duplicate entries per original avatar")
+    parser.add_argument('--photos', type=int, default=2000, help="Thumbnails to hash")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args()
+
+    if not HASHING_AVAILABLE:
+        print("Pillow is required", file=sys.stderr)
+        sys.exit(1)
+
+    result = {
+        'lookups': bench_lookups(args.entries, args.queries, args.family_size, args.seed),
+        'hashing': bench_hashing(args.photos, args.seed),
+    }
+
+    lookups = result['lookups']
+    print(f"=== {lookups['entries']} blocked avatars (built in {lookups['build_seconds']}s) ===")
+    for index_name in ('multi_index', 'linear_scan'):
+        for query_kind, stats in lookups[index_name].items():
+            print(f"{index_name:12} {query_kind:16} {stats['lookups_per_second']:>9}/s  "
+                  f"p50 {stats['p50_us']:>8}us  p99 {stats['p99_us']:>8}us  matched {stats['matched']}")
+    hashing = result['hashing']
+    print(f"hashing      {hashing['photos_per_second']:>9} photos/s  ({hashing['ms_per_photo']}ms per photo)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark and equivalence check for batch channel scoring
+
+Generates random channel signals and scores them with the original
+hand-written rules of check_if_nsfw_channel and is_suspicious_channel
+(reproduced below), one channel at a time, and with helper.channel_scoring
+using the default NSFW_SCORE_WEIGHTS, one channel per call and in batches.
+Fails if any verdict, score or reason differs from the original rules.
+
+Also trains a logistic model on the rule verdicts and times model scoring
+one channel per call against batches. Reports channels/s for every mode.
+
+Usage:
+    python -m bench.channel_scoring
+    python -m bench.channel_scoring --channels 100000 --batch 5000
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from helper.channel_scoring import (
+    ChannelFeatures, score_nsfw, score_structure, feature_matrix, train_model, _score_model
+)
+from helper.models import NsfwVerdict
+
+
+def reference_nsfw(features: ChannelFeatures) -> NsfwVerdict:
+    """check_if_nsfw_channel's scoring, one channel at a time"""
+    reasons = []
+    confidence_score = 0
+    for keyword in features.title_keywords:
+        reasons.append(f"Title contains: '{keyword}'")
+        confidence_score += 2
+    for keyword in features.description_keywords:
+        reasons.append(f"Description contains: '{keyword}'")
+        confidence_score += 1
+    if features.protected:
+        reasons.append("Protected content enabled")
+        confidence_score += 1
+    if features.history_checked > 0:
+        nsfw_ratio = (features.media_messages + features.keyword_messages) / features.history_checked
+        if nsfw_ratio > 0.5:
+            reasons.append(f"High NSFW content ratio ({int(nsfw_ratio*100)}%)")
+            confidence_score += 3
+        elif nsfw_ratio > 0.3:
+            reasons.append(f"Moderate NSFW content ratio ({int(nsfw_ratio*100)}%)")
+            confidence_score += 1
+
+    if confidence_score >= 5:
+        confidence = "high"
+    elif confidence_score >= 3:
+        confidence = "medium"
+    elif confidence_score >= 1:
+        confidence = "low"
+    else:
+        confidence = "none"
+    return NsfwVerdict(confidence_score > 0, confidence, confidence_score, reasons)
+
+
+def reference_structure(features: ChannelFeatures, threshold_members: int = 100) -> tuple:
+    """is_suspicious_channel, one channel at a time"""
+    reasons = []
+    if features.members_count < threshold_members:
+        reasons.append(f"Low member count ({features.members_count})")
+    if features.reacted_messages > 0:
+        if features.avg_reactions > features.members_count * 0.5:
+            reasons.append("Unusually high reaction rate")
+    if features.recent_joins > features.members_count * 0.3:
+        reasons.append("Rapid member growth detected")
+    return len(reasons) > 0, reasons
+
+
+def random_channels(rng: random.Random, count: int, nsfw_share: float) -> list:
+    keywords = ('nsfw', '18+', 'adult', 'xxx', 'nude')
+    channels = []
+    for channel_id in range(count):
+        checked = rng.choice((0, 5, 10, 20, 20, 20))
+        reacted = rng.randint(0, 10)
+        if rng.random() < nsfw_share:
+            media = rng.randint(0, checked)
+            signals = dict(
+                title_keywords=rng.sample(keywords, rng.choice((0, 1, 2))),
+                description_keywords=rng.sample(keywords, rng.choice((0, 1, 3))),
+                protected=rng.random() < 0.5,
+                keyword_messages=rng.randint(0, checked - media) if checked else 0
+            )
+        else:
+            media = rng.randint(0, checked // 4)
+            signals = {}
+        channels.append(ChannelFeatures(
+            -1001000000000 - channel_id,
+            history_checked=checked,
+            media_messages=media,
+            **signals,
+            members_count=rng.choice((0, 3, 40, 99, 100, 500, 20000)),
+            reacted_messages=reacted,
+            avg_reactions=rng.uniform(0, 300) if reacted else 0.0,
+            recent_joins=rng.randint(0, 200)
+        ))
+    return channels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channels', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=1000, help="Channels per score_nsfw/score_structure call")
+    parser.add_argument('--nsfw-share', type=float, default=0.1, help="Share of channels with NSFW signals")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    channels = random_channels(random.Random(args.seed), args.channels, args.nsfw_share)
+
+    def timed(func):
+        started = time.perf_counter()
+        result = func()
+        return result, len(channels) / (time.perf_counter() - started)
+
+    def batched(size: int, score):
+        results = []
+        for offset in range(0, len(channels), size):
+            results.extend(score(channels[offset:offset + size]))
+        return results
+
+    (expected_nsfw, expected_structure), reference_rate = timed(lambda: (
+        [reference_nsfw(channel) for channel in channels],
+        [reference_structure(channel) for channel in channels]
+    ))
+
+    def engine(size: int):
+        return batched(size, score_nsfw), batched(size, score_structure)
+
+    rates = {'original rules, per channel': reference_rate}
+    (single_nsfw, single_structure), rates['engine rules, 1 per call'] = timed(lambda: engine(1))
+    (nsfw, structure), rates[f'engine rules, {args.batch} per call'] = timed(lambda: engine(args.batch))
+
+    mismatches = 0
+    for results_nsfw, results_structure in ((single_nsfw, single_structure), (nsfw, structure)):
+        mismatches += sum(1 for verdict, expected in zip(results_nsfw, expected_nsfw)
+                          if verdict.to_tuple() != expected.to_tuple())
+        mismatches += sum(1 for result, expected in zip(results_structure, expected_structure) if result != expected)
+
+    model = train_model(feature_matrix(channels), [verdict.is_nsfw for verdict in expected_nsfw])
+    _, rates['model, 1 per call'] = timed(lambda: batched(1, lambda batch: _score_model(feature_matrix(batch), model)))
+    _, rates[f'model, {args.batch} per call'] = timed(
+        lambda: batched(args.batch, lambda batch: _score_model(feature_matrix(batch), model)))
+
+    print(f"=== {len(channels)} channels, {args.nsfw_share:.0%} with NSFW signals ===")
+    for mode, rate in rates.items():
+        print(f"{mode:32} {rate:>10.0f} channels/s")
+    print(f"{'model training accuracy':32} {model['training_accuracy']:>10.1%}")
+    print(f"{'mismatches with original rules':32} {mismatches:>10}")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
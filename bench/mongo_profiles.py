@@ -0,0 +1,171 @@
+"""
+MongoDB operations/s per write concern profile
+
+Runs the bot's hot write patterns against a real MongoDB with each profile
+of helper.utils.WRITE_CONCERNS and reports ops/s with p50/p99 latency:
+
+    - insert: one activity-like document per operation
+    - activity, per record: insert_one plus the rollup upsert (the old
+      track_user_activity path) against the batched insert_many + merged
+      rollup bulk_write used by flush_activity
+    - warning: update_one followed by find_one (the old increment_warning)
+      against a single find_one_and_update
+
+MongoDB is required: BENCH_MONGO_URI (default mongodb://localhost:27017),
+database bench_mongo_profiles, which is dropped first. 'majority' only
+differs from 'acknowledged' on a replica set.
+
+Usage:
+    python -m bench.mongo_profiles
+    python -m bench.mongo_profiles --ops 20000 --concurrency 64 --pool 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+import config
+from helper.utils import WRITE_CONCERNS, _rollup_updates
+
+BENCH_DB_NAME = 'bench_mongo_profiles'
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def _timed(operation, count: int, concurrency: int, per_operation: int = 1) -> dict:
+    """Run operation(index) `count` times from `concurrency` coroutines"""
+    latencies = []
+    next_index = iter(range(count))
+
+    async def runner():
+        for index in next_index:
+            started = time.perf_counter()
+            await operation(index)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(runner() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'ops_per_second': round(count * per_operation / elapsed),
+        'p50_ms': round(_percentile(latencies, 0.5) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def _activity_doc(rng: random.Random) -> dict:
+    return {
+        'chat_id': -1001000000000 - rng.randint(0, 20),
+        'user_id': rng.randint(1, 5000),
+        'activity_type': rng.choice(('message', 'message', 'reaction', 'join')),
+        'details': "bench",
+        'timestamp': datetime.now(),
+    }
+
+
+async def bench_profile(db, profile: str, ops: int, concurrency: int, batch_size: int, rng: random.Random) -> dict:
+    write_concern = WRITE_CONCERNS[profile]
+    inserts = db.get_collection(f'insert_{profile}', write_concern=write_concern)
+    activity = db.get_collection(f'activity_{profile}', write_concern=write_concern)
+    rollups = db.get_collection(f'rollups_{profile}', write_concern=write_concern)
+    warnings = db.get_collection(f'warnings_{profile}', write_concern=write_concern)
+    await rollups.create_index([('chat_id', 1), ('user_id', 1), ('hour', 1)], unique=True)
+    await warnings.create_index([('chat_id', 1), ('user_id', 1)], unique=True)
+
+    async def insert(_):
+        await inserts.insert_one(_activity_doc(rng))
+
+    async def activity_per_record(_):
+        doc = _activity_doc(rng)
+        await activity.insert_one(doc)
+        await rollups.bulk_write(_rollup_updates([doc]))
+
+    async def activity_batched(_):
+        docs = [_activity_doc(rng) for _ in range(batch_size)]
+        await activity.insert_many(docs, ordered=False)
+        await rollups.bulk_write(_rollup_updates(docs), ordered=False)
+
+    def warning_key():
+        return {'chat_id': -1001000000000, 'user_id': rng.randint(1, 500)}
+
+    async def warning_two_trips(_):
+        key = warning_key()
+        await warnings.update_one(key, {'$inc': {'count': 1}}, upsert=True)
+        await warnings.find_one(key)
+
+    async def warning_atomic(_):
+        await warnings.find_one_and_update(warning_key(), {'$inc': {'count': 1}},
+                                           projection={'_id': 0, 'count': 1}, upsert=True,
+                                           return_document=ReturnDocument.AFTER)
+
+    batches = max(1, ops // batch_size)
+    return {
+        'insert': await _timed(insert, ops, concurrency),
+        'activity_per_record': await _timed(activity_per_record, ops, concurrency),
+        f'activity_batched_{batch_size}': await _timed(activity_batched, batches, min(concurrency, batches),
+                                                      per_operation=batch_size),
+        # A 'fast' update cannot be read back reliably, so warnings are only timed on acknowledged profiles
+        **({} if profile == 'fast' else {
+            'warning_update_then_find': await _timed(warning_two_trips, ops, concurrency),
+            'warning_find_one_and_update': await _timed(warning_atomic, ops, concurrency),
+        }),
+    }
+
+
+async def run(args) -> dict:
+    client = AsyncIOMotorClient(
+        os.environ.get('BENCH_MONGO_URI', 'mongodb://localhost:27017'),
+        maxPoolSize=args.pool,
+        serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    )
+    await client.drop_database(BENCH_DB_NAME)
+    db = client[BENCH_DB_NAME]
+    rng = random.Random(args.seed)
+
+    results = {}
+    for profile in args.profiles or list(WRITE_CONCERNS):
+        results[profile] = await bench_profile(db, profile, args.ops, args.concurrency, args.batch, rng)
+    await client.drop_database(BENCH_DB_NAME)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('profiles', nargs='*', help=f"Profiles to run (default: all of {', '.join(WRITE_CONCERNS)})")
+    parser.add_argument('--ops', type=int, default=5000, help="Operations per pattern")
+    parser.add_argument('--concurrency', type=int, default=32, help="Coroutines issuing operations")
+    parser.add_argument('--pool', type=int, default=config.MONGO_MAX_POOL_SIZE, help="maxPoolSize of the client")
+    parser.add_argument('--batch', type=int, default=config.ACTIVITY_WRITE_BATCH_SIZE, help="Activity batch size")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.profiles if name not in WRITE_CONCERNS]
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(unknown)}")
+
+    results = asyncio.run(run(args))
+    for profile, patterns in results.items():
+        print(f"=== {profile} ({WRITE_CONCERNS[profile].document or 'server default'}) ===")
+        for pattern, stats in patterns.items():
+            print(f"  {pattern:<30} {stats['ops_per_second']:>8}/s  p50 {stats['p50_ms']:>7}ms  "
+                  f"p99 {stats['p99_ms']:>7}ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
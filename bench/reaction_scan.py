@@ -0,0 +1,119 @@
+"""
+Benchmark for the bulk /scanreactions against the simulated Telegram API
+
+Posts N messages to a simulated group, with reactions mostly from a small
+set of active members (as in real chats), and runs run_reaction_scan over
+them. Reports messages/s, unique reactors/s, reactions per unique reactor
+(the duplicate scans the deduplication avoids) and API calls by method.
+
+With --baseline the same messages are then walked the old way: one
+message at a time through scan_message_reactions (refetching each message),
+scanning every reactor it returns before moving on.
+
+MongoDB is required, as for bench.run_scenarios.
+
+Usage:
+    python -m bench.reaction_scan
+    python -m bench.reaction_scan --messages 2000 --members 5000 --baseline
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import config
+
+config.MONGO_URI = os.environ.get('BENCH_MONGO_URI', 'mongodb://localhost:27017')
+config.MONGO_DB_NAME = 'bench_bot_db'
+
+from helper.utils import mongo_client, ensure_indexes, set_debug_logging
+from helper.channel_checker import scan_message_reactions
+from helper.reaction_scan import run_reaction_scan
+from helper.scanner import scan_user
+
+from bench.telegram_sim import SimWorld, SimulatedTelegram, FaultProfile
+
+CHAT_ID = -1001
+EMOJIS = ('👍', '❤', '🔥', '😂')
+
+
+def build_group(world: SimWorld, rng: random.Random, members: int, messages: int, active_share: float,
+                reactions_per_message: int):
+    group = world.add_group(CHAT_ID, "Bench group")
+    group.members = [world.add_user() for _ in range(members)]
+    active = group.members[:max(1, int(members * active_share))]
+    for _ in range(messages):
+        reactors = {}
+        for _ in range(rng.randint(0, 2 * reactions_per_message)):
+            user_id = rng.choice(active) if rng.random() < 0.8 else rng.choice(group.members)
+            reactors.setdefault(rng.choice(EMOJIS), []).append(user_id)
+        world.add_group_message(CHAT_ID, rng.choice(group.members),
+                                {emoji: list(dict.fromkeys(user_ids)) for emoji, user_ids in reactors.items()})
+
+
+async def baseline(client: SimulatedTelegram, message_ids: list) -> dict:
+    scans = 0
+    for message_id in message_ids:
+        for user_id in await scan_message_reactions(client, CHAT_ID, message_id):
+            await scan_user(client, CHAT_ID, user_id, f"User {user_id}", 'reaction')
+            scans += 1
+    return {'scans': scans}
+
+
+async def run(args) -> dict:
+    set_debug_logging(False)
+    rng = random.Random(args.seed)
+    world = SimWorld(args.seed)
+    build_group(world, rng, args.members, args.messages, args.active_share, args.reactions)
+    message_ids = sorted(world.groups[CHAT_ID].messages, reverse=True)
+
+    results = {}
+    # Bulk first: it skips users with a fresh verdict, which the baseline would leave in the verdict cache
+    modes = (('bulk', lambda client: run_reaction_scan(client, CHAT_ID, args.messages)),)
+    if args.baseline:
+        modes += (('baseline', lambda client: baseline(client, message_ids)),)
+    for mode, scan in modes:
+        await mongo_client.drop_database(config.MONGO_DB_NAME)
+        await ensure_indexes()
+        client = SimulatedTelegram(world, FaultProfile(), args.seed)
+
+        started = time.monotonic()
+        state = await scan(client)
+        elapsed = time.monotonic() - started
+        results[mode] = {
+            'seconds': round(elapsed, 1),
+            'profile_scans': state['scans'] if mode == 'baseline' else state['scanned'],
+            'api_calls': sum(client.calls.values()),
+            'api_calls_by_method': dict(client.calls),
+            'flood_waits': sum(client.flood_waits.values()),
+        }
+        if mode == 'bulk':
+            results[mode].update({
+                'messages_per_second': round(state['messages'] / elapsed, 1),
+                'unique_reactors': state['unique'],
+                'reactors_per_second': round(state['unique'] / elapsed, 2),
+                'reactions_per_unique_reactor': round(state['reactions'] / max(state['unique'], 1), 2),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--members', type=int, default=2000)
+    parser.add_argument('--active-share', type=float, default=0.1, help="Share of members who react most")
+    parser.add_argument('--reactions', type=int, default=3, help="Mean reactions per message")
+    parser.add_argument('--baseline', action='store_true', help="Also time the per-message flow")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for mode, stats in asyncio.run(run(args)).items():
+        print(f"=== {mode} ===")
+        for key, value in stats.items():
+            print(f"  {key:<30} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Benchmark scenarios for the verdict pipeline against the simulated Telegram API
+
+Drives the same calls as the handlers in bio.py (join checks, sampled message
+and reaction scans) through a pool of update workers, like Pyrogram's
+dispatcher, and reports per scenario:
+
+    - verdict latency (update received -> verdict) for joins and scans
+    - time from join to action for suspicious joiners, and how many were caught
+    - Telegram API calls per verdict, FloodWaits and server errors
+    - dropped work: updates still queued at the end, scans shed under load,
+      partial (deadline) and incomplete (retry queued) verdicts, failures
+
+Every scenario runs in its own process so caches and counters start cold.
+MongoDB is required: BENCH_MONGO_URI (default mongodb://localhost:27017),
+database bench_bot_db, which is dropped before every scenario.
+
+Usage:
+    python -m bench.run_scenarios                      # all scenarios
+    python -m bench.run_scenarios raid --seed 7
+    python -m bench.run_scenarios --json after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import config
+
+config.MONGO_URI = os.environ.get('BENCH_MONGO_URI', 'mongodb://localhost:27017')
+config.MONGO_DB_NAME = 'bench_bot_db'
+
+from helper.utils import (
+    mongo_client, ensure_indexes, set_debug_logging, run_activity_flusher,
+    track_user_activity, is_whitelisted, record_verdict, check_user_comprehensive
+)
+from helper.sampler import should_scan_user, note_join
+from helper.scanner import analyze_profile, scan_user, late_escalation, inflight_analyses, analysis_dedup_stats
+from helper.moderation import decide_action, enforce_verdict, executor
+from helper.overload import run_overload_monitor, overload_stats
+from helper.fair_scheduler import scheduler_stats
+from helper.trace import record_decision, run_trace_writer, trace_stats
+from helper.claims import acquire_claim, finish_claim
+from helper.runtime_config import get_setting
+
+from bench.telegram_sim import SimWorld, SimulatedTelegram, FaultProfile
+
+# Pyrogram's default number of update workers
+UPDATE_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Seconds the queue may take to drain after the traffic stops
+DRAIN_SECONDS = 30
+
+SCENARIOS = {
+    'steady': {
+        'description': "Three groups with steady joins, messages and reactions",
+        'duration': 30,
+        'groups': [
+            {'chat_id': -1001, 'members': 400, 'joins': 0.3, 'messages': 4, 'reactions': 1},
+            {'chat_id': -1002, 'members': 150, 'joins': 0.2, 'messages': 2, 'reactions': 0.5},
+            {'chat_id': -1003, 'members': 50, 'joins': 0.1, 'messages': 0.5, 'reactions': 0.2},
+        ],
+        'suspicious_ratio': 0.1,
+        'faults': {},
+    },
+    'raid': {
+        'description': "200 mostly suspicious accounts join one group in 10s; two small groups keep going",
+        'duration': 30,
+        'groups': [
+            {'chat_id': -1001, 'members': 400, 'joins': 0.3, 'messages': 4, 'reactions': 1,
+             'raid': {'at': 5, 'joins': 200, 'over': 10, 'suspicious_ratio': 0.8}},
+            {'chat_id': -1002, 'members': 150, 'joins': 0.2, 'messages': 2, 'reactions': 0.5},
+            {'chat_id': -1003, 'members': 50, 'joins': 0.2, 'messages': 0.5, 'reactions': 0.2},
+        ],
+        'suspicious_ratio': 0.1,
+        'faults': {'random_flood_rate': 0.005},
+    },
+    'reaction_storm': {
+        'description': "80 reactions/s in one group for 20s while others see normal traffic",
+        'duration': 30,
+        'groups': [
+            {'chat_id': -1001, 'members': 2000, 'joins': 0.2, 'messages': 4, 'reactions': 1,
+             'storm': {'at': 5, 'reactions': 80, 'over': 20}},
+            {'chat_id': -1002, 'members': 150, 'joins': 0.2, 'messages': 2, 'reactions': 0.5},
+        ],
+        'suspicious_ratio': 0.1,
+        'faults': {'error_rate': 0.01},
+    },
+}
+
+
+def percentile(values: list, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Metrics:
+    def __init__(self):
+        self.join_latency = []
+        self.scan_latency = []
+        self.time_to_action = []
+        self.verdicts = 0
+        self.partial = 0
+        self.incomplete = 0
+        self.failed = 0
+        self.scans_requested = 0
+        self.updates = 0
+        self.join_time = {}  # user_id -> monotonic time the join update was received
+
+    def verdict(self, kind: str, received: float, analysis):
+        if not analysis:
+            self.failed += 1
+            return
+        self.verdicts += 1
+        (self.join_latency if kind == 'join' else self.scan_latency).append(time.monotonic() - received)
+        self.partial += analysis.partial
+        self.incomplete += analysis.incomplete
+
+
+async def handle_join(client, metrics: Metrics, chat_id: int, user_id: int, received: float):
+    """Same calls as new_member_handler in bio.py"""
+    user_name = f"User{user_id}"
+    metrics.join_time[user_id] = received
+    await track_user_activity(chat_id, user_id, 'join', "Joined group")
+    note_join(chat_id, user_id)
+    if await is_whitelisted(chat_id, user_id):
+        return
+
+    claim = await acquire_claim(chat_id, user_id, 'join')
+    if not claim.owned:
+        metrics.verdict('join', received, claim.analysis())
+        return
+
+    analysis = None
+    should_instant_action, action_reason = False, ""
+    try:
+        await check_user_comprehensive(client, chat_id, user_id, hours=1)
+        analysis = await analyze_profile(
+            client, chat_id, user_id,
+            deadline=get_setting('ANALYSIS_DEADLINE_SECONDS') or None,
+            on_late_result=late_escalation(client, chat_id, user_id, user_name, True, "on join"),
+            priority=True
+        )
+        metrics.verdict('join', received, analysis)
+        if not analysis:
+            return
+        if not analysis.partial and not analysis.incomplete:
+            await record_verdict(user_id, analysis.is_suspicious)
+        should_instant_action, action_reason = decide_action(analysis, chat_id, on_join=True)
+        record_decision(chat_id, user_id, 'join', analysis, should_instant_action, action_reason,
+                        latency=time.monotonic() - received)
+        if should_instant_action:
+            enforce_verdict(client, chat_id, user_id, user_name, analysis, action_reason)
+    finally:
+        await finish_claim(claim, analysis, should_instant_action, action_reason)
+
+
+async def handle_activity(client, metrics: Metrics, chat_id: int, user_id: int, source: str, received: float):
+    """Same calls as message_monitor_handler / reaction_monitor_handler in bio.py"""
+    if get_setting('TRACK_USER_ACTIVITY', chat_id):
+        await track_user_activity(chat_id, user_id, source, "bench")
+    if await should_scan_user(chat_id, user_id, source):
+        metrics.scans_requested += 1
+        analysis = await scan_user(client, chat_id, user_id, f"User{user_id}", source,
+                                   deadline=get_setting('ANALYSIS_DEADLINE_SECONDS') or None)
+        metrics.verdict('scan', received, analysis)
+
+
+async def poisson(rate: float, duration: float, rng: random.Random, emit):
+    """Call emit() at exponentially distributed intervals for `duration` seconds"""
+    if rate <= 0:
+        return
+    end = time.monotonic() + duration
+    while True:
+        await asyncio.sleep(rng.expovariate(rate))
+        if time.monotonic() >= end:
+            return
+        emit()
+
+
+async def burst(at: float, count: int, over: float, emit):
+    await asyncio.sleep(at)
+    for _ in range(count):
+        emit()
+        await asyncio.sleep(over / count)
+
+
+async def run_scenario(name: str, seed: int) -> dict:
+    spec = SCENARIOS[name]
+    rng = random.Random(seed)
+    world = SimWorld(seed)
+    client = SimulatedTelegram(world, FaultProfile(**spec['faults']), seed)
+    metrics = Metrics()
+    updates = asyncio.Queue()
+    set_debug_logging(False)
+
+    await mongo_client.drop_database(config.MONGO_DB_NAME)
+    await ensure_indexes()
+
+    for group_spec in spec['groups']:
+        group = world.add_group(group_spec['chat_id'], f"Group {group_spec['chat_id']}")
+        group.members = [world.add_user(spec['suspicious_ratio']) for _ in range(group_spec['members'])]
+
+    def emit_join(chat_id: int, suspicious_ratio: float):
+        user_id = world.add_user(suspicious_ratio)
+        world.groups[chat_id].members.append(user_id)
+        updates.put_nowait((time.monotonic(), handle_join, (chat_id, user_id)))
+
+    def emit_activity(chat_id: int, source: str):
+        user_id = rng.choice(world.groups[chat_id].members)
+        updates.put_nowait((time.monotonic(), handle_activity, (chat_id, user_id, source)))
+
+    async def worker():
+        while True:
+            received, handler, args = await updates.get()
+            metrics.updates += 1
+            try:
+                await handler(client, metrics, *args, received)
+            except Exception as e:
+                metrics.failed += 1
+                print(f"handler error: {type(e).__name__}: {e}", file=sys.stderr)
+
+    generators = []
+    for group_spec in spec['groups']:
+        chat_id = group_spec['chat_id']
+        duration = spec['duration']
+        generators.append(poisson(group_spec['joins'], duration, rng,
+                                  lambda c=chat_id: emit_join(c, spec['suspicious_ratio'])))
+        generators.append(poisson(group_spec['messages'], duration, rng, lambda c=chat_id: emit_activity(c, 'message')))
+        generators.append(poisson(group_spec['reactions'], duration, rng, lambda c=chat_id: emit_activity(c, 'reaction')))
+        if 'raid' in group_spec:
+            raid = group_spec['raid']
+            generators.append(burst(raid['at'], raid['joins'], raid['over'],
+                                    lambda c=chat_id, r=raid: emit_join(c, r['suspicious_ratio'])))
+        if 'storm' in group_spec:
+            storm = group_spec['storm']
+            generators.append(burst(storm['at'], storm['reactions'] * storm['over'], storm['over'],
+                                    lambda c=chat_id: emit_activity(c, 'reaction')))
+
+    background = [asyncio.create_task(worker()) for _ in range(UPDATE_WORKERS)]
+    background.append(asyncio.create_task(run_overload_monitor(inflight_analyses)))
+    background.append(asyncio.create_task(run_trace_writer()))
+    background.append(asyncio.create_task(run_activity_flusher()))
+
+    started = time.monotonic()
+    await asyncio.gather(*generators)
+    drain_deadline = time.monotonic() + DRAIN_SECONDS
+    while (updates.qsize() or inflight_analyses()) and time.monotonic() < drain_deadline:
+        await asyncio.sleep(0.2)
+    elapsed = time.monotonic() - started
+    undelivered = updates.qsize()
+
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+
+    suspicious_joiners = [user_id for user_id in metrics.join_time if user_id in world.suspicious_users]
+    acted = {}
+    for acted_at, _, _, user_id in client.actions:
+        acted.setdefault(user_id, acted_at)
+    caught = [user_id for user_id in suspicious_joiners if user_id in acted]
+    metrics.time_to_action = [acted[user_id] - metrics.join_time[user_id] for user_id in caught]
+    false_positives = sum(1 for user_id in acted if user_id not in world.suspicious_users)
+
+    total_calls = sum(client.calls.values())
+    load = overload_stats()
+    waits = scheduler_stats()
+    return {
+        'scenario': name,
+        'seed': seed,
+        'elapsed_seconds': round(elapsed, 2),
+        'updates': metrics.updates,
+        'verdicts': metrics.verdicts,
+        'join_latency_p50': percentile(metrics.join_latency, 0.5),
+        'join_latency_p95': percentile(metrics.join_latency, 0.95),
+        'scan_latency_p50': percentile(metrics.scan_latency, 0.5),
+        'scan_latency_p95': percentile(metrics.scan_latency, 0.95),
+        'time_to_action_p50': percentile(metrics.time_to_action, 0.5),
+        'time_to_action_p95': percentile(metrics.time_to_action, 0.95),
+        'suspicious_joiners': len(suspicious_joiners),
+        'suspicious_caught': len(caught),
+        'false_positives': false_positives,
+        'api_calls': total_calls,
+        'api_calls_per_verdict': round(total_calls / metrics.verdicts, 2) if metrics.verdicts else None,
+        'api_calls_by_method': dict(client.calls),
+        'flood_waits': sum(client.flood_waits.values()),
+        'server_errors': sum(client.server_errors.values()),
+        'shared_analyses': analysis_dedup_stats()['shared'],
+        'moderation_flood_waits': executor.stats['flood_waits'],
+        'traces_written': trace_stats['written'],
+        'traces_dropped': trace_stats['dropped'],
+        'dropped_undelivered_updates': undelivered,
+        'dropped_shed_scans': load['shed']['message'] + load['shed']['reaction'],
+        'dropped_shed_history_reads': load['shed']['nsfw_history'],
+        'partial_verdicts': metrics.partial,
+        'incomplete_verdicts': metrics.incomplete,
+        'failed': metrics.failed,
+        'scans_requested': metrics.scans_requested,
+        'overload_transitions': load['transitions'],
+        'chat_wait_p95': {str(chat_id): round(stats['p95_wait'], 3) for chat_id, stats in waits.items()},
+    }
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"\n=== {result['scenario']} ({SCENARIOS[result['scenario']]['description']}) ===")
+    for key, value in result.items():
+        if key in ('scenario', 'seed'):
+            continue
+        line = f"  {key:<30} {_format(value)}"
+        if baseline and isinstance(value, (int, float)) and isinstance(baseline.get(key), (int, float)):
+            line += f"   (baseline {_format(baseline[key])}, {value - baseline[key]:+.3f})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--compare', help="Results file of an earlier run to compare against")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    if args.child:
+        result = asyncio.run(run_scenario(args.child, args.seed))
+        print(json.dumps(result))
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result['scenario']: result for result in json.load(f)}
+
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        # A fresh process per scenario keeps caches, budgets and counters cold
+        completed = subprocess.run(
+            [sys.executable, '-m', 'bench.run_scenarios', '--child', name, '--seed', str(args.seed)],
+            stdout=subprocess.PIPE, text=True
+        )
+        if completed.returncode != 0:
+            print(f"Scenario {name} failed with exit code {completed.returncode}", file=sys.stderr)
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print_report(result, baseline.get(name))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
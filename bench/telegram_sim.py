@@ -0,0 +1,352 @@
+"""
+Fault-injecting stand-in for the Pyrogram client methods the bot calls
+Serves a generated world of users, channels and groups with configurable
+latency distributions, server-side rate caps that answer with FloodWait
+(waits sized like Telegram's: until the cap has room again, plus a penalty),
+random FloodWait/500 errors and per-method call accounting.
+
+Only the methods used by the helpers are implemented: invoke(GetFullUser /
+GetFullChannel), resolve_peer, get_chat, get_chat_history, get_chat_members,
+get_common_chats, get_messages, get_message_reactions, get_users,
+ban/unban/restrict_chat_member, send_message and edit_message_text.
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from pyrogram import errors, enums
+from pyrogram.raw.functions.users import GetFullUser
+from pyrogram.raw.functions.channels import GetFullChannel
+
+from helper.overload import track_api_call
+
+# Pyrogram fetches history and member lists in pages of this many items per call
+HISTORY_PAGE_SIZE = 100
+MEMBERS_PAGE_SIZE = 200
+REACTIONS_PAGE_SIZE = 100
+
+# Default latency (median ms, p99 ms) per method
+DEFAULT_LATENCY = {
+    'default': (60, 400),
+    'get_chat_history': (120, 900),
+    'get_chat_members': (150, 1200),
+    'GetFullUser': (80, 600),
+    'GetFullChannel': (80, 600),
+}
+
+
+class LatencyModel:
+    """Log-normal latency defined by its median and 99th percentile"""
+
+    def __init__(self, median_ms: float, p99_ms: float):
+        self.median = median_ms / 1000
+        # z(0.99) = 2.326
+        self.sigma = math.log(max(p99_ms, median_ms) / median_ms) / 2.326
+
+    def sample(self, rng: random.Random) -> float:
+        return self.median * math.exp(self.sigma * rng.gauss(0, 1))
+
+
+class RateCap:
+    """Server-side token bucket; an empty bucket answers with the wait until it refills"""
+
+    def __init__(self, per_second: float, burst: float):
+        self.rate = per_second
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token, or return the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FaultProfile:
+    """
+    What the simulated server does besides answering
+
+    Args:
+        latency: method -> (median ms, p99 ms), merged over DEFAULT_LATENCY
+        global_rate: Calls per second the bot may make in total before FloodWait
+        method_rates: method -> calls per second for individually capped methods
+        flood_penalty: (min, max) extra seconds added to rate-cap FloodWaits
+        random_flood_rate: Probability of an unprovoked FloodWait per call
+        random_flood_seconds: (min, max) seconds of an unprovoked FloodWait
+        error_rate: Probability of a 500 Internal Server Error per call
+    """
+
+    def __init__(self, latency: dict = None, global_rate: float = 30, method_rates: dict = None,
+                 flood_penalty: tuple = (1, 5), random_flood_rate: float = 0.0,
+                 random_flood_seconds: tuple = (3, 30), error_rate: float = 0.0):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.global_rate = global_rate
+        self.method_rates = method_rates if method_rates is not None else {'get_chat_history': 10}
+        self.flood_penalty = flood_penalty
+        self.random_flood_rate = random_flood_rate
+        self.random_flood_seconds = random_flood_seconds
+        self.error_rate = error_rate
+
+
+class SimWorld:
+    """Generated users, their personal channels and the groups the bot moderates"""
+
+    def __init__(self, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.users = {}  # user_id -> SimpleNamespace
+        self.channels = {}  # chat_id (-100...) -> SimpleNamespace
+        self.groups = {}  # chat_id -> SimpleNamespace
+        self.suspicious_users = set()
+        self._next_user_id = 100000
+        self._next_channel = 1
+
+    def add_group(self, chat_id: int, title: str) -> SimpleNamespace:
+        group = SimpleNamespace(id=chat_id, title=title, members=[], messages={})
+        self.groups[chat_id] = group
+        return group
+
+    def add_group_message(self, chat_id: int, sender_id: int, reactors: dict = None) -> SimpleNamespace:
+        """Post a message to a group; reactors maps emoji -> user IDs who reacted with it"""
+        group = self.groups[chat_id]
+        message = SimpleNamespace(
+            id=len(group.messages) + 1, date=datetime.now(), from_user=self.users[sender_id],
+            text="hello", caption=None, photo=False, video=False, reactors=reactors or {},
+            reactions=SimpleNamespace(reactions=[SimpleNamespace(emoji=emoji, count=len(user_ids))
+                                                 for emoji, user_ids in reactors.items()]) if reactors else None
+        )
+        group.messages[message.id] = message
+        return message
+
+    def _add_channel(self, owner_id: int, kind: str) -> int:
+        raw_id = self._next_channel
+        self._next_channel += 1
+        chat_id = -1000000000000 - raw_id
+        if kind == 'nsfw':
+            title, description = "Hot private content 🔞", "Exclusive onlyfans leaks, 18+ only"
+            history = [SimpleNamespace(photo=True, video=False, text=None, caption="nude pics") for _ in range(30)]
+        elif kind == 'promo':
+            title, description = "Crypto signals & earn money fast", "Join for free trading signals"
+            history = [SimpleNamespace(photo=False, video=False, text="earn 500$ per day", caption=None)
+                       for _ in range(30)]
+        else:
+            title, description = f"My daily notes {raw_id}", "Personal blog"
+            history = [SimpleNamespace(photo=self.rng.random() < 0.2, video=False, text="hello", caption=None)
+                       for _ in range(30)]
+        for index, message in enumerate(history):
+            message.id = index + 1
+            message.date = datetime.now() - timedelta(hours=index)
+            message.reactions = None
+        self.channels[chat_id] = SimpleNamespace(
+            id=chat_id, raw_id=raw_id, owner_id=owner_id, title=title, username=f"chan{raw_id}",
+            description=description, has_protected_content=kind == 'nsfw',
+            members_count=self.rng.randint(10, 5000), history=history
+        )
+        return raw_id
+
+    def add_user(self, suspicious_ratio: float = 0.1, channel_ratio: float = 0.3) -> int:
+        """Generate a user; suspicious users own promo/NSFW channels or advertise in their bio"""
+        user_id = self._next_user_id
+        self._next_user_id += 1
+        suspicious = self.rng.random() < suspicious_ratio
+        personal_channel = None
+        bio = "just here to chat"
+
+        if suspicious:
+            self.suspicious_users.add(user_id)
+            style = self.rng.choice(('nsfw', 'promo', 'bio'))
+            if style == 'bio':
+                bio = "DM for crypto signals t.me/fastmoney"
+            else:
+                personal_channel = self._add_channel(user_id, style)
+        elif self.rng.random() < channel_ratio:
+            personal_channel = self._add_channel(user_id, 'benign')
+
+        self.users[user_id] = SimpleNamespace(
+            id=user_id, first_name=f"User{user_id}", last_name=None, is_bot=False, is_deleted=False,
+            bio=bio, personal_channel_id=personal_channel
+        )
+        return user_id
+
+
+class SimulatedTelegram:
+    """Asynchronous, fault-injecting replacement for a started Pyrogram Client"""
+
+    def __init__(self, world: SimWorld, faults: FaultProfile = None, seed: int = 1):
+        self.world = world
+        self.faults = faults or FaultProfile()
+        self.rng = random.Random(seed)
+        self.latency = {name: LatencyModel(*spec) for name, spec in self.faults.latency.items()}
+        self.global_cap = RateCap(self.faults.global_rate, self.faults.global_rate)
+        self.method_caps = {name: RateCap(rate, rate) for name, rate in self.faults.method_rates.items()}
+        self.calls = Counter()
+        self.flood_waits = Counter()
+        self.server_errors = Counter()
+        self.actions = []  # (monotonic time, action, chat_id, user_id)
+        self.sent_messages = 0
+
+    def reset_stats(self):
+        self.calls.clear()
+        self.flood_waits.clear()
+        self.server_errors.clear()
+        self.actions.clear()
+        self.sent_messages = 0
+
+    async def _call(self, method: str):
+        """Account for, fault-inject and delay one API call"""
+        self.calls[method] += 1
+        with track_api_call(method):
+            wait = self.global_cap.take()
+            method_cap = self.method_caps.get(method)
+            if not wait and method_cap:
+                wait = method_cap.take()
+            if wait:
+                self.flood_waits[method] += 1
+                raise errors.FloodWait(value=math.ceil(wait + self.rng.uniform(*self.faults.flood_penalty)))
+
+            if self.rng.random() < self.faults.random_flood_rate:
+                self.flood_waits[method] += 1
+                raise errors.FloodWait(value=self.rng.randint(*self.faults.random_flood_seconds))
+
+            model = self.latency.get(method) or self.latency['default']
+            await asyncio.sleep(model.sample(self.rng))
+
+            if self.rng.random() < self.faults.error_rate:
+                self.server_errors[method] += 1
+                raise errors.InternalServerError()
+
+    # Raw API
+
+    async def resolve_peer(self, peer_id):
+        return SimpleNamespace(user_id=peer_id)
+
+    async def invoke(self, query):
+        if isinstance(query, GetFullUser):
+            await self._call('GetFullUser')
+            user = self.world.users.get(query.id.user_id)
+            if user is None:
+                raise errors.UserIdInvalid()
+            return SimpleNamespace(full_user=SimpleNamespace(personal_channel_id=user.personal_channel_id))
+
+        if isinstance(query, GetFullChannel):
+            await self._call('GetFullChannel')
+            channel = self.world.channels.get(-query.channel.channel_id)
+            if channel is None:
+                raise errors.ChannelInvalid()
+            return SimpleNamespace(full_chat=SimpleNamespace(participants_count=channel.members_count))
+
+        raise NotImplementedError(f"SimulatedTelegram does not handle {type(query).__name__}")
+
+    # Chats and users
+
+    async def get_chat(self, chat_id):
+        await self._call('get_chat')
+        user = self.world.users.get(chat_id)
+        if user is not None:
+            return SimpleNamespace(id=user.id, type=enums.ChatType.PRIVATE, bio=user.bio,
+                                   first_name=user.first_name, username=None, photo=None)
+        channel = self.world.channels.get(chat_id)
+        if channel is not None:
+            return SimpleNamespace(id=channel.id, type=enums.ChatType.CHANNEL, title=channel.title,
+                                   username=channel.username, description=channel.description,
+                                   has_protected_content=channel.has_protected_content, photo=None)
+        group = self.world.groups.get(chat_id)
+        if group is not None:
+            return SimpleNamespace(id=group.id, type=enums.ChatType.SUPERGROUP, title=group.title,
+                                   username=None, description=None, has_protected_content=False, photo=None)
+        raise errors.PeerIdInvalid()
+
+    async def get_users(self, user_ids):
+        await self._call('get_users')
+        if isinstance(user_ids, (list, tuple)):
+            return [self.world.users[user_id] for user_id in user_ids if user_id in self.world.users]
+        return self.world.users.get(user_ids)
+
+    async def get_common_chats(self, user_id):
+        await self._call('get_common_chats')
+        user = self.world.users.get(user_id)
+        if user is None:
+            raise errors.UserIdInvalid()
+        if user.personal_channel_id is None:
+            return []
+        channel = self.world.channels[-1000000000000 - user.personal_channel_id]
+        return [SimpleNamespace(id=channel.id, type=enums.ChatType.CHANNEL, title=channel.title)]
+
+    async def get_chat_history(self, chat_id, limit: int = 0, offset_id: int = 0):
+        channel = self.world.channels.get(chat_id)
+        messages = channel.history if channel else list(self.world.groups[chat_id].messages.values())[::-1]
+        if offset_id:
+            # Messages older than offset_id (the lists are newest first)
+            positions = [index for index, message in enumerate(messages) if message.id == offset_id]
+            messages = messages[positions[0] + 1:] if positions else []
+        if limit:
+            messages = messages[:limit]
+        for start in range(0, max(len(messages), 1), HISTORY_PAGE_SIZE):
+            await self._call('get_chat_history')
+            for message in messages[start:start + HISTORY_PAGE_SIZE]:
+                yield message
+
+    async def get_chat_members(self, chat_id, filter=None):
+        channel = self.world.channels.get(chat_id)
+        if channel is not None:
+            await self._call('get_chat_members')
+            if filter == enums.ChatMembersFilter.ADMINISTRATORS:
+                owner = self.world.users[channel.owner_id]
+                yield SimpleNamespace(user=owner, status=enums.ChatMemberStatus.OWNER, joined_date=None)
+                return
+            raise errors.ChatAdminRequired()
+
+        group = self.world.groups[chat_id]
+        if filter == enums.ChatMembersFilter.ADMINISTRATORS:
+            await self._call('get_chat_members')
+            return  # Generated members are never admins
+        for start in range(0, max(len(group.members), 1), MEMBERS_PAGE_SIZE):
+            await self._call('get_chat_members')
+            for user_id in group.members[start:start + MEMBERS_PAGE_SIZE]:
+                yield SimpleNamespace(user=self.world.users[user_id], status=enums.ChatMemberStatus.MEMBER,
+                                      joined_date=None)
+
+    async def get_messages(self, chat_id, message_ids):
+        await self._call('get_messages')
+        return self.world.groups[chat_id].messages.get(message_ids)
+
+    async def get_message_reactions(self, chat_id, message_id, emoji):
+        reactors = self.world.groups[chat_id].messages[message_id].reactors.get(emoji, [])
+        for start in range(0, max(len(reactors), 1), REACTIONS_PAGE_SIZE):
+            await self._call('get_message_reactions')
+            for user_id in reactors[start:start + REACTIONS_PAGE_SIZE]:
+                yield self.world.users[user_id]
+
+    # Moderation and messages
+
+    async def ban_chat_member(self, chat_id, user_id, *args, **kwargs):
+        await self._call('ban_chat_member')
+        self.actions.append((time.monotonic(), 'ban', chat_id, user_id))
+        return True
+
+    async def unban_chat_member(self, chat_id, user_id):
+        await self._call('unban_chat_member')
+        return True
+
+    async def restrict_chat_member(self, chat_id, user_id, permissions, *args, **kwargs):
+        await self._call('restrict_chat_member')
+        self.actions.append((time.monotonic(), 'mute', chat_id, user_id))
+        return True
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        await self._call('send_message')
+        self.sent_messages += 1
+        return SimpleNamespace(id=self.sent_messages, chat=SimpleNamespace(id=chat_id), text=text)
+
+    async def edit_message_text(self, chat_id, message_id, text, *args, **kwargs):
+        await self._call('edit_message_text')
+        return SimpleNamespace(id=message_id, chat=SimpleNamespace(id=chat_id), text=text)
@@ -8,9 +8,13 @@ FURTHER UPDATED: Fixed auto-ban/kick/mute on join + unified logic
 FIXED: Corrected ban on join execution
 """
 
+import time
+BOOT_STARTED = time.perf_counter()
+
 from pyrogram import Client, filters, errors, enums
-from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ChatPermissions
-from pyrogram.raw.types import UpdateMessageReactions
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pyrogram.raw.types import UpdateMessageReactions, UpdateBotMessageReaction, PeerUser
+from pyrogram.utils import get_peer_id
 from datetime import datetime, timedelta
 
 from helper.utils import (
@@ -20,37 +24,65 @@ from helper.utils import (
     is_whitelisted, add_whitelist, remove_whitelist, get_whitelist,
     track_user_activity, get_recent_activity,
     log_info, log_success, log_warning, log_error, log_debug,
-    log_user_action, log_channel_info, log_separator,
+    log_user_action, log_separator,
     get_recent_joins, get_user_recent_messages, get_user_recent_reactions,
-    get_all_recent_reactions, check_user_comprehensive
+    get_all_recent_reactions, check_user_comprehensive,
+    record_verdict, get_dead_letters, requeue_dead_letters,
+    get_decision_traces, run_activity_flusher, flush_activity, activity_write_stats
 )
 
 from helper.channel_checker import (
     check_user_channels,
     get_recent_reactions,
     get_recent_joins,
-    analyze_user_profile,
-    scan_message_reactions
+    scan_message_reactions,
+    link_cache_stats
+)
+from helper.moderation import decide_action, enforce_verdict, executor
+from helper.sampler import should_scan_user, note_join
+from helper.scanner import scan_user, analyze_profile, analysis_dedup_stats, late_escalation, inflight_analyses
+
+from helper.runtime_config import (
+    settings, get_setting,
+    reload_config, watch_config_file,
+    set_chat_override, clear_chat_override, parse_setting_value,
+    CHAT_OVERRIDABLE_KEYS
 )
 
 from config import (
     API_ID, API_HASH, BOT_TOKEN,
-    SUSPICIOUS_CHANNEL_KEYWORDS,
-    CHECK_BIO_FOR_CHANNELS,
-    CHECK_NEW_MEMBERS,
-    AUTO_BAN_NSFW_ON_JOIN,
-    AUTO_BAN_SUSPICIOUS_ON_JOIN,
-    AUTO_BAN_ACTION,
-    SILENT_MODE,
-    ENABLE_NSFW_DETECTION,
-    NSFW_AUTO_BAN,
-    REACTION_SCAN_PROBABILITY,
-    MESSAGE_SCAN_PROBABILITY
+    OWNER_IDS,
+    CONFIG_WATCH_INTERVAL,
+    REVERIFY_ENABLED,
+    OVERLOAD_PROTECTION,
+    WHY_TRACE_LIMIT,
+    PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS,
+    REACTION_SCAN_DEFAULT_MESSAGES, REACTION_SCAN_MAX_MESSAGES,
+    EXPORT_DIR
 )
 
+from helper.startup import prewarm, get_readiness
+from helper.audit import start_audit, stop_audit, is_audit_running, get_audit, resume_audits
+from helper.reaction_scan import start_reaction_scan, stop_reaction_scan, is_reaction_scan_running
+from helper.reverify import run_reverification, reverify_stats
+from helper.retry_queue import run_retry_worker, retry_stats
+from helper.overload import TrackedClient, run_overload_monitor, overload_stats
+from helper.fair_scheduler import scheduler_stats
+from helper.activity_buffer import buffer_memory_usage
+from helper.avatar_hash import HASHING_AVAILABLE, photo_ref, block_avatar, unblock_avatar, blocklist, avatar_stats
+from helper.trace import record_decision, run_trace_writer, format_trace, trace_stats
+from helper.profiler import run_profile, stop_profile, is_profiling
+from helper.claims import acquire_claim, finish_claim, claim_stats, INSTANCE_ID
+from helper.transfer import export_data, import_data
+
+from pyrogram import idle
+import asyncio
+import os
 import random
 
-app = Client(
+IMPORT_SECONDS = time.perf_counter() - BOOT_STARTED
+
+app = TrackedClient(
     "channel_protector_bot",
     api_id=API_ID,
     api_hash=API_HASH,
@@ -64,7 +96,7 @@ app = Client(
 async def new_member_handler(client: Client, message):
     chat_id = message.chat.id
 
-    if not CHECK_NEW_MEMBERS:
+    if not get_setting('CHECK_NEW_MEMBERS', chat_id):
         log_debug("CHECK_NEW_MEMBERS is disabled, skipping new member check")
         return
 
@@ -81,6 +113,7 @@ async def new_member_handler(client: Client, message):
 
         # Track join activity
         await track_user_activity(chat_id, user_id, 'join', f"Joined group")
+        note_join(chat_id, user_id)
 
         # Skip whitelisted
         if await is_whitelisted(chat_id, user_id):
@@ -88,6 +121,15 @@ async def new_member_handler(client: Client, message):
             log_separator()
             continue
 
+        # Another instance may already have checked this join
+        claim = await acquire_claim(chat_id, user_id, 'join')
+        if not claim.owned:
+            log_info(f"Join of {user_name} was already checked by {claim.result['instance']}")
+            log_separator()
+            continue
+
+        analysis = None
+        should_instant_action, action_reason = False, ""
         try:
             log_info(f"Running comprehensive analysis on new member {user_name}")
 
@@ -96,7 +138,13 @@ async def new_member_handler(client: Client, message):
 
             # Analyze profile
             log_info(f"Analyzing user profile for {user_name}")
-            analysis = await analyze_user_profile(client, user_id, SUSPICIOUS_CHANNEL_KEYWORDS)
+            started = time.perf_counter()
+            analysis = await analyze_profile(
+                client, chat_id, user_id,
+                deadline=get_setting('ANALYSIS_DEADLINE_SECONDS') or None,
+                on_late_result=late_escalation(client, chat_id, user_id, user_name, True, "on join"),
+                priority=True
+            )
 
             if not analysis:
                 log_warning(f"Could not analyze profile for {user_name} - profile may be private or inaccessible")
@@ -104,92 +152,25 @@ async def new_member_handler(client: Client, message):
                 continue
 
             log_info(f"Profile analysis complete:")
-            log_info(f"  - Total channels: {analysis['total_channels']}")
-            log_info(f"  - Suspicious channels: {len(analysis['suspicious_channels'])}")
-            log_info(f"  - NSFW channels: {len(analysis['nsfw_channels'])}")
-            log_info(f"  - Is suspicious: {analysis.get('is_suspicious', False)}")
+            log_info(f"  - Total channels: {analysis.total_channels}")
+            log_info(f"  - Suspicious channels: {len(analysis.suspicious_channels)}")
+            log_info(f"  - NSFW channels: {len(analysis.nsfw_channels)}")
+            log_info(f"  - Is suspicious: {analysis.is_suspicious}")
+
+            # Partial verdicts are recorded once the remaining stages finish;
+            # incomplete ones once a retry gets through
+            if not analysis.partial and not analysis.incomplete:
+                await record_verdict(user_id, analysis.is_suspicious)
 
             # FIXED: Unified decision logic with proper execution
-            should_instant_action = False
-            action_reason = ""
-
-            # Check NSFW first (highest priority)
-            if ENABLE_NSFW_DETECTION and AUTO_BAN_NSFW_ON_JOIN and len(analysis['nsfw_channels']) > 0:
-                should_instant_action = True
-                action_reason = f"NSFW channels detected ({len(analysis['nsfw_channels'])})"
-                log_warning(f"NSFW Auto-ban triggered: {action_reason}")
-                for nsfw_ch in analysis['nsfw_channels'][:3]:  # Log first 3
-                    ch = nsfw_ch['channel']
-                    log_channel_info(ch['title'], ch['channel_id'], f"NSFW - {nsfw_ch['nsfw_info']['confidence']} confidence")
-
-            # Check suspicious channels (second priority)
-            elif AUTO_BAN_SUSPICIOUS_ON_JOIN and len(analysis['suspicious_channels']) > 0:
-                should_instant_action = True
-                action_reason = f"Suspicious channels detected ({len(analysis['suspicious_channels'])})"
-                log_warning(f"Suspicious Auto-ban triggered: {action_reason}")
-                for susp_ch in analysis['suspicious_channels'][:3]:  # Log first 3
-                    ch = susp_ch['channel']
-                    log_channel_info(ch['title'], ch['channel_id'], f"Matched: {susp_ch['matched_keyword']}")
+            should_instant_action, action_reason = decide_action(analysis, chat_id, on_join=True)
+            record_decision(chat_id, user_id, 'join', analysis, should_instant_action, action_reason,
+                            latency=time.perf_counter() - started)
 
             # EXECUTE ACTION IF NEEDED
             if should_instant_action:
-                log_warning(f"Executing instant action on {user_name} [{user_id}]")
-                log_info(f"Action type: {AUTO_BAN_ACTION}")
-                
-                action_executed = False
-                action_text = ""
-                
-                try:
-                    if AUTO_BAN_ACTION == "ban":
-                        await client.ban_chat_member(chat_id, user_id)
-                        action_text = "banned"
-                        action_executed = True
-                        log_success(f"✅ User {user_name} has been BANNED")
-                        
-                    elif AUTO_BAN_ACTION == "kick":
-                        await client.ban_chat_member(chat_id, user_id)
-                        await client.unban_chat_member(chat_id, user_id)
-                        action_text = "kicked"
-                        action_executed = True
-                        log_success(f"✅ User {user_name} has been KICKED")
-                        
-                    elif AUTO_BAN_ACTION == "mute":
-                        await client.restrict_chat_member(
-                            chat_id, user_id,
-                            ChatPermissions(can_send_messages=False)
-                        )
-                        action_text = "muted"
-                        action_executed = True
-                        log_success(f"✅ User {user_name} has been MUTED")
-                    else:
-                        log_error(f"Invalid AUTO_BAN_ACTION: {AUTO_BAN_ACTION}")
-                        
-                except errors.ChatAdminRequired:
-                    log_error(f"❌ Failed to {AUTO_BAN_ACTION} {user_name}: Bot lacks admin permissions")
-                except errors.UserAdminInvalid:
-                    log_error(f"❌ Failed to {AUTO_BAN_ACTION} {user_name}: Cannot restrict admin user")
-                except Exception as e:
-                    log_error(f"❌ Failed to {AUTO_BAN_ACTION} {user_name}: {str(e)}")
-
-                # Send notification if action was executed and not in silent mode
-                if action_executed and not SILENT_MODE:
-                    full_name = f"{new_user.first_name}{(' ' + new_user.last_name) if new_user.last_name else ''}"
-                    mention = f"[{full_name}](tg://user?id={user_id})"
-                    
-                    notification_text = f"**🚫 {mention} has been {action_text} on join!**\n"
-                    notification_text += f"**Reason:** {action_reason}\n"
-                    
-                    if len(analysis['suspicious_channels']) > 0:
-                        notification_text += f"**Suspicious Channels:** {len(analysis['suspicious_channels'])}\n"
-                        if analysis['suspicious_channels']:
-                            notification_text += f"**Example:** {analysis['suspicious_channels'][0]['channel']['title']}"
-                    
-                    try:
-                        await client.send_message(chat_id, notification_text)
-                    except Exception as e:
-                        log_error(f"Failed to send notification: {e}")
-                        
-            elif analysis.get('is_suspicious', False):
+                enforce_verdict(client, chat_id, user_id, user_name, analysis, action_reason)
+            elif analysis.is_suspicious:
                 log_warning(f"⚠️ User {user_name} has suspicious activity but auto-ban is disabled")
                 log_info("User will be monitored for violations in future messages")
             else:
@@ -203,21 +184,478 @@ async def new_member_handler(client: Client, message):
             log_error(f"Error checking new member {user_name}: {e}")
             import traceback
             log_error(traceback.format_exc())
+        finally:
+            await finish_claim(claim, analysis, should_instant_action, action_reason)
 
         log_separator()
 
+# Monitor group messages and sample senders for profile scans
+@app.on_message(filters.group & ~filters.service, group=1)
+async def message_monitor_handler(client: Client, message):
+    user = message.from_user
+    if not user or user.is_bot:
+        return
+
+    chat_id = message.chat.id
+
+    if get_setting('TRACK_USER_ACTIVITY', chat_id):
+        await track_user_activity(chat_id, user.id, 'message', f"Message {message.id}")
+
+    if await should_scan_user(chat_id, user.id, 'message'):
+        user_name = f"{user.first_name} {user.last_name or ''}".strip()
+        await scan_user(client, chat_id, user.id, user_name, 'message',
+                        deadline=get_setting('ANALYSIS_DEADLINE_SECONDS') or None)
+
+# Monitor reactions and sample reactors for profile scans
+@app.on_raw_update(group=2)
+async def reaction_monitor_handler(client: Client, update, users, chats):
+    if not isinstance(update, UpdateBotMessageReaction) or not isinstance(update.actor, PeerUser):
+        return
+
+    chat_id = get_peer_id(update.peer)
+    if not get_setting('MONITOR_REACTIONS', chat_id):
+        return
+
+    user_id = update.actor.user_id
+    user = users.get(user_id)
+    if user and user.bot:
+        return
+
+    if get_setting('TRACK_USER_ACTIVITY', chat_id):
+        await track_user_activity(chat_id, user_id, 'reaction', f"Reacted to message {update.msg_id}")
+
+    if await should_scan_user(chat_id, user_id, 'reaction'):
+        user_name = f"{user.first_name or ''} {user.last_name or ''}".strip() if user else f"User {user_id}"
+        await scan_user(client, chat_id, user_id, user_name, 'reaction',
+                        deadline=get_setting('ANALYSIS_DEADLINE_SECONDS') or None)
+
+# Reload config.py without restarting (bot owners only)
+@app.on_message(filters.command("reload"))
+async def reload_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    if await reload_config():
+        await message.reply_text(f"**✅ Configuration reloaded (version {settings().version})**")
+    else:
+        await message.reply_text("**❌ Reload failed, previous configuration kept. Check the logs.**")
+
+# Per-chat configuration overrides (group admins only)
+@app.on_message(filters.group & filters.command("chatconfig"))
+async def chatconfig_command(client: Client, message):
+    chat_id = message.chat.id
+    if not message.from_user or not await is_admin(client, chat_id, message.from_user.id):
+        return
+
+    args = message.text.split(maxsplit=2)
+    current = settings()
+
+    if len(args) == 1:
+        lines = [f"`{key}` = `{current.get(key, chat_id)}`" for key in CHAT_OVERRIDABLE_KEYS]
+        overridden = current.chat_overrides.get(chat_id, {})
+        text = "**⚙️ Chat configuration**\n" + "\n".join(lines)
+        if overridden:
+            text += f"\n\n**Overridden here:** {', '.join(overridden)}"
+        text += "\n\nUsage: `/chatconfig KEY VALUE` or `/chatconfig KEY reset`"
+        await message.reply_text(text)
+        return
+
+    key = args[1].upper()
+    if key not in CHAT_OVERRIDABLE_KEYS:
+        await message.reply_text(f"**❌ Unknown or non-overridable setting:** `{key}`")
+        return
+    if len(args) < 3:
+        await message.reply_text(f"`{key}` = `{current.get(key, chat_id)}`")
+        return
+
+    if args[2].strip().lower() == "reset":
+        await clear_chat_override(chat_id, key)
+        await message.reply_text(f"**✅ `{key}` reset to `{get_setting(key, chat_id)}`**")
+        return
+
+    try:
+        value = parse_setting_value(key, args[2])
+    except ValueError as e:
+        await message.reply_text(f"**❌ Invalid value:** {e}")
+        return
+
+    await set_chat_override(chat_id, key, value)
+    log_info(f"Chat {chat_id} override: {key} = {value}")
+    await message.reply_text(f"**✅ `{key}` set to `{value}` for this chat**")
+
+# Audit all existing members of the group (group admins only)
+@app.on_message(filters.group & filters.command("audit"))
+async def audit_command(client: Client, message):
+    chat_id = message.chat.id
+    if not message.from_user or not await is_admin(client, chat_id, message.from_user.id):
+        return
+
+    args = message.text.split()
+    subcommand = args[1].lower() if len(args) > 1 else "start"
+
+    if subcommand == "stop":
+        if stop_audit(chat_id):
+            await message.reply_text("**⏹ Audit stopped. Run /audit again to resume.**")
+        else:
+            await message.reply_text("**No audit is running in this chat.**")
+        return
+
+    if subcommand == "status":
+        audit = await get_audit(chat_id)
+        if not audit:
+            await message.reply_text("**No audit has been run in this chat.**")
+            return
+        running = "running" if is_audit_running(chat_id) else audit.get('status', 'unknown')
+        await message.reply_text(
+            f"**Audit {running}:** {audit.get('processed', 0)} processed, "
+            f"{audit.get('scanned', 0)} scanned, {audit.get('flagged', 0)} flagged"
+        )
+        return
+
+    if is_audit_running(chat_id):
+        await message.reply_text("**An audit is already running. Use /audit status or /audit stop.**")
+        return
+
+    status_message = await message.reply_text("**🔎 Audit starting...**")
+    start_audit(client, chat_id, status_message.id)
+
+# Scan everyone who reacted to recent messages (group admins only)
+@app.on_message(filters.group & filters.command("scanreactions"))
+async def scanreactions_command(client: Client, message):
+    chat_id = message.chat.id
+    if not message.from_user or not await is_admin(client, chat_id, message.from_user.id):
+        return
+
+    args = message.text.split()
+    if len(args) > 1 and args[1].lower() == "stop":
+        if stop_reaction_scan(chat_id):
+            await message.reply_text("**⏹ Reaction scan stopped.**")
+        else:
+            await message.reply_text("**No reaction scan is running in this chat.**")
+        return
+
+    if len(args) > 1 and not args[1].isdigit():
+        await message.reply_text(
+            f"Usage: `/scanreactions [MESSAGES]` (default {REACTION_SCAN_DEFAULT_MESSAGES}, "
+            f"up to {REACTION_SCAN_MAX_MESSAGES}) or `/scanreactions stop`"
+        )
+        return
+    if is_reaction_scan_running(chat_id):
+        await message.reply_text("**A reaction scan is already running. Use /scanreactions stop.**")
+        return
+
+    count = min(int(args[1]) if len(args) > 1 else REACTION_SCAN_DEFAULT_MESSAGES, REACTION_SCAN_MAX_MESSAGES)
+    status_message = await message.reply_text(f"**🔎 Scanning reactions on the last {count} messages...**")
+    start_reaction_scan(client, chat_id, count, status_message.id)
+
+# Startup and readiness report (bot owners only)
+@app.on_message(filters.command("status"))
+async def status_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    readiness = get_readiness()
+    if not readiness['ready']:
+        await message.reply_text("**⏳ Starting up, caches are still warming**")
+        return
+
+    text = "**✅ Ready**\n"
+    text += f"**Ready after:** {readiness['ready_seconds']:.2f}s\n"
+    text += f"**Imports:** {readiness['import_seconds']:.2f}s\n"
+    if readiness['connect_seconds'] is not None:
+        text += f"**Mongo connect:** {readiness['connect_seconds']:.3f}s\n"
+    text += f"**Pre-warm:** {readiness['prewarm_seconds']:.2f}s "
+    text += f"({readiness['chats_warmed']} chats, {readiness['verdicts_loaded']} verdicts)\n"
+    stats = executor.stats
+    text += f"**Moderation:** {stats['executed']} executed, {stats['deduplicated']} deduplicated, "
+    text += f"{stats['failed']} failed, {stats['flood_waits']} FloodWaits\n"
+    text += f"**Re-verification:** {reverify_stats['verified']} verified, {reverify_stats['flagged']} flagged, "
+    text += f"{reverify_stats['queued']} queued\n"
+    text += f"**Analysis retries:** {retry_stats['attempted']} attempted, {retry_stats['completed']} completed, "
+    text += f"{readiness['retries_pending']} pending at startup\n"
+    buffers = buffer_memory_usage()
+    text += f"**Activity buffers:** {buffers['entries']} entries in {buffers['chats']} chats "
+    text += f"({buffers['bytes'] / 1024:.0f} KiB)\n"
+    text += f"**Activity writes:** {activity_write_stats['written']} records in {activity_write_stats['batches']} "
+    text += f"batches, {activity_write_stats['failed']} failed\n"
+    load = overload_stats()
+    text += f"**Load:** level {load['level']} ({load['level_name']}), lag {load['lag_ms']:.0f}ms, "
+    text += f"{load['transitions']} transitions; shed {load['shed']['message']} message / "
+    text += f"{load['shed']['reaction']} reaction scans, {load['shed']['nsfw_history']} history reads\n"
+    busiest = sorted(scheduler_stats().items(), key=lambda item: item[1]['p95_wait'], reverse=True)[:5]
+    if busiest:
+        text += "**Analysis wait (p95) by chat:**\n"
+        for chat_id, chat_stats in busiest:
+            text += f"  `{chat_id}`: {chat_stats['p95_wait']:.2f}s p95, {chat_stats['max_wait']:.2f}s max, "
+            text += f"{chat_stats['queued']} queued, {chat_stats['running']} running\n"
+    text += f"**Bio links:** {link_cache_stats['hits']} cache hits, {link_cache_stats['misses']} resolved, "
+    text += f"{link_cache_stats['channels']} channels found\n"
+    text += f"**Avatar blocklist:** {len(blocklist)} entries, {avatar_stats['hashed']} photos hashed, "
+    text += f"{avatar_stats['cache_hits']} cache hits, {avatar_stats['matches']} matches\n"
+    text += f"**Decision traces:** {trace_stats['written']} written, {trace_stats['dropped']} dropped\n"
+    if get_setting('CLAIMS_ENABLED'):
+        text += f"**Claims ({INSTANCE_ID}):** {claim_stats['owned']} owned, {claim_stats['reused']} reused, "
+        text += f"{claim_stats['taken_over']} taken over, {claim_stats['lost']} lost\n"
+    dedup = analysis_dedup_stats()
+    text += f"**Profile analyses:** {dedup['executions']} run, {dedup['shared']} duplicate crawls avoided"
+    await message.reply_text(text)
+
+# Inspect and requeue analyses that exhausted their retries (bot owners only)
+@app.on_message(filters.command("deadletters"))
+async def deadletters_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    args = message.text.split()
+    if len(args) > 1 and args[1].lower() == "retry":
+        target = args[2] if len(args) > 2 else "all"
+        if target != "all" and not target.lstrip('-').isdigit():
+            await message.reply_text("Usage: `/deadletters retry USER_ID` or `/deadletters retry all`")
+            return
+        requeued = await requeue_dead_letters(None if target == "all" else int(target))
+        await message.reply_text(f"**🔁 Requeued {requeued} analyses**")
+        return
+
+    dead = await get_dead_letters()
+    if not dead:
+        await message.reply_text("**✅ No dead-lettered analyses**")
+        return
+
+    text = f"**☠️ Dead-lettered analyses ({len(dead)} most recent)**\n"
+    for doc in dead:
+        text += f"\n`{doc['user_id']}` in `{doc['chat_id']}`: {doc['attempts']} attempts, "
+        text += f"last {doc['updated_at'].strftime('%Y-%m-%d %H:%M')}\n  {doc.get('last_error', '')[:150]}"
+    text += "\n\nUse `/deadletters retry USER_ID` or `/deadletters retry all` to requeue."
+    await message.reply_text(text)
+
+# Add a profile or channel photo to the avatar blocklist (bot owners only; it applies to every chat)
+@app.on_message(filters.command("blockavatar"))
+async def blockavatar_command(client: Client, message):
+    chat_id = message.chat.id
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    if not HASHING_AVAILABLE:
+        await message.reply_text("**❌ Avatar hashing needs Pillow installed.**")
+        return
+
+    # Target: the forwarded-from channel or author of the replied message, or @username / ID
+    args = message.text.split(maxsplit=2)
+    reply = message.reply_to_message
+    if reply and (reply.forward_from_chat or reply.from_user):
+        target = reply.forward_from_chat.id if reply.forward_from_chat else reply.from_user.id
+        label = message.text.split(maxsplit=1)[1] if len(args) > 1 else None
+    elif len(args) > 1:
+        target = int(args[1]) if args[1].lstrip('-').isdigit() else args[1].lstrip('@')
+        label = args[2] if len(args) > 2 else None
+    else:
+        await message.reply_text(
+            "Usage: reply to a user's message or a forwarded channel post with `/blockavatar [label]`, "
+            "or `/blockavatar @username|ID [label]`"
+        )
+        return
+
+    try:
+        target_chat = await client.get_chat(target)
+        ref = photo_ref(target_chat.photo)
+        if ref is None:
+            await message.reply_text("**❌ That profile has no photo.**")
+            return
+        label = label or f"{target_chat.title or target_chat.first_name} ({target_chat.id})"
+        phash = await block_avatar(client, ref, label, chat_id, message.from_user.id)
+    except Exception as e:
+        log_error(f"Error blocking avatar: {e}")
+        await message.reply_text(f"**❌ Could not block the avatar:** {e}")
+        return
+
+    if phash is None:
+        await message.reply_text("**❌ The photo could not be decoded.**")
+        return
+    await message.reply_text(f"**✅ Avatar blocked** (`{phash}`, {len(blocklist)} entries)")
+
+# Remove an avatar from the blocklist (bot owners only)
+@app.on_message(filters.command("unblockavatar"))
+async def unblockavatar_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    args = message.text.split()
+    if len(args) < 2 or len(args[1]) != 16 or any(c not in "0123456789abcdef" for c in args[1].lower()):
+        await message.reply_text("Usage: `/unblockavatar PHASH` (16 hex digits, as shown by /blockavatar)")
+        return
+
+    if await unblock_avatar(args[1].lower()):
+        await message.reply_text(f"**✅ Avatar `{args[1].lower()}` unblocked**")
+    else:
+        await message.reply_text("**Not in the blocklist.**")
+
+# Show why the bot acted (or not) on a user (group admins; owners also in private)
+@app.on_message(filters.command("why"))
+async def why_command(client: Client, message):
+    if not message.from_user:
+        return
+
+    chat_id = message.chat.id
+    private = message.chat.type == enums.ChatType.PRIVATE
+    if private:
+        if message.from_user.id not in OWNER_IDS:
+            return
+        chat_filter = None
+    else:
+        if not await is_admin(client, chat_id, message.from_user.id):
+            return
+        chat_filter = chat_id
+
+    args = message.text.split()
+    reply = message.reply_to_message
+    try:
+        if reply and reply.from_user:
+            user_id = reply.from_user.id
+        elif len(args) > 1 and args[1].isdigit():
+            user_id = int(args[1])
+        elif len(args) > 1:
+            user_id = (await client.get_users(args[1].lstrip('@'))).id
+        else:
+            await message.reply_text("Usage: reply to a user's message with `/why`, or `/why @username|USER_ID`")
+            return
+    except Exception as e:
+        await message.reply_text(f"**❌ Could not find that user:** {e}")
+        return
+
+    traces = await get_decision_traces(user_id, chat_filter, WHY_TRACE_LIMIT)
+    if not traces:
+        await message.reply_text(f"**No decision traces for `{user_id}`.**")
+        return
+
+    text = f"**🧾 Last {len(traces)} decisions for `{user_id}`**\n"
+    for doc in traces:
+        text += "\n" + (f"Chat `{doc['chat_id']}`: " if chat_filter is None else "") + format_trace(doc)
+    await message.reply_text(text)
+
+async def _profile_and_report(client: Client, message, seconds: float):
+    try:
+        result = await run_profile(seconds)
+        summary = result['text']
+        if len(summary) > 3900:
+            summary = summary[:3900] + "\n..."
+        await message.reply_text(f"**📊 Profile finished**\n```\n{summary}```")
+        await message.reply_document(result['folded'], caption=f"Collapsed stacks (full summary: `{result['summary']}`)")
+    except Exception as e:
+        log_error(f"Error running profile: {e}")
+        await message.reply_text(f"**❌ Profile failed:** {e}")
+
+# Sample where the event loop spends its time (bot owners only)
+@app.on_message(filters.command("profile"))
+async def profile_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    args = message.text.split()
+    if len(args) > 1 and args[1].lower() == "stop":
+        if stop_profile():
+            await message.reply_text("**⏹ Stopping the profile...**")
+        else:
+            await message.reply_text("**No profile is running.**")
+        return
+
+    if is_profiling():
+        await message.reply_text("**A profile is already running. Use /profile stop.**")
+        return
+    if len(args) > 1 and not args[1].isdigit():
+        await message.reply_text(f"Usage: `/profile [SECONDS]` (up to {PROFILE_MAX_SECONDS}) or `/profile stop`")
+        return
+
+    seconds = min(int(args[1]) if len(args) > 1 else PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS)
+    await message.reply_text(f"**📊 Profiling for {seconds}s...**")
+    asyncio.create_task(_profile_and_report(client, message, seconds))
+
+def _format_transfer(result: dict) -> str:
+    return "\n".join(f"**{key}:** {value}" for key, value in result.items())
+
+async def _export_and_report(message):
+    try:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.abspath(os.path.join(EXPORT_DIR, f"export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.bin.gz"))
+        result = await export_data(path)
+        await message.reply_document(path, caption=f"**📦 Export finished**\n{_format_transfer(result)}")
+    except Exception as e:
+        log_error(f"Error exporting data: {e}")
+        await message.reply_text(f"**❌ Export failed:** {e}")
+
+async def _import_and_report(message, document_message):
+    try:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = await document_message.download(
+            file_name=os.path.abspath(os.path.join(EXPORT_DIR, f"import-{datetime.now().strftime('%Y%m%d-%H%M%S')}.bin.gz"))
+        )
+        result = await import_data(path)
+        await message.reply_text(f"**📥 Import finished**\n{_format_transfer(result)}")
+    except Exception as e:
+        log_error(f"Error importing data: {e}")
+        await message.reply_text(f"**❌ Import failed:** {e}")
+
+# Export the moderation state, activity and the verdict cache (bot owners only)
+@app.on_message(filters.command("export"))
+async def export_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    await message.reply_text("**📦 Exporting...**")
+    asyncio.create_task(_export_and_report(message))
+
+# Import a file written by /export, sent as a document (bot owners only)
+@app.on_message(filters.command("import"))
+async def import_command(client: Client, message):
+    if not message.from_user or message.from_user.id not in OWNER_IDS:
+        return
+
+    reply = message.reply_to_message
+    if not reply or not reply.document:
+        await message.reply_text("Usage: reply to an export file sent as a document with `/import`")
+        return
+
+    await message.reply_text("**📥 Importing...**")
+    asyncio.create_task(_import_and_report(message, reply))
+
 # ... (rest of the code remains the same) ...
 
+async def main():
+    await app.start()
+
+    # Warm caches while updates are already being handled
+    background_tasks = [
+        asyncio.create_task(prewarm(app, BOOT_STARTED, IMPORT_SECONDS)),
+        asyncio.create_task(resume_audits(app)),
+        asyncio.create_task(run_retry_worker(app)),
+        asyncio.create_task(run_trace_writer()),
+        asyncio.create_task(run_activity_flusher())
+    ]
+    if CONFIG_WATCH_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(watch_config_file()))
+    if REVERIFY_ENABLED:
+        background_tasks.append(asyncio.create_task(run_reverification(app)))
+    if OVERLOAD_PROTECTION:
+        background_tasks.append(asyncio.create_task(run_overload_monitor(inflight_analyses)))
+
+    await idle()
+
+    for task in background_tasks:
+        task.cancel()
+    await flush_activity()
+    await app.stop()
+
 if __name__ == "__main__":
     log_separator("BOT STARTUP")
     log_info("Initializing BioLink Protector Bot (FIXED VERSION)...")
-    log_info(f"CHECK_NEW_MEMBERS: {CHECK_NEW_MEMBERS}")
-    log_info(f"AUTO_BAN_NSFW_ON_JOIN: {AUTO_BAN_NSFW_ON_JOIN}")
-    log_info(f"AUTO_BAN_SUSPICIOUS_ON_JOIN: {AUTO_BAN_SUSPICIOUS_ON_JOIN}")
-    log_info(f"AUTO_BAN_ACTION: {AUTO_BAN_ACTION}")
-    log_info(f"SILENT_MODE: {SILENT_MODE}")
-    log_info(f"Monitoring reactions: True")
-    log_info(f"Tracking user activity: True")
+    log_info(f"CHECK_NEW_MEMBERS: {get_setting('CHECK_NEW_MEMBERS')}")
+    log_info(f"AUTO_BAN_NSFW_ON_JOIN: {get_setting('AUTO_BAN_NSFW_ON_JOIN')}")
+    log_info(f"AUTO_BAN_SUSPICIOUS_ON_JOIN: {get_setting('AUTO_BAN_SUSPICIOUS_ON_JOIN')}")
+    log_info(f"AUTO_BAN_SUSPICIOUS: {get_setting('AUTO_BAN_SUSPICIOUS')}")
+    log_info(f"AUTO_BAN_ACTION: {get_setting('AUTO_BAN_ACTION')}")
+    log_info(f"SILENT_MODE: {get_setting('SILENT_MODE')}")
+    log_info(f"Monitoring reactions: {get_setting('MONITOR_REACTIONS')}")
+    log_info(f"Tracking user activity: {get_setting('TRACK_USER_ACTIVITY')}")
+    log_info(f"Adaptive sampling: {get_setting('ADAPTIVE_SAMPLING')} ({get_setting('SCAN_API_CALLS_PER_MINUTE')} API calls/min per chat)")
     log_separator()
-    
-    app.run()
+
+    app.run(main())
@@ -9,6 +9,31 @@ BOT_TOKEN = "xxxxxxxxxxxxxxxxxxxxx"  # Your Bot Token
 
 # MongoDB URI for database (Get free MongoDB from mongodb.com)
 MONGO_URI = "xxxxxxxxxxxxxxxxxxxxx"  # Replace with your MongoDB URI
+MONGO_DB_NAME = "telegram_bot_db"  # Database used by the bot (benchmarks use their own)
+
+# MongoDB Connection Settings
+MONGO_MAX_POOL_SIZE = 50  # Connections kept open per server
+MONGO_MIN_POOL_SIZE = 0  # Connections opened ahead of use
+MONGO_MAX_IDLE_MS = 300000  # Idle pooled connections are closed after this long
+MONGO_CONNECT_TIMEOUT_MS = 5000  # Timeout opening a connection
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 10000  # How long an operation waits for a usable server
+MONGO_SOCKET_TIMEOUT_MS = 20000  # Timeout of one read or write on a connection (0 for none)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = 5000  # How long an operation waits for a free pooled connection
+MONGO_MAJORITY_WTIMEOUT_MS = 5000  # How long a 'majority' write waits for replication before failing
+# Write concern profile per collection: 'fast' (unacknowledged, errors such as lost upserts are
+# never reported), 'acknowledged' (by the primary) or 'majority' (replicated and journaled).
+# Collections not listed are 'acknowledged'.
+MONGO_WRITE_CONCERNS = {
+    'user_activity': 'fast',
+    'activity_rollups': 'fast',
+    'warnings': 'majority',
+    'whitelists': 'majority',
+    'moderation_claims': 'majority',
+}
+
+# Activity Write Batching Settings
+ACTIVITY_WRITE_BATCH_SIZE = 200  # Activity records written to MongoDB together (1 writes every record at once)
+ACTIVITY_FLUSH_SECONDS = 2  # Longest time an activity record waits for its batch
 # Default configuration
 DEFAULT_CONFIG = ("penalty")  # (mode, warning_limit, penalty)
 DEFAULT_PUNISHMENT = "kick"  # Options: "mute" or "ban"
@@ -49,17 +74,44 @@ SUSPICIOUS_CHANNEL_KEYWORDS = [
     # Add your own keywords here
 ]
 
+# Keywords that indicate NSFW channels (checked in title, description and recent posts)
+NSFW_KEYWORDS = [
+    'nsfw', '18+', 'adult', 'porn', 'sex', 'xxx', 'nude', 'naked',
+    'onlyfans', 'premium content', 'hot girls', 'sexy', 'leaked',
+    'nudes', 'explicit', 'adult content', 'mature', 'erotic'
+]
+
 # Check if channel name/username is mentioned in user's bio
 CHECK_BIO_FOR_CHANNELS = True  # Set to False to disable bio checking
+RESOLVE_BIO_LINKS = True  # Resolve @username / t.me links in bios and check the linked channels too
+MAX_BIO_LINKS = 3  # Links resolved per bio
+LINK_CACHE_TTL_MINUTES = 60  # How long a username -> channel resolution is reused
+LINK_CACHE_MAX_ENTRIES = 10000  # Resolutions kept in memory (oldest are dropped first)
+
+# Avatar Blocklist Settings (needs Pillow; /blockavatar adds entries)
+CHECK_AVATARS = True  # Compare profile and channel photos with blocked avatars
+AVATAR_PHASH_DISTANCE = 8  # Max differing pHash bits (of 64) for a match
+AVATAR_DHASH_DISTANCE = 12  # Max differing dHash bits (of 64) to confirm a pHash match
+AVATAR_HASH_CACHE_SIZE = 20000  # Photo hashes kept in memory by file_unique_id
 
 # NSFW Detection Settings
 ENABLE_NSFW_DETECTION = True  # Set to False to disable NSFW channel detection
 NSFW_AUTO_BAN = True  # Set to True to automatically ban users with NSFW channels (ignores warning limit)
+NSFW_SCORE_WEIGHTS = {  # Points per channel feature; 1+ is NSFW, 3+ medium and 5+ high confidence
+    'title_hits': 2,  # NSFW keywords in the title
+    'description_hits': 1,  # NSFW keywords in the description
+    'protected': 1,  # Protected content enabled
+    'high_nsfw_ratio': 3,  # Over 50% of recent posts are media or contain NSFW keywords
+    'moderate_nsfw_ratio': 1,  # 30-50% of recent posts
+}
+CHANNEL_SCORE_MODEL = ""  # Path to a model from `python -m helper.channel_scoring train` (empty: use NSFW_SCORE_WEIGHTS)
+CHANNEL_FEATURE_LOG = ""  # Append every scored channel's features to this JSONL file for training (empty: off)
 
 # New Member Checking
 CHECK_NEW_MEMBERS = True  # Check members immediately when they join (before they send messages)
 AUTO_BAN_NSFW_ON_JOIN = True  # Automatically ban/kick/mute new members with NSFW channels
 AUTO_BAN_SUSPICIOUS_ON_JOIN = True  # Automatically ban/kick/mute new members matching SUSPICIOUS_CHANNEL_KEYWORDS
+AUTO_BAN_SUSPICIOUS = True  # Same for existing members found by message/reaction scans, audits and re-verification
 AUTO_BAN_ACTION = "ban"  # Options: "ban" (permanent), "kick" (remove but can rejoin), "mute" (restrict messaging)
 SILENT_MODE = True  # If True, no checking message appears in chat (only terminal logs)
 
@@ -74,3 +126,105 @@ MESSAGE_SCAN_PROBABILITY = 0.1  # 10% chance to check message sender's profile (
 TRACK_USER_ACTIVITY = True  # Track user messages, reactions, and joins
 ACTIVITY_RETENTION_DAYS = 7  # Keep activity records for 7 days
 
+
+# Adaptive Scan Sampling Settings
+ADAPTIVE_SAMPLING = True  # Prefer unanalyzed, stale, recently joined and bursty users instead of fixed coin flips
+SCAN_API_CALLS_PER_MINUTE = 60  # Per-chat budget of Telegram API calls spent on sampled profile scans (0 disables sampling)
+SCAN_ESTIMATED_API_CALLS = 6  # Approximate API calls consumed by one profile analysis
+VERDICT_FRESH_MINUTES = 60  # Users cleared within this window are never re-sampled
+VERDICT_STALE_HOURS = 24  # Verdicts older than this are treated like never analyzed
+RECENT_JOIN_HOURS = 24  # Users who joined within this window get priority
+BURST_WINDOW_MINUTES = 5  # Window used to detect bursty activity
+BURST_ACTIVITY_THRESHOLD = 8  # Activities within BURST_WINDOW_MINUTES that count as a burst
+ANALYSIS_DEADLINE_SECONDS = 8  # Join checks and sampled scans act on a partial verdict after this long (0 to always wait)
+
+# Runtime Configuration Settings
+OWNER_IDS = []  # User IDs allowed to run global commands such as /reload
+CONFIG_WATCH_INTERVAL = 5  # Seconds between checks of config.py for changes (0 to disable hot reload)
+
+# Startup Settings
+ADMIN_CACHE_TTL = 300  # Seconds an admin roster stays cached
+PREWARM_CONCURRENCY = 5  # Chats pre-warmed in parallel on startup
+PREWARM_VERDICT_LIMIT = 5000  # Most recent verdicts loaded into memory on startup
+
+# Moderation Executor Settings
+MODERATION_CONCURRENCY = 5  # Moderation actions executed in parallel
+MODERATION_MAX_RETRIES = 3  # Retries of an action after FloodWait
+MODERATION_DEDUP_SECONDS = 300  # Ignore repeat actions for the same user in the same chat within this window
+NOTIFICATION_BATCH_SECONDS = 10  # Notifications within this window are merged into one summary message per chat
+
+# Group Audit Settings
+AUDIT_CONCURRENCY = 3  # Members analyzed in parallel during /audit
+AUDIT_API_CALLS_PER_MINUTE = 120  # API call budget of a running audit
+AUDIT_CHECKPOINT_EVERY = 50  # Save the audit position every N members
+AUDIT_PROGRESS_INTERVAL = 30  # Seconds between progress message edits
+
+# Bulk Reaction Scan Settings (/scanreactions)
+REACTION_SCAN_DEFAULT_MESSAGES = 500  # Recent messages read by /scanreactions without an argument
+REACTION_SCAN_MAX_MESSAGES = 20000  # Most messages /scanreactions accepts
+REACTION_SCAN_CONCURRENCY = 4  # Reactor profiles scanned in parallel
+REACTION_SCAN_API_CALLS_PER_MINUTE = 600  # API call budget of the profile scans of a running reaction scan
+REACTION_SCAN_PROGRESS_INTERVAL = 15  # Seconds between progress message edits
+
+# Background Re-verification Settings
+REVERIFY_ENABLED = True  # Periodically re-check active members whose verdict is old
+REVERIFY_AFTER_HOURS = 24  # Re-check members whose last verdict is older than this
+REVERIFY_ACTIVE_DAYS = 3  # Only members active within this many days are re-checked
+REVERIFY_API_CALLS_PER_MINUTE = 30  # API call budget for re-verification (shared by all chats)
+REVERIFY_REBUILD_MINUTES = 30  # How often the re-verification queue is rebuilt from activity
+REVERIFY_QUEUE_LIMIT = 20000  # Stalest members kept when the re-verification queue is rebuilt
+
+# In-memory Activity Buffer Settings
+ACTIVITY_BUFFER_CAPACITY = 5000  # Recent activities kept in memory per chat (17 bytes each)
+ACTIVITY_BUFFER_WINDOW_MINUTES = 120  # Queries reaching back further than this always go to MongoDB
+
+# Activity Streaming Settings
+STREAM_BATCH_SIZE = 500  # Documents fetched per MongoDB round trip by the activity streams
+
+# Analysis Retry Settings
+RETRY_MAX_ATTEMPTS = 5  # Retries of an incomplete analysis before it moves to the dead-letter list
+RETRY_BASE_DELAY_SECONDS = 60  # Delay before the first retry; doubles with every further attempt
+RETRY_MAX_DELAY_SECONDS = 21600  # Upper bound of the retry delay (FloodWait waits are always honored)
+RETRY_API_CALLS_PER_MINUTE = 30  # API call budget for retried analyses (shared by all chats)
+
+# Overload Protection Settings (one threshold per degradation level:
+# 1 = no message sampling, 2 = no reaction scans, 3 = NSFW checks skip channel history)
+OVERLOAD_PROTECTION = True  # Shed low-value work while the event loop is saturated
+OVERLOAD_SAMPLE_SECONDS = 0.5  # How often load signals are sampled
+OVERLOAD_LAG_MS = [100, 250, 500]  # Event-loop lag that triggers each level
+OVERLOAD_API_CALLS = [40, 80, 150]  # Telegram API calls in flight that trigger each level
+OVERLOAD_PENDING_ANALYSES = [15, 30, 60]  # Profile analyses in flight that trigger each level
+OVERLOAD_RECOVERY_SECONDS = 30  # Signals must stay below a level this long before stepping down
+
+# Fair Analysis Scheduling Settings
+ANALYSIS_CONCURRENCY = 8  # Profile analyses running at once across all chats
+CHAT_MAX_CONCURRENT_ANALYSES = 3  # Default cap of concurrent analyses for a single chat
+CHAT_SCHEDULER_WEIGHTS = {}  # chat_id -> share of analysis capacity relative to other chats (default 1.0)
+CHAT_SCHEDULER_CAPS = {}  # chat_id -> cap of concurrent analyses overriding CHAT_MAX_CONCURRENT_ANALYSES
+
+# Decision Trace Settings (/why)
+DECISION_TRACES = True  # Record stages, timings, API calls, signals and action of every verdict
+TRACE_COLLECTION_MB = 64  # Size of the capped decision_traces collection (oldest traces are overwritten)
+TRACE_QUEUE_SIZE = 2000  # Traces waiting to be written; more are dropped
+TRACE_BATCH_SIZE = 100  # Traces per insert
+WHY_TRACE_LIMIT = 3  # Traces shown by /why
+
+# Profiler Settings (/profile)
+PROFILE_DEFAULT_SECONDS = 30  # Duration of /profile without an argument
+PROFILE_MAX_SECONDS = 600  # Longest profile /profile accepts
+PROFILE_INTERVAL_MS = 5  # Interval between stack samples of the event loop thread
+PROFILE_SLOW_CALLBACK_MS = 50  # Event loop callbacks running at least this long are counted as slow
+PROFILE_TOP_N = 15  # Entries per table in the profile summary
+PROFILE_DIR = "profiles"  # Directory the collapsed stacks and summaries are written to
+
+# Multi-instance Claim Settings
+CLAIMS_ENABLED = False  # Redundant instances sharing this MongoDB: one analyzes and acts per join/scan, the others reuse its verdict
+CLAIM_LEASE_SECONDS = 60  # A claim whose owner stops renewing it is taken over after this long
+CLAIM_RESULT_SECONDS = 600  # How long other instances reuse a finished claim's verdict
+CLAIM_POLL_SECONDS = 0.5  # How often an instance waiting on another's claim checks for its verdict
+
+# Export/Import Settings (/export, /import, python -m helper.transfer)
+EXPORT_CURSOR_BATCH_SIZE = 5000  # Documents fetched per MongoDB round trip while exporting
+EXPORT_CHUNK_DOCUMENTS = 1000  # Documents per compressed record of an export file (one bulk write on import)
+EXPORT_COMPRESS_LEVEL = 6  # gzip level of export files (1 = fastest, 9 = smallest)
+EXPORT_DIR = "exports"  # Directory /export writes to and /import downloads to
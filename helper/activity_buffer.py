@@ -0,0 +1,165 @@
+"""
+In-memory ring buffer of recent activity per chat
+Stores timestamp, user ID and activity type in compact array columns so the
+short-window activity queries can be answered without a database round trip.
+Longer windows, or windows older than what the buffer has seen, still go to
+MongoDB.
+"""
+
+import time
+from array import array
+from datetime import datetime
+
+from config import ACTIVITY_BUFFER_CAPACITY, ACTIVITY_BUFFER_WINDOW_MINUTES
+
+# Everything recorded by this process is in the buffers, so coverage starts here
+_started = time.time()
+
+# Activity type <-> compact code; unknown types are registered on first use
+_type_codes = {'message': 0, 'reaction': 1, 'join': 2}
+_type_names = ['message', 'reaction', 'join']
+
+
+def _type_code(activity_type: str) -> int:
+    code = _type_codes.get(activity_type)
+    if code is None:
+        code = len(_type_names)
+        _type_codes[activity_type] = code
+        _type_names.append(activity_type)
+    return code
+
+
+class ActivityRingBuffer:
+    """Fixed-capacity circular buffer of (timestamp, user_id, type) for one chat"""
+
+    def __init__(self, chat_id: int, capacity: int, coverage_start: float):
+        self.chat_id = chat_id
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.user_ids = array('q', bytes(8 * capacity))
+        self.types = array('B', bytes(capacity))
+        self.size = 0
+        self.next_index = 0
+        # Activity older than this may be missing from the buffer
+        self.coverage_start = coverage_start
+
+    def append(self, timestamp: float, user_id: int, activity_type: str):
+        if self.size == self.capacity:
+            # Overwriting the oldest entry: coverage now starts after it
+            self.coverage_start = self.timestamps[self.next_index]
+        else:
+            self.size += 1
+        self.timestamps[self.next_index] = timestamp
+        self.user_ids[self.next_index] = user_id
+        self.types[self.next_index] = _type_code(activity_type)
+        self.next_index = (self.next_index + 1) % self.capacity
+
+    def covers(self, since: float) -> bool:
+        """Return True if every activity newer than `since` is in the buffer"""
+        return since > self.coverage_start
+
+    def _iter_newest(self, since: float, user_id: int = None, type_code: int = None):
+        index = self.next_index
+        for _ in range(self.size):
+            index = (index - 1) % self.capacity
+            timestamp = self.timestamps[index]
+            if timestamp < since:
+                return
+            if user_id is not None and self.user_ids[index] != user_id:
+                continue
+            if type_code is not None and self.types[index] != type_code:
+                continue
+            yield index
+
+    def query(self, since: float, user_id: int = None, activity_type: str = None, limit: int = None) -> list:
+        """
+        Get activity newer than `since`, newest first, shaped like activity documents
+
+        Args:
+            since: Unix timestamp lower bound
+            user_id: Optional user filter
+            activity_type: Optional activity type filter
+            limit: Optional maximum number of results
+        """
+        type_code = _type_codes.get(activity_type) if activity_type else None
+        if activity_type and type_code is None:
+            return []
+
+        results = []
+        for index in self._iter_newest(since, user_id, type_code):
+            results.append({
+                'chat_id': self.chat_id,
+                'user_id': self.user_ids[index],
+                'activity_type': _type_names[self.types[index]],
+                'timestamp': datetime.fromtimestamp(self.timestamps[index])
+            })
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    def count(self, since: float, user_id: int = None, activity_type: str = None) -> int:
+        """Count activity newer than `since` without building documents"""
+        type_code = _type_codes.get(activity_type) if activity_type else None
+        if activity_type and type_code is None:
+            return 0
+        return sum(1 for _ in self._iter_newest(since, user_id, type_code))
+
+    def memory_bytes(self) -> int:
+        return (self.timestamps.itemsize + self.user_ids.itemsize + self.types.itemsize) * self.capacity
+
+
+class EmptyActivity:
+    """Read-only stand-in for the buffer of a chat with no activity recorded yet"""
+
+    __slots__ = ()
+
+    def query(self, since: float, user_id: int = None, activity_type: str = None, limit: int = None) -> list:
+        return []
+
+    def count(self, since: float, user_id: int = None, activity_type: str = None) -> int:
+        return 0
+
+
+_buffers = {}
+_empty = EmptyActivity()
+
+
+def _get_or_create(chat_id: int) -> ActivityRingBuffer:
+    buffer = _buffers.get(chat_id)
+    if buffer is None:
+        buffer = ActivityRingBuffer(chat_id, ACTIVITY_BUFFER_CAPACITY, _started)
+        _buffers[chat_id] = buffer
+    return buffer
+
+
+def record_activity(chat_id: int, user_id: int, activity_type: str, timestamp: datetime):
+    """Append an activity to the chat's ring buffer"""
+    _get_or_create(chat_id).append(timestamp.timestamp(), user_id, activity_type)
+
+
+def get_buffer_for(chat_id: int, cutoff: datetime):
+    """
+    Get the chat's buffer if it can answer a query reaching back to `cutoff`
+
+    Returns:
+        ActivityRingBuffer, EmptyActivity for a chat without recorded activity,
+        or None if the query must go to MongoDB
+    """
+    if (datetime.now() - cutoff).total_seconds() > ACTIVITY_BUFFER_WINDOW_MINUTES * 60:
+        return None
+    since = cutoff.timestamp()
+    buffer = _buffers.get(chat_id)
+    if buffer is None:
+        # No activity recorded since startup; only answerable if the window starts after it.
+        # Buffers are only created by writes, so reads for unknown chats allocate nothing
+        return _empty if since > _started else None
+    return buffer if buffer.covers(since) else None
+
+
+def buffer_memory_usage() -> dict:
+    """Return total bytes used by activity buffers and the number of chats buffered"""
+    return {
+        'chats': len(_buffers),
+        'bytes': sum(buffer.memory_bytes() for buffer in _buffers.values()),
+        'entries': sum(buffer.size for buffer in _buffers.values())
+    }
@@ -0,0 +1,234 @@
+"""
+Full-group audit of existing members
+Streams the member list through the profile scan with bounded concurrency
+and an API budget, checkpointing its position so a restart resumes where it
+stopped, and edits a progress message as it goes
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+from pyrogram import Client
+
+from helper.utils import (
+    log_info, log_success, log_warning, log_error,
+    audits_collection, get_admin_ids, is_whitelisted, get_verdict
+)
+from helper.sampler import ApiBudget
+from helper.scanner import scan_user
+from helper.runtime_config import settings
+
+from config import (
+    AUDIT_CONCURRENCY,
+    AUDIT_API_CALLS_PER_MINUTE,
+    AUDIT_CHECKPOINT_EVERY,
+    AUDIT_PROGRESS_INTERVAL
+)
+
+# chat_id -> running audit task
+_running = {}
+
+
+def is_audit_running(chat_id: int) -> bool:
+    task = _running.get(chat_id)
+    return task is not None and not task.done()
+
+
+async def get_audit(chat_id: int):
+    """Get the stored state of a chat's audit, or None"""
+    return await audits_collection.find_one({'chat_id': chat_id})
+
+
+def _progress_text(state: dict, elapsed: float, finished: bool = False) -> str:
+    rate = state['processed'] / elapsed if elapsed > 0 else 0.0
+    title = "✅ Audit finished" if finished else "🔎 Audit in progress"
+    text = f"**{title}**\n"
+    text += f"**Members processed:** {state['processed']}\n"
+    text += f"**Profiles scanned:** {state['scanned']}\n"
+    text += f"**Skipped (admins/whitelisted/fresh):** {state['skipped']}\n"
+    text += f"**Flagged:** {state['flagged']}\n"
+    text += f"**Throughput:** {rate:.1f} members/s"
+    return text
+
+
+async def _save_checkpoint(chat_id: int, state: dict, status: str = 'running'):
+    await audits_collection.update_one(
+        {'chat_id': chat_id},
+        {'$set': {**state, 'status': status, 'updated_at': datetime.now()}},
+        upsert=True
+    )
+
+
+async def scan_member(client: Client, chat_id: int, user, admin_ids: set, state: dict, source: str = 'audit',
+                      budget: ApiBudget = None):
+    """
+    Scan one member's profile unless they are a bot, an admin, whitelisted or freshly verified
+
+    Counts the member in state['skipped'], state['scanned'] and state['flagged'].
+    Skipped members cost nothing; a scan first waits for SCAN_ESTIMATED_API_CALLS
+    from `budget`, if given.
+    """
+    if user.is_bot or user.is_deleted or user.id in admin_ids or await is_whitelisted(chat_id, user.id):
+        state['skipped'] += 1
+        return
+
+    verdict = await get_verdict(user.id)
+    if verdict:
+        age_minutes = (datetime.now() - verdict['timestamp']).total_seconds() / 60
+        if age_minutes < settings().get('VERDICT_FRESH_MINUTES'):
+            state['skipped'] += 1
+            return
+
+    if budget is not None:
+        await budget.acquire(settings().get('SCAN_ESTIMATED_API_CALLS'))
+    user_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or f"User {user.id}"
+    analysis = await scan_user(client, chat_id, user.id, user_name, source)
+    state['scanned'] += 1
+    if analysis and analysis.is_suspicious:
+        state['flagged'] += 1
+
+
+async def run_audit(client: Client, chat_id: int, status_message_id: int = None):
+    """
+    Audit every member of a chat, resuming from the stored checkpoint
+
+    The member list cannot be requested from an offset, so a resumed audit
+    pages through it from the start again and skips the members before the
+    checkpoint without scanning them; that costs one request per 200 members
+    and nothing from the scan budget.
+
+    Args:
+        client: Pyrogram client
+        chat_id: Chat ID to audit
+        status_message_id: Message to edit with progress, if any
+    """
+    stored = await get_audit(chat_id)
+    if stored and stored.get('status') in ('running', 'stopped'):
+        state = {key: stored.get(key, 0) for key in ('position', 'processed', 'scanned', 'skipped', 'flagged')}
+        status_message_id = status_message_id or stored.get('status_message_id')
+        log_info(f"Resuming audit of chat {chat_id} at member {state['position']}")
+    else:
+        state = {'position': 0, 'processed': 0, 'scanned': 0, 'skipped': 0, 'flagged': 0}
+        log_info(f"Starting audit of chat {chat_id}")
+
+    state['status_message_id'] = status_message_id
+    await _save_checkpoint(chat_id, state)
+
+    budget = ApiBudget(AUDIT_API_CALLS_PER_MINUTE)
+    admin_ids = await get_admin_ids(client, chat_id)
+
+    resume_from = state['position']
+    processed_at_start = state['processed']
+    inflight = {}  # task -> member position
+    started = time.monotonic()
+    last_progress = started
+    last_checkpoint = state['position']
+
+    async def update_progress(finished: bool = False):
+        if not status_message_id:
+            return
+        text = _progress_text(
+            {**state, 'processed': state['processed'] - processed_at_start},
+            time.monotonic() - started,
+            finished
+        )
+        try:
+            await client.edit_message_text(chat_id, status_message_id, text)
+        except Exception as e:
+            log_warning(f"Could not update audit progress: {e}")
+
+    def checkpoint_position(next_position: int) -> int:
+        # Everything before the oldest unfinished member is done
+        return min(inflight.values()) if inflight else next_position
+
+    async def reap(return_when):
+        done, _ = await asyncio.wait(list(inflight), return_when=return_when)
+        for task in done:
+            inflight.pop(task)
+            state['processed'] += 1
+            if task.exception():
+                log_error(f"Audit scan failed: {task.exception()}")
+
+    position = 0
+    try:
+        async for member in client.get_chat_members(chat_id):
+            if position < resume_from:
+                position += 1
+                continue
+
+            if len(inflight) >= AUDIT_CONCURRENCY:
+                await reap(asyncio.FIRST_COMPLETED)
+
+            task = asyncio.create_task(scan_member(client, chat_id, member.user, admin_ids, state, budget=budget))
+            inflight[task] = position
+            position += 1
+
+            state['position'] = checkpoint_position(position)
+            if state['position'] - last_checkpoint >= AUDIT_CHECKPOINT_EVERY:
+                await _save_checkpoint(chat_id, state)
+                last_checkpoint = state['position']
+
+            if time.monotonic() - last_progress >= AUDIT_PROGRESS_INTERVAL:
+                await update_progress()
+                last_progress = time.monotonic()
+
+        if inflight:
+            await reap(asyncio.ALL_COMPLETED)
+        state['position'] = position
+
+    except asyncio.CancelledError:
+        state['position'] = checkpoint_position(position)
+        await _save_checkpoint(chat_id, state, status='stopped')
+        log_warning(f"Audit of chat {chat_id} stopped at member {state['position']}")
+        raise
+    except Exception as e:
+        state['position'] = checkpoint_position(position)
+        await _save_checkpoint(chat_id, state)
+        log_error(f"Audit of chat {chat_id} interrupted at member {state['position']}: {e}")
+        return
+    finally:
+        # Scans still running when the audit stopped or failed; their members are after the checkpoint
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+
+    await _save_checkpoint(chat_id, state, status='finished')
+    await update_progress(finished=True)
+    log_success(f"Audit of chat {chat_id} finished: {state['processed']} members, "
+                f"{state['scanned']} scanned, {state['flagged']} flagged")
+
+
+def start_audit(client: Client, chat_id: int, status_message_id: int = None) -> bool:
+    """
+    Start (or resume) an audit in the background
+
+    Returns:
+        bool: False if an audit is already running for the chat
+    """
+    if is_audit_running(chat_id):
+        return False
+    task = asyncio.create_task(run_audit(client, chat_id, status_message_id))
+    _running[chat_id] = task
+    task.add_done_callback(lambda _: _running.pop(chat_id, None))
+    return True
+
+
+def stop_audit(chat_id: int) -> bool:
+    """Stop a running audit; its position is kept so it can be resumed"""
+    task = _running.get(chat_id)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    return True
+
+
+async def resume_audits(client: Client) -> int:
+    """Resume audits that were running when the bot stopped"""
+    resumed = 0
+    async for doc in audits_collection.find({'status': 'running'}, {'chat_id': 1}):
+        if start_audit(client, doc['chat_id']):
+            resumed += 1
+    if resumed:
+        log_info(f"Resumed {resumed} interrupted audits")
+    return resumed
@@ -0,0 +1,313 @@
+"""
+Perceptual hashes of channel and profile photos
+Spam networks reuse the same avatars across many personal channels and
+profiles, often with innocuous titles. Photo thumbnails are reduced to 64-bit
+pHash and dHash values and compared by Hamming distance against a blocklist
+that admins grow with /blockavatar. The blocklist is indexed in a multi-index
+hash table on pHash, dHash confirms the candidates, and hashes are cached by
+the photo's file_unique_id so an avatar shared by many accounts is downloaded
+once.
+
+Pillow is optional; without it avatar checks are skipped.
+"""
+
+import io
+import itertools
+
+from pyrogram import Client
+
+from helper.utils import log_info, log_warning, log_debug, add_avatar_hash, remove_avatar_hash, get_avatar_hashes
+from helper.runtime_config import settings
+from helper.singleflight import SingleFlight
+from helper.trace import count_cache_hit
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HASHING_AVAILABLE = Image is not None
+
+# Side of the grayscale image the pHash DCT runs on
+PHASH_SIZE = 32
+# Side of the low-frequency DCT block kept for the pHash bits
+PHASH_BLOCK = 8
+
+
+def _dct_matrix(size: int):
+    """Orthonormal DCT-II matrix, so dct(pixels) = D @ pixels @ D.T"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE) if HASHING_AVAILABLE else None
+
+
+def _bits_to_int(bits) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def compute_hashes(image_bytes: bytes) -> tuple:
+    """
+    Compute the perceptual hashes of an image
+
+    Returns:
+        tuple: (phash, dhash) as 64-bit ints
+    """
+    image = Image.open(io.BytesIO(image_bytes)).convert('L')
+
+    # dHash: is each pixel brighter than its right neighbour (9x8 image)
+    pixels = np.asarray(image.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    dhash = _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+    # pHash: low frequencies of the DCT above their median (DC term excluded)
+    pixels = np.asarray(image.resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_BLOCK, :PHASH_BLOCK]
+    phash = _bits_to_int(low > np.median(low.ravel()[1:]))
+
+    return phash, dhash
+
+
+# The 64-bit hashes are indexed in chunks of these widths (low bits first)
+CHUNK_WIDTHS = (22, 21, 21)
+# (chunk width, max differing bits) -> XOR masks with at most that many of the width's bits set
+_probe_masks = {}
+
+
+def _chunk_probes(width: int, max_bits: int) -> list:
+    masks = _probe_masks.get((width, max_bits))
+    if masks is None:
+        masks = [sum(1 << bit for bit in bits)
+                 for count in range(max_bits + 1)
+                 for bits in itertools.combinations(range(width), count)]
+        _probe_masks[(width, max_bits)] = masks
+    return masks
+
+
+class MultiIndexHash:
+    """
+    Multi-index hash table over 64-bit hashes under Hamming distance
+
+    Every hash is stored in one table per chunk, keyed by that chunk's bits.
+    Two hashes within distance r differ in at most r // len(CHUNK_WIDTHS) bits
+    of at least one chunk (pigeonhole), so a search probes the chunk values
+    within that distance in each table and verifies the few candidates found.
+    At the default radius that is about 700 dict lookups however large the
+    index grows, where a BK-tree ends up visiting most of its nodes.
+    """
+
+    __slots__ = ('_tables', '_values')
+
+    def __init__(self):
+        self._tables = [{} for _ in CHUNK_WIDTHS]
+        self._values = {}  # hash -> value
+
+    def __len__(self):
+        return len(self._values)
+
+    @staticmethod
+    def _chunks(hash_value: int) -> list:
+        chunks = []
+        for width in CHUNK_WIDTHS:
+            chunks.append(hash_value & ((1 << width) - 1))
+            hash_value >>= width
+        return chunks
+
+    def add(self, hash_value: int, value):
+        """Insert a hash (replacing the value if the hash is already present)"""
+        if hash_value not in self._values:
+            for table, chunk in zip(self._tables, self._chunks(hash_value)):
+                table.setdefault(chunk, set()).add(hash_value)
+        self._values[hash_value] = value
+
+    def remove(self, hash_value: int) -> bool:
+        if self._values.pop(hash_value, None) is None:
+            return False
+        for table, chunk in zip(self._tables, self._chunks(hash_value)):
+            bucket = table[chunk]
+            bucket.discard(hash_value)
+            if not bucket:
+                del table[chunk]
+        return True
+
+    def search(self, hash_value: int, max_distance: int) -> list:
+        """
+        Find stored hashes within max_distance of hash_value
+
+        Returns:
+            list: (distance, value) pairs, closest first
+        """
+        candidates = set()
+        max_bits = max_distance // len(CHUNK_WIDTHS)
+        for table, chunk, width in zip(self._tables, self._chunks(hash_value), CHUNK_WIDTHS):
+            for mask in _chunk_probes(width, max_bits):
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+
+        results = []
+        for candidate in candidates:
+            distance = hamming(hash_value, candidate)
+            if distance <= max_distance:
+                results.append((distance, self._values[candidate]))
+        results.sort(key=lambda result: result[0])
+        return results
+
+
+class AvatarBlocklist:
+    """In-memory index of blocked avatars: pHash multi-index table, confirmed by dHash"""
+
+    def __init__(self):
+        self._entries = {}  # phash -> (dhash, label)
+        self._index = MultiIndexHash()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, phash: int, dhash: int, label: str):
+        self._entries[phash] = (dhash, label)
+        self._index.add(phash, phash)
+
+    def remove(self, phash: int) -> bool:
+        if self._entries.pop(phash, None) is None:
+            return False
+        self._index.remove(phash)
+        return True
+
+    def match(self, phash: int, dhash: int, phash_distance: int, dhash_distance: int):
+        """
+        Find the closest blocked avatar
+
+        Returns:
+            str: Label of the matching entry, or None
+        """
+        for _, stored in self._index.search(phash, phash_distance):
+            stored_dhash, label = self._entries[stored]
+            if hamming(dhash, stored_dhash) <= dhash_distance:
+                return label
+        return None
+
+
+blocklist = AvatarBlocklist()
+
+# file_unique_id -> (phash, dhash), or None for photos that could not be decoded
+_hash_cache = {}
+_hash_flights = SingleFlight()
+avatar_stats = {'hashed': 0, 'cache_hits': 0, 'matches': 0, 'undecodable': 0}
+
+
+def photo_ref(photo):
+    """
+    Reduce a ChatPhoto to what is needed to hash it
+
+    Returns:
+        tuple: (small_file_id, small_photo_unique_id), or None without a photo
+    """
+    if photo is None:
+        return None
+    return (photo.small_file_id, photo.small_photo_unique_id)
+
+
+def format_hash(value: int) -> str:
+    return f"{value:016x}"
+
+
+async def _download_and_hash(client: Client, file_id: str, unique_id: str):
+    data = await client.download_media(file_id, in_memory=True)
+    try:
+        hashes = compute_hashes(bytes(data.getbuffer()))
+        avatar_stats['hashed'] += 1
+    except Exception as e:
+        log_debug(f"Could not hash photo {unique_id}: {e}")
+        avatar_stats['undecodable'] += 1
+        hashes = None
+
+    while len(_hash_cache) >= settings().get('AVATAR_HASH_CACHE_SIZE'):
+        del _hash_cache[next(iter(_hash_cache))]
+    _hash_cache[unique_id] = hashes
+    return hashes
+
+
+async def hash_photo(client: Client, ref: tuple):
+    """
+    Get the (phash, dhash) of a photo from photo_ref, downloading its small
+    thumbnail unless the same file was hashed before
+
+    API errors are raised to the caller; undecodable photos return None.
+    """
+    file_id, unique_id = ref
+    if unique_id in _hash_cache:
+        avatar_stats['cache_hits'] += 1
+        count_cache_hit('avatar_hash')
+        return _hash_cache[unique_id]
+    return await _hash_flights.do(unique_id, _download_and_hash, client, file_id, unique_id)
+
+
+async def match_avatar(client: Client, ref: tuple):
+    """
+    Check a photo from photo_ref against the blocklist
+
+    Returns:
+        str: Label of the matching blocked avatar, or None
+    """
+    if ref is None or not HASHING_AVAILABLE or len(blocklist) == 0:
+        return None
+
+    hashes = await hash_photo(client, ref)
+    if hashes is None:
+        return None
+
+    current = settings()
+    label = blocklist.match(*hashes, current.get('AVATAR_PHASH_DISTANCE'), current.get('AVATAR_DHASH_DISTANCE'))
+    if label is not None:
+        avatar_stats['matches'] += 1
+    return label
+
+
+async def block_avatar(client: Client, ref: tuple, label: str, chat_id: int, added_by: int):
+    """
+    Add a photo to the blocklist
+
+    Returns:
+        str: The photo's pHash in hex, or None if it could not be hashed
+    """
+    hashes = await hash_photo(client, ref)
+    if hashes is None:
+        return None
+
+    phash, dhash = hashes
+    await add_avatar_hash(format_hash(phash), format_hash(dhash), label, chat_id, added_by)
+    blocklist.add(phash, dhash, label)
+    log_info(f"Avatar {format_hash(phash)} blocked by {added_by} in {chat_id}: {label}")
+    return format_hash(phash)
+
+
+async def unblock_avatar(phash_hex: str) -> bool:
+    removed = await remove_avatar_hash(phash_hex)
+    blocklist.remove(int(phash_hex, 16))
+    return removed
+
+
+async def load_avatar_blocklist() -> int:
+    """
+    Load the stored blocklist into the in-memory index
+
+    Returns:
+        int: Number of blocked avatars
+    """
+    if not HASHING_AVAILABLE:
+        log_warning("Pillow not installed, avatar checks are disabled")
+        return 0
+
+    for doc in await get_avatar_hashes():
+        blocklist.add(int(doc['phash'], 16), int(doc['dhash'], 16), doc.get('label', ''))
+    return len(blocklist)
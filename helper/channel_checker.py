@@ -4,12 +4,25 @@ Enhanced with reaction monitoring and user activity tracking
 Includes verbose logging for detailed terminal output
 """
 
+import asyncio
+import contextvars
+import re
+import time
+
 from pyrogram import Client, errors, enums
 from pyrogram.raw.functions.users import GetFullUser
 from pyrogram.raw.functions.channels import GetFullChannel
 from pyrogram.raw.types import InputPeerChannel, InputPeerUser
 from datetime import datetime, timedelta
 
+from helper.runtime_config import KeywordMatcher, get_nsfw_matcher, settings
+from helper.singleflight import SingleFlight
+from helper.avatar_hash import photo_ref, match_avatar
+from helper.channel_scoring import ChannelFeatures, score_nsfw, score_structure
+from helper.trace import new_trace, begin_trace, end_trace, stage_done, count_cache_hit, snapshot
+from helper.overload import allow_nsfw_history
+from helper.models import ChannelInfo, ChannelFinding, ProfileAnalysis, NSFW_NOT_CHECKED
+
 # Import logging functions from utils (will be available when imported together)
 try:
     from helper.utils import log_info, log_success, log_warning, log_error, log_debug, log_channel_info
@@ -23,6 +36,44 @@ except ImportError:
     def log_channel_info(name, id, info): print(f"CHANNEL: {name} [{id}] | {info}")
 
 
+# Errors that mean "try again later" rather than "nothing to find"
+TRANSIENT_ERRORS = (errors.FloodWait, errors.InternalServerError, asyncio.TimeoutError, ConnectionError)
+
+# Failure list of the analyze_user_profile call running in the current task
+_analysis_failures = contextvars.ContextVar('analysis_failures', default=None)
+
+
+def _note_failure(where: str, e: Exception):
+    """Record a transient error so the running analysis is marked incomplete instead of clean"""
+    failures = _analysis_failures.get()
+    if failures is None or not isinstance(e, TRANSIENT_ERRORS):
+        return
+    failures.append({
+        'where': where,
+        'error': f"{type(e).__name__}: {e}",
+        'retry_after': e.value if isinstance(e, errors.FloodWait) else 0
+    })
+
+
+# @username, t.me/username and telegram.me/username mentions in one pass
+BIO_LINK_PATTERN = re.compile(r'(?:@|(?:t|telegram)\.me/)([a-zA-Z0-9_]{5,32})', re.IGNORECASE)
+
+# t.me paths that are not usernames
+_RESERVED_LINK_PATHS = {'joinchat', 'addstickers', 'addemoji', 'addtheme', 'share', 'proxy', 'socks', 'setlanguage'}
+
+# username -> (monotonic time resolved, ChannelInfo or None when not a channel)
+_link_cache = {}
+_link_flights = SingleFlight()
+link_cache_stats = {'hits': 0, 'misses': 0, 'channels': 0}
+
+
+def _as_matcher(keywords):
+    """Accept either a keyword list or a precompiled KeywordMatcher"""
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    return KeywordMatcher(keywords)
+
+
 async def get_personal_channel_from_profile(client: Client, user_id: int):
     """Get personal channel ID from user's profile"""
     try:
@@ -33,6 +84,7 @@ async def get_personal_channel_from_profile(client: Client, user_id: int):
             return result.full_user.personal_channel_id
     except Exception as e:
         print(f"Error getting personal channel from profile: {e}")
+        _note_failure('get_personal_channel_from_profile', e)
     return None
 
 
@@ -43,6 +95,7 @@ async def get_user_common_chats(client: Client, user_id: int):
         return common_chats
     except Exception as e:
         print(f"Error getting common chats: {e}")
+        _note_failure('get_user_common_chats', e)
         return []
 
 
@@ -54,6 +107,7 @@ async def check_if_channel_owner(client: Client, channel_id: int, user_id: int):
                 return True
     except Exception as e:
         print(f"Error checking channel ownership: {e}")
+        _note_failure('check_if_channel_owner', e)
     return False
 
 
@@ -75,6 +129,7 @@ async def get_recent_reactions(client: Client, channel_id: int, limit: int = 10)
                 reactions_data.append(reaction_info)
     except Exception as e:
         print(f"Error getting recent reactions: {e}")
+        _note_failure('get_recent_reactions', e)
 
     return reactions_data
 
@@ -97,6 +152,7 @@ async def get_recent_joins(client: Client, channel_id: int, days: int = 7):
                     })
     except Exception as e:
         print(f"Error getting recent joins: {e}")
+        _note_failure('get_recent_joins', e)
 
     return recent_joins
 
@@ -111,7 +167,8 @@ async def get_channel_stats(client: Client, channel_id: int):
             'username': chat.username,
             'type': chat.type.value,
             'description': chat.description,
-            'members_count': 0
+            'members_count': 0,
+            'photo': photo_ref(chat.photo)
         }
 
         # Try to get member count
@@ -129,12 +186,14 @@ async def get_channel_stats(client: Client, channel_id: int):
                     stats['members_count'] = full_chat.full_chat.participants_count
             except Exception as e:
                 print(f"Could not get member count: {e}")
+                _note_failure('get_channel_stats', e)
                 stats['members_count'] = 0
 
         return stats
 
     except Exception as e:
         print(f"Error getting channel stats for {channel_id}: {e}")
+        _note_failure('get_channel_stats', e)
         return None
 
 
@@ -155,24 +214,47 @@ async def scan_message_reactions(client: Client, chat_id: int, message_id: int):
         message = await client.get_messages(chat_id, message_id)
 
         if message and message.reactions:
-            for reaction in message.reactions.reactions:
-                try:
-                    # Get users who reacted with this specific emoji
-                    async for user in client.get_message_reactions(chat_id, message_id, reaction.emoji):
-                        if not user.is_bot:
-                            reactor_ids.append(user.id)
-                except Exception as e:
-                    print(f"Error getting reactors for emoji {reaction.emoji}: {e}")
+            async for user in iter_message_reactors(client, chat_id, message):
+                reactor_ids.append(user.id)
     except Exception as e:
         print(f"Error scanning message reactions: {e}")
 
     return list(set(reactor_ids))  # Remove duplicates
 
 
+async def iter_message_reactors(client: Client, chat_id: int, message, flood_retries: int = 3):
+    """
+    Yield the users (bots excluded) who reacted to a message, one emoji at a time
+
+    A user who reacted with several emojis is yielded once per emoji. On
+    FloodWait the emoji is paged again after the wait (up to flood_retries
+    times) without yielding the same user twice; other errors are logged
+    and the next emoji is tried.
+    """
+    for reaction in message.reactions.reactions:
+        yielded = set()
+        for attempt in range(flood_retries + 1):
+            try:
+                # Get users who reacted with this specific emoji
+                async for user in client.get_message_reactions(chat_id, message.id, reaction.emoji):
+                    if not user.is_bot and user.id not in yielded:
+                        yielded.add(user.id)
+                        yield user
+                break
+            except errors.FloodWait as e:
+                if attempt == flood_retries:
+                    log_warning(f"Giving up on reactors for emoji {reaction.emoji} on message {message.id}: {e}")
+                    break
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                log_warning(f"Error getting reactors for emoji {reaction.emoji} on message {message.id}: {e}")
+                break
+
+
 async def check_user_channels(client: Client, user_id: int):
     """
     Main function to check user's personal channels
-    Returns detailed information about channels owned by the user
+    Returns a ChannelInfo (with summarized recent activity) per channel owned by the user
 
     This function checks:
     1. Personal channel ID from user profile (UserFull.personal_channel_id)
@@ -204,22 +286,14 @@ async def check_user_channels(client: Client, user_id: int):
                     # Get recent joins (if bot has admin rights)
                     recent_joins = await get_recent_joins(client, channel_id)
 
-                    channel_info = {
-                        'channel_id': channel_id,
-                        'title': stats['title'],
-                        'username': stats['username'],
-                        'members_count': stats['members_count'],
-                        'description': stats['description'],
-                        'recent_reactions': reactions,
-                        'recent_joins': recent_joins,
-                        'source': 'profile'
-                    }
+                    channel_info = ChannelInfo.from_stats(channel_id, stats, reactions, recent_joins, 'profile')
 
                     user_channels.append(channel_info)
                     checked_channel_ids.add(channel_id)
 
             except Exception as e:
                 print(f"Error getting personal channel info: {e}")
+                _note_failure('check_user_channels', e)
 
         # Method 2: Check common chats (FALLBACK METHOD)
         common_chats = await get_user_common_chats(client, user_id)
@@ -238,16 +312,7 @@ async def check_user_channels(client: Client, user_id: int):
                         reactions = await get_recent_reactions(client, chat.id)
                         recent_joins = await get_recent_joins(client, chat.id)
 
-                        channel_info = {
-                            'channel_id': chat.id,
-                            'title': stats['title'],
-                            'username': stats['username'],
-                            'members_count': stats['members_count'],
-                            'description': stats['description'],
-                            'recent_reactions': reactions,
-                            'recent_joins': recent_joins,
-                            'source': 'common_chats'
-                        }
+                        channel_info = ChannelInfo.from_stats(chat.id, stats, reactions, recent_joins, 'common_chats')
 
                         user_channels.append(channel_info)
                         checked_channel_ids.add(chat.id)
@@ -256,39 +321,22 @@ async def check_user_channels(client: Client, user_id: int):
 
     except Exception as e:
         print(f"Error in check_user_channels: {e}")
+        _note_failure('check_user_channels', e)
         return []
 
 
-async def is_suspicious_channel(channel_info: dict, threshold_members: int = 100):
+async def is_suspicious_channel(channel_info: ChannelInfo, threshold_members: int = 100):
     """
     Determine if a channel is suspicious based on criteria
 
     Args:
-        channel_info: Dictionary with channel information
+        channel_info: ChannelInfo from check_user_channels
         threshold_members: Minimum members to not be flagged (default 100)
 
     Returns:
         tuple: (is_suspicious: bool, reasons: list)
     """
-    reasons = []
-
-    # Check if channel has very few members
-    if channel_info['members_count'] < threshold_members:
-        reasons.append(f"Low member count ({channel_info['members_count']})")
-
-    # Check if there are unusual reaction patterns
-    if len(channel_info['recent_reactions']) > 0:
-        avg_reactions = sum(r['reaction_count'] for r in channel_info['recent_reactions']) / len(channel_info['recent_reactions'])
-        if avg_reactions > channel_info['members_count'] * 0.5:
-            reasons.append("Unusually high reaction rate")
-
-    # Check for rapid member growth
-    if len(channel_info['recent_joins']) > channel_info['members_count'] * 0.3:
-        reasons.append("Rapid member growth detected")
-
-    is_suspicious = len(reasons) > 0
-
-    return is_suspicious, reasons
+    return score_structure([ChannelFeatures.from_channel(channel_info)], threshold_members)[0]
 
 
 async def check_bio_for_channel_mentions(bio: str, suspicious_keywords: list):
@@ -297,235 +345,361 @@ async def check_bio_for_channel_mentions(bio: str, suspicious_keywords: list):
 
     Args:
         bio: User's bio text
-        suspicious_keywords: List of keywords to check for
+        suspicious_keywords: List of keywords or a precompiled KeywordMatcher
 
     Returns:
         tuple: (has_mentions: bool, found_keywords: list)
     """
-    import re
-
     if not bio:
         return False, []
 
-    bio_lower = bio.lower()
-    found_keywords = []
-
     # Check for suspicious keywords
-    for keyword in suspicious_keywords:
-        if keyword.lower() in bio_lower:
-            found_keywords.append(keyword)
+    found_keywords = _as_matcher(suspicious_keywords).find_all(bio)
 
     # Check for channel/group links
-    channel_patterns = [
-        r'@([a-zA-Z0-9_]{5,})',
-        r't\.me/([a-zA-Z0-9_]{5,})',
-        r'telegram\.me/([a-zA-Z0-9_]{5,})',
-    ]
-
-    has_channel_mention = False
-    for pattern in channel_patterns:
-        if re.search(pattern, bio):
-            has_channel_mention = True
-            break
+    has_channel_mention = BIO_LINK_PATTERN.search(bio) is not None
 
     return (has_channel_mention or len(found_keywords) > 0), found_keywords
 
 
-async def check_if_nsfw_channel(client: Client, channel_id: int):
+def extract_bio_links(bio: str) -> list:
+    """Get the distinct usernames mentioned or linked in a bio, lowercased, in order of appearance"""
+    usernames = []
+    for match in BIO_LINK_PATTERN.finditer(bio or ""):
+        username = match.group(1).lower()
+        if username not in _RESERVED_LINK_PATHS and username not in usernames:
+            usernames.append(username)
+    return usernames
+
+
+async def _resolve_link(client: Client, username: str):
+    try:
+        chat = await client.get_chat(username)
+    except TRANSIENT_ERRORS:
+        raise  # Not cached; the caller records the failure
+    except Exception as e:
+        log_debug(f"Bio link @{username} did not resolve: {e}")
+        chat = None
+
+    channel = None
+    if chat is not None and chat.type == enums.ChatType.CHANNEL:
+        channel = ChannelInfo(chat.id, chat.title, chat.username, getattr(chat, 'members_count', 0), 'bio_link',
+                              photo=photo_ref(chat.photo))
+        link_cache_stats['channels'] += 1
+
+    current = settings()
+    while len(_link_cache) >= current.get('LINK_CACHE_MAX_ENTRIES'):
+        # Oldest resolution first (dicts keep insertion order)
+        del _link_cache[next(iter(_link_cache))]
+    _link_cache[username] = (time.monotonic(), channel)
+    return channel
+
+
+async def resolve_bio_link(client: Client, username: str):
     """
-    Check if a channel is NSFW based on various indicators
+    Resolve a username from a bio to the channel it names
+
+    Resolutions are cached for LINK_CACHE_TTL_MINUTES and shared between
+    users, so a link advertised by many accounts is resolved once.
+
+    Returns:
+        ChannelInfo, or None if the username is not a channel
+    """
+    cached = _link_cache.get(username)
+    if cached and time.monotonic() - cached[0] < settings().get('LINK_CACHE_TTL_MINUTES') * 60:
+        link_cache_stats['hits'] += 1
+        count_cache_hit('bio_link')
+        return cached[1]
+
+    link_cache_stats['misses'] += 1
+    return await _link_flights.do(username, _resolve_link, client, username)
+
+
+async def resolve_bio_channels(client: Client, bio: str, exclude_ids: set) -> list:
+    """
+    Resolve the channels linked in a bio
+
+    Args:
+        client: Pyrogram client
+        bio: User's bio text
+        exclude_ids: Channel IDs already found by other means
 
     Returns:
-        dict with: is_nsfw (bool), reasons (list), confidence (low/medium/high)
+        list: ChannelInfo for every linked channel not in exclude_ids
+    """
+    usernames = extract_bio_links(bio)[:settings().get('MAX_BIO_LINKS')]
+    if not usernames:
+        return []
+
+    results = await asyncio.gather(*(resolve_bio_link(client, username) for username in usernames),
+                                   return_exceptions=True)
+    channels = []
+    for username, result in zip(usernames, results):
+        if isinstance(result, Exception):
+            print(f"Error resolving bio link @{username}: {result}")
+            _note_failure('resolve_bio_link', result)
+        elif result is not None and result.channel_id not in exclude_ids:
+            exclude_ids.add(result.channel_id)
+            channels.append(result)
+    return channels
+
+
+async def _check_avatar(client: Client, ref: tuple):
+    try:
+        return await match_avatar(client, ref)
+    except Exception as e:
+        print(f"Error checking avatar: {e}")
+        _note_failure('check_avatar', e)
+        return None
+
+
+async def extract_channel_features(client: Client, channel_id: int, channel: ChannelInfo = None):
     """
-    reasons = []
-    confidence_score = 0
+    Read the NSFW signals of a channel: keywords in its title and description,
+    protected content, and media/keyword share of its recent history
 
+    Args:
+        client: Pyrogram client
+        channel_id: Channel to check
+        channel: ChannelInfo whose member/reaction/join stats are added, if known
+
+    Returns:
+        ChannelFeatures for channel_scoring, or None if the channel could not be read
+    """
     try:
         chat = await client.get_chat(channel_id)
 
-        nsfw_keywords = [
-            'nsfw', '18+', 'adult', 'porn', 'sex', 'xxx', 'nude', 'naked',
-            'onlyfans', 'premium content', 'hot girls', 'sexy', 'leaked',
-            'nudes', 'explicit', 'adult content', 'mature', 'erotic'
-        ]
-
-        title_lower = (chat.title or "").lower()
-        desc_lower = (chat.description or "").lower()
-
-        # Check title
-        for keyword in nsfw_keywords:
-            if keyword in title_lower:
-                reasons.append(f"Title contains: '{keyword}'")
-                confidence_score += 2
-
-        # Check description
-        for keyword in nsfw_keywords:
-            if keyword in desc_lower:
-                reasons.append(f"Description contains: '{keyword}'")
-                confidence_score += 1
-
-        # Check protected content
-        if hasattr(chat, 'has_protected_content') and chat.has_protected_content:
-            reasons.append("Protected content enabled")
-            confidence_score += 1
-
-        # Check recent messages
-        try:
-            nsfw_message_count = 0
-            total_checked = 0
-
-            async for message in client.get_chat_history(channel_id, limit=20):
-                total_checked += 1
-
-                # Check for media
-                if message.photo or message.video:
-                    nsfw_message_count += 1
-
-                # Check text for NSFW keywords
-                if message.text or message.caption:
-                    text = (message.text or message.caption or "").lower()
-                    for keyword in nsfw_keywords:
-                        if keyword in text:
-                            nsfw_message_count += 1
-                            break
-
-            if total_checked > 0:
-                nsfw_ratio = nsfw_message_count / total_checked
-                if nsfw_ratio > 0.5:
-                    reasons.append(f"High NSFW content ratio ({int(nsfw_ratio*100)}%)")
-                    confidence_score += 3
-                elif nsfw_ratio > 0.3:
-                    reasons.append(f"Moderate NSFW content ratio ({int(nsfw_ratio*100)}%)")
-                    confidence_score += 1
-
-        except Exception as e:
-            print(f"Could not check messages: {e}")
-
-        # Determine confidence level
-        if confidence_score >= 5:
-            confidence = "high"
-        elif confidence_score >= 3:
-            confidence = "medium"
-        elif confidence_score >= 1:
-            confidence = "low"
+        nsfw_matcher = get_nsfw_matcher()
+        features = ChannelFeatures(
+            channel_id,
+            title_keywords=nsfw_matcher.find_all(chat.title or ""),
+            description_keywords=nsfw_matcher.find_all(chat.description or ""),
+            protected=getattr(chat, 'has_protected_content', False)
+        )
+        if channel is not None:
+            features.add_channel_stats(channel)
+
+        # Check recent messages (skipped while shedding load)
+        if not allow_nsfw_history():
+            log_debug(f"Skipping message history of channel {channel_id} under load")
         else:
-            confidence = "none"
+            try:
+                async for message in client.get_chat_history(channel_id, limit=20):
+                    features.history_checked += 1
 
-        return {
-            'is_nsfw': confidence_score > 0,
-            'reasons': reasons,
-            'confidence': confidence,
-            'score': confidence_score
-        }
+                    # Check for media
+                    if message.photo or message.video:
+                        features.media_messages += 1
+
+                    # Check text for NSFW keywords
+                    if message.text or message.caption:
+                        if nsfw_matcher.first_match(message.text or message.caption):
+                            features.keyword_messages += 1
+
+            except Exception as e:
+                print(f"Could not check messages: {e}")
+                _note_failure('check_if_nsfw_channel', e)
+
+        return features
 
     except Exception as e:
         print(f"Error checking NSFW status: {e}")
-        return {
-            'is_nsfw': False,
-            'reasons': [],
-            'confidence': 'none',
-            'score': 0
-        }
+        _note_failure('check_if_nsfw_channel', e)
+        return None
+
 
+async def check_if_nsfw_channel(client: Client, channel_id: int):
+    """
+    Check if a channel is NSFW based on various indicators
 
-async def analyze_user_profile(client: Client, user_id: int, suspicious_keywords: list):
+    Returns:
+        NsfwVerdict with is_nsfw, confidence (none/low/medium/high), score and reasons
+    """
+    features = await extract_channel_features(client, channel_id)
+    if features is None:
+        return NSFW_NOT_CHECKED
+    return score_nsfw([features])[0]
+
+
+# Stages of analyze_user_profile, in execution order
+ANALYSIS_STAGES = ('profile', 'bio', 'channels', 'keywords', 'avatars', 'nsfw')
+
+
+def new_analysis_progress(user_id: int) -> dict:
+    """Create the progress record that analyze_user_profile fills in stage by stage"""
+    return {
+        'user_id': user_id,
+        'bio': "",
+        'has_bio_mentions': False,
+        'bio_keywords': [],
+        'channels': [],
+        'matched_keywords': {},  # channel index -> matched keyword
+        'channel_features': {},  # channel index -> ChannelFeatures read by the NSFW stage
+        'nsfw_results': {},  # channel index -> NsfwVerdict
+        'avatar_matches': {},  # channel index -> blocked avatar label
+        'avatar_match': None,  # blocked avatar label matched by the profile photo
+        'completed_stages': [],
+        'failures': [],  # transient errors hit along the way (see _note_failure)
+        'trace': new_trace()  # stage timings, API calls and cache hits (see helper.trace)
+    }
+
+
+def _stage_complete(progress: dict, stage: str):
+    progress['completed_stages'].append(stage)
+    stage_done(progress['trace'], stage)
+
+
+def build_analysis(progress: dict) -> ProfileAnalysis:
+    """
+    Build the analysis result from a (possibly incomplete) progress record
+
+    Results built before every stage finished are 'partial'; 'completed_stages'
+    lists the stages whose signals are included. Results that hit transient
+    API errors (FloodWait, server errors) are 'incomplete': missing signals
+    mean "not checked", not "clean".
+    """
+    channels_info = progress['channels']
+    suspicious_channels = []
+
+    # Score the channels read since the last build in one batch
+    pending = [index for index in progress['channel_features'] if index not in progress['nsfw_results']]
+    if pending:
+        verdicts = score_nsfw([progress['channel_features'][index] for index in pending])
+        progress['nsfw_results'].update(zip(pending, verdicts))
+
+    for index, channel in enumerate(channels_info):
+        matched_keyword = progress['matched_keywords'].get(index)
+        nsfw_result = progress['nsfw_results'].get(index, NSFW_NOT_CHECKED)
+
+        # NSFW channels are also suspicious
+        if nsfw_result.is_nsfw and matched_keyword is None:
+            matched_keyword = f"NSFW ({nsfw_result.confidence})"
+
+        # So are channels using a known spam avatar
+        avatar_label = progress['avatar_matches'].get(index)
+        if avatar_label is not None and matched_keyword is None:
+            matched_keyword = f"Known avatar ({avatar_label})"
+
+        if matched_keyword is not None:
+            suspicious_channels.append(ChannelFinding(channel, matched_keyword, nsfw_result))
+
+    completed_stages = progress['completed_stages']
+    return ProfileAnalysis(
+        progress['user_id'],
+        progress['bio'],
+        progress['has_bio_mentions'],
+        progress['bio_keywords'],
+        channels_info,
+        suspicious_channels,
+        completed_stages,
+        partial=len(completed_stages) < len(ANALYSIS_STAGES),
+        failures=[f"{failure['where']}: {failure['error']}" for failure in progress['failures']],
+        avatar_match=progress['avatar_match'],
+        trace=snapshot(progress['trace'])
+    )
+
+
+async def analyze_user_profile(client: Client, user_id: int, suspicious_keywords: list, progress: dict = None):
     """
     Comprehensive analysis of user profile including channels and bio
 
     Args:
         client: Pyrogram client
         user_id: User ID to analyze
-        suspicious_keywords: List of suspicious keywords
+        suspicious_keywords: List of suspicious keywords or a precompiled KeywordMatcher
+        progress: Optional record from new_analysis_progress, filled in as stages
+            complete so a caller with a deadline can build a partial verdict
 
     Returns:
-        dict: Analysis results with channels, bio info, and suspicion level
+        ProfileAnalysis: Channels, bio info and suspicion level, or None on error
     """
+    keyword_matcher = _as_matcher(suspicious_keywords)
+    if progress is None:
+        progress = new_analysis_progress(user_id)
+    failures_token = _analysis_failures.set(progress['failures'])
+    trace_token = begin_trace(progress['trace'])
+
     try:
         log_debug(f"Starting profile analysis for user {user_id}")
 
         user = await client.get_chat(user_id)
         bio = user.bio or ""
+        progress['bio'] = bio
+        _stage_complete(progress, 'profile')
 
         if bio:
             log_debug(f"User has bio: {bio[:50]}...")
 
-        # Check channels
-        log_debug("Checking user channels...")
-        channels_info = await check_user_channels(client, user_id)
-        log_info(f"Found {len(channels_info)} channels for user {user_id}")
-
         # Check bio for channel mentions and keywords
-        has_bio_mentions, found_keywords = await check_bio_for_channel_mentions(bio, suspicious_keywords)
+        has_bio_mentions, found_keywords = await check_bio_for_channel_mentions(bio, keyword_matcher)
+        progress['has_bio_mentions'] = has_bio_mentions
+        progress['bio_keywords'] = found_keywords
+        _stage_complete(progress, 'bio')
 
         if has_bio_mentions:
             log_warning(f"Bio contains suspicious content: {found_keywords}")
 
-        # Check channel names for suspicious keywords and NSFW content
-        suspicious_channels = []
-        nsfw_channels = []
-
-        for channel in channels_info:
-            channel_name_lower = channel['title'].lower()
-            channel_username_lower = (channel['username'] or "").lower()
+        # Check channels
+        log_debug("Checking user channels...")
+        channels_info = await check_user_channels(client, user_id)
 
-            log_debug(f"Analyzing channel: {channel['title']}")
+        # Channels linked in the bio go through the same checks
+        if bio and settings().get('RESOLVE_BIO_LINKS'):
+            linked = await resolve_bio_channels(client, bio, {channel.channel_id for channel in channels_info})
+            if linked:
+                log_info(f"Bio links resolved to {len(linked)} channels")
+                channels_info.extend(linked)
 
-            # Check for suspicious keywords
-            is_suspicious = False
-            matched_keyword = None
-            for keyword in suspicious_keywords:
-                if keyword.lower() in channel_name_lower or keyword.lower() in channel_username_lower:
-                    is_suspicious = True
-                    matched_keyword = keyword
-                    log_warning(f"Channel '{channel['title']}' matched keyword: {keyword}")
-                    break
+        progress['channels'] = channels_info
+        _stage_complete(progress, 'channels')
+        log_info(f"Found {len(channels_info)} channels for user {user_id}")
 
-            # Check for NSFW content
-            log_debug(f"Checking NSFW status for channel: {channel['title']}")
-            nsfw_result = await check_if_nsfw_channel(client, channel['channel_id'])
-
-            if nsfw_result['is_nsfw']:
-                log_warning(f"NSFW channel detected: {channel['title']} (confidence: {nsfw_result['confidence']})")
-                nsfw_channels.append({
-                    'channel': channel,
-                    'nsfw_info': nsfw_result
-                })
-                # NSFW channels are also suspicious
-                if not is_suspicious:
-                    is_suspicious = True
-                    matched_keyword = f"NSFW ({nsfw_result['confidence']})"
-
-            if is_suspicious:
-                suspicious_channels.append({
-                    'channel': channel,
-                    'matched_keyword': matched_keyword,
-                    'is_nsfw': nsfw_result['is_nsfw'],
-                    'nsfw_info': nsfw_result
-                })
-
-        # Count total recent joins across all channels
-        total_recent_joins = sum(len(ch.get('recent_joins', [])) for ch in channels_info)
-
-        log_info(f"Analysis complete: {len(suspicious_channels)} suspicious, {len(nsfw_channels)} NSFW")
-
-        analysis = {
-            'user_id': user_id,
-            'bio': bio,
-            'has_bio_mentions': has_bio_mentions,
-            'bio_keywords': found_keywords,
-            'total_channels': len(channels_info),
-            'channels': channels_info,
-            'suspicious_channels': suspicious_channels,
-            'nsfw_channels': nsfw_channels,
-            'total_recent_joins': total_recent_joins,
-            'is_suspicious': has_bio_mentions or len(suspicious_channels) > 0 or len(nsfw_channels) > 0
-        }
+        # Check channel names for suspicious keywords
+        for index, channel in enumerate(channels_info):
+            log_debug(f"Analyzing channel: {channel.title}")
+
+            matched_keyword = keyword_matcher.first_match(channel.title, channel.username)
+            if matched_keyword is not None:
+                progress['matched_keywords'][index] = matched_keyword
+                log_warning(f"Channel '{channel.title}' matched keyword: {matched_keyword}")
+        _stage_complete(progress, 'keywords')
+
+        # Compare the profile and channel photos with blocked avatars
+        if settings().get('CHECK_AVATARS'):
+            refs = [photo_ref(user.photo)] + [channel.photo for channel in channels_info]
+            labels = await asyncio.gather(*(_check_avatar(client, ref) for ref in refs))
+            progress['avatar_match'] = labels[0]
+            if labels[0] is not None:
+                log_warning(f"Profile photo matches blocked avatar: {labels[0]}")
+            for index, label in enumerate(labels[1:]):
+                if label is not None:
+                    progress['avatar_matches'][index] = label
+                    log_warning(f"Channel '{channels_info[index].title}' uses blocked avatar: {label}")
+        _stage_complete(progress, 'avatars')
+
+        # Check channels for NSFW content (slowest stage: reads channel history),
+        # scored together by build_analysis
+        for index, channel in enumerate(channels_info):
+            log_debug(f"Checking NSFW status for channel: {channel.title}")
+            features = await extract_channel_features(client, channel.channel_id, channel)
+            if features is not None:
+                progress['channel_features'][index] = features
+        _stage_complete(progress, 'nsfw')
+
+        analysis = build_analysis(progress)
+        for finding in analysis.nsfw_channels:
+            log_warning(f"NSFW channel detected: {finding.channel.title} (confidence: {finding.nsfw.confidence})")
+        log_info(f"Analysis complete: {len(analysis.suspicious_channels)} suspicious, {len(analysis.nsfw_channels)} NSFW")
 
         return analysis
 
     except Exception as e:
         log_error(f"Error in analyze_user_profile: {e}")
+        _note_failure('analyze_user_profile', e)
         import traceback
         traceback.print_exc()
         return None
+
+    finally:
+        _analysis_failures.reset(failures_token)
+        end_trace(trace_token)
@@ -0,0 +1,419 @@
+"""
+Batch scoring of channels with NumPy
+Channels are reduced to feature vectors (keyword hits, media ratio,
+reaction/member and join/member ratios) so that many of them are scored in
+one pass: the NSFW score is a weighted sum over the feature matrix and the
+structural checks of is_suspicious_channel are array comparisons.
+
+By default the weights are NSFW_SCORE_WEIGHTS, which reproduce the original
+per-channel rules, so a batch gives exactly the NsfwVerdicts and reasons that
+scoring the channels one at a time did. CHANNEL_SCORE_MODEL can instead point
+to a logistic model trained locally from labelled feature rows:
+
+    python -m helper.channel_scoring train labelled.jsonl model.json
+
+Rows for training are written to CHANNEL_FEATURE_LOG when it is set; add a
+"label" (1 = NSFW, 0 = clean) to the rows you have reviewed.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+from helper.models import ChannelInfo, NsfwVerdict
+from helper.runtime_config import settings
+from helper.utils import log_info, log_error
+
+# Columns of the feature matrix
+FEATURES = (
+    'title_hits', 'description_hits', 'protected',
+    'history_checked', 'media_ratio', 'keyword_ratio', 'nsfw_ratio', 'high_nsfw_ratio', 'moderate_nsfw_ratio',
+    'log_members', 'reaction_ratio', 'join_ratio', 'low_members', 'high_reaction_rate', 'rapid_growth',
+)
+_COLUMN = {name: position for position, name in enumerate(FEATURES)}
+
+# Share of NSFW history messages above which the high/moderate ratio rules apply
+HIGH_NSFW_RATIO = 0.5
+MODERATE_NSFW_RATIO = 0.3
+# Rule scores from which the confidence is low/medium/high
+CONFIDENCE_LEVELS = ((5, 'high'), (3, 'medium'), (1, 'low'))
+# Model probabilities from which the confidence is medium/high (low below that)
+MODEL_CONFIDENCE_LEVELS = ((0.9, 'high'), (0.7, 'medium'))
+# Features of the original NSFW rules
+RULE_FEATURES = ('title_hits', 'description_hits', 'protected', 'high_nsfw_ratio', 'moderate_nsfw_ratio')
+# Batches smaller than this are scored without NumPy (for NSFW, when only RULE_FEATURES carry weight)
+SMALL_BATCH = 16
+# Rule verdict of a channel without any NSFW signal
+NSFW_CLEAN = NsfwVerdict(False, 'none', 0)
+
+
+class ChannelFeatures:
+    """Raw signals of one channel, as read by check_if_nsfw_channel and check_user_channels"""
+
+    __slots__ = ('channel_id', 'title_keywords', 'description_keywords', 'protected',
+                 'history_checked', 'media_messages', 'keyword_messages',
+                 'members_count', 'reacted_messages', 'avg_reactions', 'recent_joins')
+
+    def __init__(self, channel_id: int, title_keywords: tuple = (), description_keywords: tuple = (),
+                 protected: bool = False, history_checked: int = 0, media_messages: int = 0,
+                 keyword_messages: int = 0, members_count: int = 0, reacted_messages: int = 0,
+                 avg_reactions: float = 0.0, recent_joins: int = 0):
+        self.channel_id = channel_id
+        self.title_keywords = tuple(title_keywords)
+        self.description_keywords = tuple(description_keywords)
+        self.protected = bool(protected)
+        self.history_checked = history_checked
+        self.media_messages = media_messages
+        self.keyword_messages = keyword_messages
+        self.members_count = members_count or 0
+        self.reacted_messages = reacted_messages
+        self.avg_reactions = avg_reactions
+        self.recent_joins = recent_joins
+
+    @classmethod
+    def from_channel(cls, channel: ChannelInfo):
+        """Structural signals only (no text or history)"""
+        features = cls(channel.channel_id)
+        features.add_channel_stats(channel)
+        return features
+
+    def add_channel_stats(self, channel: ChannelInfo):
+        self.members_count = channel.members_count
+        self.reacted_messages = channel.reacted_messages
+        self.avg_reactions = channel.avg_reactions
+        self.recent_joins = channel.recent_joins
+
+    @property
+    def nsfw_ratio(self) -> float:
+        # A photo with an NSFW caption counts twice, as in the original rules
+        if not self.history_checked:
+            return 0.0
+        return (self.media_messages + self.keyword_messages) / self.history_checked
+
+    def to_row(self) -> dict:
+        """Feature values by name (the format of CHANNEL_FEATURE_LOG and training files)"""
+        return dict(zip(FEATURES, feature_matrix([self])[0].tolist()))
+
+
+def feature_matrix(records: list, threshold_members: int = 100):
+    """
+    Build the (len(records), len(FEATURES)) float matrix for a batch of ChannelFeatures
+
+    Args:
+        records: ChannelFeatures to score
+        threshold_members: Member count below which 'low_members' is set
+    """
+    raw = np.array([
+        (len(r.title_keywords), len(r.description_keywords), r.protected, r.history_checked,
+         r.media_messages, r.keyword_messages, r.members_count, r.reacted_messages,
+         r.avg_reactions, r.recent_joins)
+        for r in records
+    ], dtype=np.float64).reshape(len(records), 10)
+    (title_hits, description_hits, protected, checked, media, keyword,
+     members, reacted, avg_reactions, joins) = raw.T
+
+    safe_checked = np.maximum(checked, 1)
+    nsfw_ratio = (media + keyword) / safe_checked
+    safe_members = np.maximum(members, 1)
+
+    matrix = np.empty((len(records), len(FEATURES)))
+    matrix[:, _COLUMN['title_hits']] = title_hits
+    matrix[:, _COLUMN['description_hits']] = description_hits
+    matrix[:, _COLUMN['protected']] = protected
+    matrix[:, _COLUMN['history_checked']] = checked
+    matrix[:, _COLUMN['media_ratio']] = media / safe_checked
+    matrix[:, _COLUMN['keyword_ratio']] = keyword / safe_checked
+    matrix[:, _COLUMN['nsfw_ratio']] = nsfw_ratio
+    matrix[:, _COLUMN['high_nsfw_ratio']] = (checked > 0) & (nsfw_ratio > HIGH_NSFW_RATIO)
+    matrix[:, _COLUMN['moderate_nsfw_ratio']] = ((checked > 0) & (nsfw_ratio > MODERATE_NSFW_RATIO)
+                                                 & (nsfw_ratio <= HIGH_NSFW_RATIO))
+    matrix[:, _COLUMN['log_members']] = np.log1p(members)
+    matrix[:, _COLUMN['reaction_ratio']] = avg_reactions / safe_members
+    matrix[:, _COLUMN['join_ratio']] = joins / safe_members
+    matrix[:, _COLUMN['low_members']] = members < threshold_members
+    matrix[:, _COLUMN['high_reaction_rate']] = (reacted > 0) & (avg_reactions > members * 0.5)
+    matrix[:, _COLUMN['rapid_growth']] = joins > members * 0.3
+    return matrix
+
+
+# NSFW_SCORE_WEIGHTS items -> weight vector
+_weight_vectors = {}
+
+
+def _weight_vector(weights: dict):
+    key = tuple(sorted(weights.items()))
+    vector = _weight_vectors.get(key)
+    if vector is None:
+        vector = np.zeros(len(FEATURES))
+        for name, weight in weights.items():
+            if name in _COLUMN:
+                vector[_COLUMN[name]] = weight
+            else:
+                log_error(f"NSFW_SCORE_WEIGHTS: unknown channel feature '{name}' ignored")
+        _weight_vectors[key] = vector
+    return vector
+
+
+def _as_score(value: float):
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+def _rule_reasons(record: ChannelFeatures, weights: dict) -> list:
+    """The reasons check_if_nsfw_channel gave, for the rules that carry weight"""
+    reasons = []
+    if weights.get('title_hits'):
+        reasons.extend(f"Title contains: '{keyword}'" for keyword in record.title_keywords)
+    if weights.get('description_hits'):
+        reasons.extend(f"Description contains: '{keyword}'" for keyword in record.description_keywords)
+    if weights.get('protected') and record.protected:
+        reasons.append("Protected content enabled")
+    if record.history_checked:
+        ratio = record.nsfw_ratio
+        if weights.get('high_nsfw_ratio') and ratio > HIGH_NSFW_RATIO:
+            reasons.append(f"High NSFW content ratio ({int(ratio*100)}%)")
+        elif weights.get('moderate_nsfw_ratio') and MODERATE_NSFW_RATIO < ratio <= HIGH_NSFW_RATIO:
+            reasons.append(f"Moderate NSFW content ratio ({int(ratio*100)}%)")
+    return reasons
+
+
+def _score_rules_one(record: ChannelFeatures, weights: dict) -> NsfwVerdict:
+    """_score_rules for a single channel, for weights over RULE_FEATURES only"""
+    ratio = record.nsfw_ratio
+    values = {
+        'title_hits': len(record.title_keywords),
+        'description_hits': len(record.description_keywords),
+        'protected': int(record.protected),
+        'high_nsfw_ratio': int(ratio > HIGH_NSFW_RATIO),
+        'moderate_nsfw_ratio': int(MODERATE_NSFW_RATIO < ratio <= HIGH_NSFW_RATIO),
+    }
+    if not any(values[name] for name in weights):
+        return NSFW_CLEAN
+    score = sum(weight * values[name] for name, weight in weights.items())
+    confidence = next((name for threshold, name in CONFIDENCE_LEVELS if score >= threshold), 'none')
+    return NsfwVerdict(score > 0, confidence, _as_score(score), _rule_reasons(record, weights))
+
+
+def _score_rules(records: list, matrix, weights: dict) -> list:
+    vector = _weight_vector(weights)
+    scores = matrix @ vector
+    # Channels with no weighted signal at all share one verdict object
+    signalled = np.flatnonzero((matrix[:, vector != 0] != 0).any(axis=1))
+
+    thresholds = [threshold for threshold, _ in CONFIDENCE_LEVELS]
+    names = np.array([name for _, name in CONFIDENCE_LEVELS] + ['none'])
+    confidences = names[np.select([scores >= threshold for threshold in thresholds],
+                                  range(len(thresholds)), default=len(thresholds))]
+    if np.array_equal(vector, np.round(vector)):
+        rounded = np.rint(scores).astype(int).tolist()
+    else:
+        rounded = [_as_score(score) for score in scores.tolist()]
+
+    verdicts = [NSFW_CLEAN] * len(records)
+    for index, score, confidence, value in zip(signalled.tolist(), scores[signalled].tolist(),
+                                               confidences[signalled].tolist(),
+                                               [rounded[index] for index in signalled.tolist()]):
+        verdicts[index] = NsfwVerdict(score > 0, confidence, value, _rule_reasons(records[index], weights))
+    return verdicts
+
+
+def _score_model(matrix, model: dict) -> list:
+    columns = [_COLUMN[name] for name in model['features']]
+    scaled = (matrix[:, columns] - np.asarray(model['mean'])) / np.asarray(model['scale'])
+    contributions = scaled * np.asarray(model['weights'])
+    probabilities = 1.0 / (1.0 + np.exp(-(contributions.sum(axis=1) + model['bias'])))
+
+    verdicts = []
+    for probability, row in zip(probabilities.tolist(), contributions):
+        is_nsfw = probability >= model.get('threshold', 0.5)
+        if is_nsfw:
+            confidence = next((name for threshold, name in MODEL_CONFIDENCE_LEVELS if probability >= threshold), 'low')
+        else:
+            confidence = 'none'
+        top = [position for position in np.argsort(row)[::-1][:3] if row[position] > 0]
+        reasons = [f"Model probability {probability:.2f}"]
+        reasons.extend(f"{model['features'][position]} (+{row[position]:.2f})" for position in top)
+        verdicts.append(NsfwVerdict(is_nsfw, confidence, _as_score(probability * 10), reasons))
+    return verdicts
+
+
+# path -> (mtime, model); model is None when the file at that mtime (or a missing file, mtime None) is unusable
+_model_cache = {}
+
+
+def load_model(path: str):
+    """
+    Load a model file written by train, reloading it when it changes (None if unusable)
+
+    A missing or invalid file is logged once, until the file changes
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    cached = _model_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        if mtime is None:
+            raise FileNotFoundError("file not found")
+        with open(path) as f:
+            model = json.load(f)
+        unknown = [name for name in model['features'] if name not in _COLUMN]
+        if unknown:
+            raise ValueError(f"unknown features {unknown}")
+        _model_cache[path] = (mtime, model)
+        log_info(f"Loaded channel scoring model {path} ({len(model['features'])} features)")
+        return model
+    except Exception as e:
+        log_error(f"Could not load channel scoring model {path}, using rule weights: {e}")
+        _model_cache[path] = (mtime, None)
+        return None
+
+
+def _log_features(records: list, matrix, verdicts: list, path: str):
+    try:
+        with open(path, 'a') as f:
+            for record, row, verdict in zip(records, matrix.tolist(), verdicts):
+                entry = {'channel_id': record.channel_id, **dict(zip(FEATURES, row)),
+                         'is_nsfw': verdict.is_nsfw, 'score': verdict.score}
+                f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        log_error(f"Could not write channel features to {path}: {e}")
+
+
+def score_nsfw(records: list) -> list:
+    """
+    Score a batch of channels for NSFW content
+
+    Args:
+        records: ChannelFeatures from extract_channel_features
+
+    Returns:
+        list: One NsfwVerdict per record, in order
+    """
+    if not records:
+        return []
+
+    current = settings()
+    weights = current.get('NSFW_SCORE_WEIGHTS')
+    model_path = current.get('CHANNEL_SCORE_MODEL')
+    model = load_model(model_path) if model_path else None
+    log_path = current.get('CHANNEL_FEATURE_LOG')
+
+    # A handful of channels (one profile's) is cheaper to score without building arrays
+    if model is None and not log_path and len(records) < SMALL_BATCH and set(weights) <= set(RULE_FEATURES):
+        return [_score_rules_one(record, weights) for record in records]
+
+    matrix = feature_matrix(records)
+    if model is not None:
+        verdicts = _score_model(matrix, model)
+    else:
+        verdicts = _score_rules(records, matrix, weights)
+
+    if log_path:
+        _log_features(records, matrix, verdicts, log_path)
+    return verdicts
+
+
+def score_structure(records: list, threshold_members: int = 100) -> list:
+    """
+    Batch form of is_suspicious_channel's member, reaction and growth checks
+
+    Returns:
+        list: (is_suspicious: bool, reasons: list) per record, in order
+    """
+    if not records:
+        return []
+
+    if len(records) < SMALL_BATCH:
+        low = [record.members_count < threshold_members for record in records]
+        reacting = [record.reacted_messages > 0 and record.avg_reactions > record.members_count * 0.5
+                    for record in records]
+        growing = [record.recent_joins > record.members_count * 0.3 for record in records]
+    else:
+        matrix = feature_matrix(records, threshold_members)
+        low = matrix[:, _COLUMN['low_members']].astype(bool).tolist()
+        reacting = matrix[:, _COLUMN['high_reaction_rate']].astype(bool).tolist()
+        growing = matrix[:, _COLUMN['rapid_growth']].astype(bool).tolist()
+
+    results = []
+    for record, is_low, is_reacting, is_growing in zip(records, low, reacting, growing):
+        reasons = []
+        if is_low:
+            reasons.append(f"Low member count ({record.members_count})")
+        if is_reacting:
+            reasons.append("Unusually high reaction rate")
+        if is_growing:
+            reasons.append("Rapid member growth detected")
+        results.append((len(reasons) > 0, reasons))
+    return results
+
+
+def train_model(matrix, labels, features: tuple = FEATURES, epochs: int = 3000,
+                learning_rate: float = 0.5, l2: float = 0.001) -> dict:
+    """
+    Fit a logistic regression on standardized features by gradient descent
+
+    Args:
+        matrix: Feature matrix (rows x len(FEATURES))
+        labels: 1 for NSFW channels, 0 for clean ones
+        features: Columns to use
+
+    Returns:
+        dict: Model for CHANNEL_SCORE_MODEL (save it as JSON)
+    """
+    columns = [_COLUMN[name] for name in features]
+    x = np.asarray(matrix, dtype=np.float64)[:, columns]
+    y = np.asarray(labels, dtype=np.float64)
+
+    mean = x.mean(axis=0)
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1.0
+    x = (x - mean) / scale
+
+    weights = np.zeros(len(columns))
+    bias = 0.0
+    for _ in range(epochs):
+        error = 1.0 / (1.0 + np.exp(-(x @ weights + bias))) - y
+        weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+        bias -= learning_rate * error.mean()
+
+    accuracy = float(((x @ weights + bias >= 0) == (y == 1)).mean())
+    return {
+        'features': list(features),
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+        'weights': weights.tolist(),
+        'bias': float(bias),
+        'threshold': 0.5,
+        'training_rows': int(len(y)),
+        'training_accuracy': accuracy,
+    }
+
+
+def _train_command(rows_path: str, model_path: str):
+    rows = []
+    with open(rows_path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if 'label' in row:
+                    rows.append(row)
+    if not rows:
+        sys.exit(f"No labelled rows in {rows_path}")
+
+    matrix = np.array([[row.get(name, 0.0) for name in FEATURES] for row in rows])
+    model = train_model(matrix, [row['label'] for row in rows])
+    with open(model_path, 'w') as f:
+        json.dump(model, f, indent=2)
+    print(f"Trained on {model['training_rows']} rows, training accuracy {model['training_accuracy']:.1%}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'train':
+        sys.exit("Usage: python -m helper.channel_scoring train LABELLED_ROWS.jsonl MODEL.json")
+    _train_command(sys.argv[2], sys.argv[3])
@@ -0,0 +1,179 @@
+"""
+Claims on moderation events, for redundant bot instances sharing MongoDB
+Every instance receives the same updates. Before analyzing a user for a
+live event, an instance claims (chat_id, user_id, event) in the
+moderation_claims collection. The instance that gets the claim analyzes,
+acts and stores its verdict on the claim; the others wait for that verdict
+and reuse it without calling Telegram or acting.
+
+A claim is a lease: the owner renews it while it works, and once an owner
+stops renewing (crash, restart) another instance takes the claim over when
+it expires. Finished claims are kept for CLAIM_RESULT_SECONDS so instances
+that see the update late reuse the verdict too. If MongoDB cannot be
+reached, every instance proceeds as if it owned the claim.
+"""
+
+import asyncio
+import os
+import secrets
+import socket
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from helper.utils import log_warning, log_debug, claims_collection
+from helper.runtime_config import settings
+from helper.models import ProfileAnalysis
+
+from config import CLAIM_LEASE_SECONDS, CLAIM_RESULT_SECONDS, CLAIM_POLL_SECONDS
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+# Sources whose analyses are claimed, by the event they are claimed under. Retries,
+# re-verification and audits re-analyze on purpose and are not claimed.
+CLAIMED_EVENTS = {'join': 'join', 'message': 'activity', 'reaction': 'activity'}
+
+claim_stats = {'owned': 0, 'reused': 0, 'taken_over': 0, 'lost': 0, 'unavailable': 0}
+
+
+class Claim:
+    """An instance's claim on one (chat_id, user_id, event)"""
+
+    __slots__ = ('chat_id', 'user_id', 'event', 'owned', 'result', '_renewer')
+
+    def __init__(self, chat_id: int, user_id: int, event: str):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.event = event
+        self.owned = False
+        self.result = None  # verdict stored by the owning instance, for claims owned elsewhere
+        self._renewer = None  # task renewing the lease while this instance owns the claim
+
+    @property
+    def key(self) -> dict:
+        return {'chat_id': self.chat_id, 'user_id': self.user_id, 'event': self.event}
+
+    @property
+    def coordinated(self) -> bool:
+        """Whether the claim is held in MongoDB (False without CLAIMS_ENABLED or when MongoDB failed)"""
+        return self.event is not None
+
+    def analysis(self):
+        """The owning instance's ProfileAnalysis, or None"""
+        if not self.result or self.result.get('analysis') is None:
+            return None
+        return ProfileAnalysis.from_dict(self.result['analysis'])
+
+
+async def _try_acquire(claim: Claim) -> bool:
+    """Insert the claim, or take it over if it has expired"""
+    now = datetime.now()
+    try:
+        previous = await claims_collection.find_one_and_update(
+            {**claim.key, 'expires_at': {'$lte': now}},
+            {
+                '$set': {'owner': INSTANCE_ID, 'claimed_at': now,
+                         'expires_at': now + timedelta(seconds=CLAIM_LEASE_SECONDS)},
+                '$unset': {'result': ''}
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        return False  # Held by another instance
+
+    if previous is not None and previous.get('result') is None:
+        claim_stats['taken_over'] += 1
+        log_warning(f"Took over the expired {claim.event} claim of {previous.get('owner')} "
+                    f"on user {claim.user_id} in {claim.chat_id}")
+    return True
+
+
+async def _renew(claim: Claim):
+    """Extend the lease every third of CLAIM_LEASE_SECONDS while the analysis runs"""
+    while True:
+        await asyncio.sleep(CLAIM_LEASE_SECONDS / 3)
+        try:
+            result = await claims_collection.update_one(
+                {**claim.key, 'owner': INSTANCE_ID, 'result': {'$exists': False}},
+                {'$set': {'expires_at': datetime.now() + timedelta(seconds=CLAIM_LEASE_SECONDS)}}
+            )
+        except Exception as e:
+            log_warning(f"Could not renew the {claim.event} claim on user {claim.user_id}: {e}")
+            continue
+        if result.matched_count == 0:
+            claim_stats['lost'] += 1
+            log_warning(f"Lost the {claim.event} claim on user {claim.user_id} in {claim.chat_id}")
+            return
+
+
+async def acquire_claim(chat_id: int, user_id: int, source: str) -> Claim:
+    """
+    Claim the analysis of a user for the event behind `source`
+
+    Waits while another instance holds the claim, until that instance stores
+    its verdict (claim.owned is False, claim.result is set) or its lease
+    expires and this instance takes over (claim.owned is True).
+
+    Returns:
+        Claim: Owned unless another instance already handled the event
+    """
+    claim = Claim(chat_id, user_id, CLAIMED_EVENTS.get(source))
+    if claim.event is None or not settings().get('CLAIMS_ENABLED'):
+        claim.event = None
+        claim.owned = True
+        return claim
+
+    try:
+        while True:
+            if await _try_acquire(claim):
+                claim.owned = True
+                claim_stats['owned'] += 1
+                claim._renewer = asyncio.create_task(_renew(claim))
+                return claim
+
+            doc = await claims_collection.find_one(claim.key, {'result': 1, 'owner': 1})
+            if doc and doc.get('result') is not None:
+                claim.result = doc['result']
+                claim_stats['reused'] += 1
+                log_debug(f"Reusing the {claim.event} verdict of {doc.get('owner')} for user {user_id}")
+                return claim
+            await asyncio.sleep(CLAIM_POLL_SECONDS)
+    except Exception as e:
+        claim_stats['unavailable'] += 1
+        log_warning(f"Claims unavailable, analyzing user {user_id} without one: {e}")
+        claim.event = None
+        claim.owned = True
+        return claim
+
+
+async def finish_claim(claim: Claim, analysis=None, acted: bool = False, reason: str = ""):
+    """
+    Store the owner's verdict on the claim for the other instances, or give
+    the claim up (analysis None) so another instance can retry right away
+    """
+    if claim._renewer is not None:
+        claim._renewer.cancel()
+        claim._renewer = None
+    if not claim.owned or not claim.coordinated:
+        return
+
+    try:
+        if analysis is None:
+            await claims_collection.delete_one({**claim.key, 'owner': INSTANCE_ID, 'result': {'$exists': False}})
+            return
+        await claims_collection.update_one(
+            {**claim.key, 'owner': INSTANCE_ID},
+            {'$set': {
+                'result': {
+                    'analysis': analysis.to_dict(),
+                    'acted': acted,
+                    'reason': reason,
+                    'instance': INSTANCE_ID,
+                },
+                'expires_at': datetime.now() + timedelta(seconds=CLAIM_RESULT_SECONDS)
+            }}
+        )
+    except Exception as e:
+        log_warning(f"Could not store the {claim.event} verdict for user {claim.user_id}: {e}")
@@ -0,0 +1,175 @@
+"""
+Per-chat fair scheduling of profile analyses
+Every chat gets its own FIFO queue and the shared analysis slots are handed
+out by deficit round-robin over the chats with queued work, so a busy group
+only ever uses its weighted share of the capacity (and at most its cap of
+concurrent analyses) while quiet groups are served promptly
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from helper.runtime_config import settings
+
+from config import ANALYSIS_CONCURRENCY
+
+# Waits remembered per chat for the percentile in the stats
+WAIT_SAMPLES = 200
+
+
+class ChatWaitStats:
+    """Queue wait times of one chat"""
+
+    __slots__ = ('admitted', 'total_wait', 'max_wait', 'recent')
+
+    def __init__(self):
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent = deque(maxlen=WAIT_SAMPLES)
+
+    def add(self, wait: float):
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent.append(wait)
+
+    def p95(self) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class FairScheduler:
+    """Weighted deficit round-robin over per-chat queues of analysis jobs"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._queues = {}  # chat_id -> deque of (future, enqueued_at)
+        self._round = deque()  # chat IDs with queued jobs, in round-robin order
+        self._deficit = {}  # chat_id -> unspent share of the current round
+        self._running = {}  # chat_id -> analyses holding a slot
+        self._in_use = 0
+        self.wait_stats = {}  # chat_id -> ChatWaitStats
+
+    @staticmethod
+    def _weight(chat_id: int) -> float:
+        # A zero weight would never earn a turn
+        return max(settings().get('CHAT_SCHEDULER_WEIGHTS').get(chat_id, 1.0), 0.01)
+
+    @staticmethod
+    def _cap(chat_id: int) -> int:
+        current = settings()
+        return current.get('CHAT_SCHEDULER_CAPS').get(chat_id, current.get('CHAT_MAX_CONCURRENT_ANALYSES'))
+
+    def _enqueue(self, chat_id: int, future: asyncio.Future, priority: bool):
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        if not queue:
+            self._round.append(chat_id)
+            self._deficit[chat_id] = 0.0
+        entry = (future, time.monotonic())
+        if priority:
+            queue.appendleft(entry)
+        else:
+            queue.append(entry)
+
+    def _grant(self, chat_id: int) -> bool:
+        """Hand a slot to the oldest live job of the chat; False if its queue ran dry"""
+        queue = self._queues[chat_id]
+        while queue:
+            future, enqueued_at = queue.popleft()
+            if future.cancelled():
+                continue
+            future.set_result(None)
+            self._in_use += 1
+            self._running[chat_id] = self._running.get(chat_id, 0) + 1
+            self.wait_stats.setdefault(chat_id, ChatWaitStats()).add(time.monotonic() - enqueued_at)
+            return True
+        return False
+
+    def _dispatch(self):
+        capped = 0
+        while self._in_use < self.concurrency and self._round and capped < len(self._round):
+            chat_id = self._round[0]
+
+            if self._running.get(chat_id, 0) >= self._cap(chat_id):
+                self._round.rotate(-1)
+                capped += 1
+                continue
+
+            if self._deficit[chat_id] < 1:
+                # New turn for this chat: add its share, then serve it or move on
+                self._deficit[chat_id] += self._weight(chat_id)
+                if self._deficit[chat_id] < 1:
+                    self._round.rotate(-1)
+                    continue
+
+            if self._grant(chat_id):
+                self._deficit[chat_id] -= 1
+                capped = 0
+
+            if not self._queues[chat_id]:
+                self._round.popleft()
+                del self._deficit[chat_id]
+            elif self._deficit[chat_id] < 1:
+                self._round.rotate(-1)
+
+    def _release(self, chat_id: int):
+        self._in_use -= 1
+        self._running[chat_id] -= 1
+        if not self._running[chat_id]:
+            del self._running[chat_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, chat_id: int, priority: bool = False):
+        """
+        Wait for the chat's turn to run an analysis and hold the slot for the block
+
+        Args:
+            chat_id: Chat the analysis is charged to
+            priority: Queue ahead of the chat's other jobs (join checks)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, future, priority)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled right after being granted: give the slot back
+            if future.done() and not future.cancelled():
+                self._release(chat_id)
+            raise
+
+        try:
+            yield
+        finally:
+            self._release(chat_id)
+
+    def stats(self) -> dict:
+        """Per-chat queue depth, running analyses and wait times (seconds)"""
+        chat_ids = set(self.wait_stats) | set(self._running) | {c for c, q in self._queues.items() if q}
+        result = {}
+        for chat_id in chat_ids:
+            waits = self.wait_stats.get(chat_id) or ChatWaitStats()
+            result[chat_id] = {
+                'queued': len(self._queues.get(chat_id, ())),
+                'running': self._running.get(chat_id, 0),
+                'admitted': waits.admitted,
+                'avg_wait': waits.total_wait / waits.admitted if waits.admitted else 0.0,
+                'p95_wait': waits.p95(),
+                'max_wait': waits.max_wait
+            }
+        return result
+
+
+scheduler = FairScheduler(ANALYSIS_CONCURRENCY)
+
+
+def scheduler_stats() -> dict:
+    return scheduler.stats()
@@ -0,0 +1,179 @@
+"""
+Compact records for profile analysis results
+Channels keep summary statistics of their recent reactions and joins instead
+of the raw per-message lists, findings reference channels instead of copying
+them, and every record converts to and from plain tuples/dicts for caching.
+"""
+
+from datetime import datetime
+
+
+class ChannelInfo:
+    """A channel owned by the analyzed user, with summarized recent activity"""
+
+    __slots__ = ('channel_id', 'title', 'username', 'members_count', 'source',
+                 'reacted_messages', 'total_reactions', 'max_reactions', 'recent_joins', 'photo')
+
+    def __init__(self, channel_id: int, title: str, username: str, members_count: int, source: str,
+                 reacted_messages: int = 0, total_reactions: int = 0, max_reactions: int = 0,
+                 recent_joins: int = 0, photo: tuple = None):
+        self.channel_id = channel_id
+        self.title = title or ""
+        self.username = username
+        self.members_count = members_count or 0
+        self.source = source
+        self.reacted_messages = reacted_messages
+        self.total_reactions = total_reactions
+        self.max_reactions = max_reactions
+        self.recent_joins = recent_joins
+        self.photo = tuple(photo) if photo else None  # (file_id, file_unique_id), see avatar_hash.photo_ref
+
+    @classmethod
+    def from_stats(cls, channel_id: int, stats: dict, reactions: list, recent_joins: list, source: str):
+        """
+        Build from get_channel_stats/get_recent_reactions/get_recent_joins results
+
+        Only counts are kept; the lists can be dropped by the caller.
+        """
+        counts = [reaction['reaction_count'] for reaction in reactions]
+        return cls(
+            channel_id, stats['title'], stats['username'], stats['members_count'], source,
+            reacted_messages=len(counts),
+            total_reactions=sum(counts),
+            max_reactions=max(counts, default=0),
+            recent_joins=len(recent_joins),
+            photo=stats.get('photo')
+        )
+
+    @property
+    def avg_reactions(self) -> float:
+        return self.total_reactions / self.reacted_messages if self.reacted_messages else 0.0
+
+    def to_tuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+
+class NsfwVerdict:
+    """Outcome of check_if_nsfw_channel"""
+
+    __slots__ = ('is_nsfw', 'confidence', 'score', 'reasons')
+
+    def __init__(self, is_nsfw: bool, confidence: str, score: int, reasons: tuple = ()):
+        self.is_nsfw = is_nsfw
+        self.confidence = confidence
+        self.score = score
+        self.reasons = tuple(reasons)
+
+    def to_tuple(self) -> tuple:
+        return (self.is_nsfw, self.confidence, self.score, self.reasons)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+
+# Placeholder for channels whose NSFW check failed or has not run (yet)
+NSFW_NOT_CHECKED = NsfwVerdict(False, 'none', 0)
+
+
+class ChannelFinding:
+    """Why a channel made the profile suspicious: a keyword match and/or NSFW content"""
+
+    __slots__ = ('channel', 'matched_keyword', 'nsfw')
+
+    def __init__(self, channel: ChannelInfo, matched_keyword: str, nsfw: NsfwVerdict):
+        self.channel = channel
+        self.matched_keyword = matched_keyword
+        self.nsfw = nsfw
+
+    @property
+    def is_nsfw(self) -> bool:
+        return self.nsfw.is_nsfw
+
+
+class ProfileAnalysis:
+    """
+    Result of analyze_user_profile
+
+    'partial' analyses stopped before every stage finished (deadline);
+    'incomplete' ones hit transient API errors, so missing signals mean
+    "not checked" rather than "clean".
+    """
+
+    __slots__ = ('user_id', 'bio', 'has_bio_mentions', 'bio_keywords', 'channels',
+                 'suspicious_channels', 'completed_stages', 'partial', 'failures', 'created_at',
+                 'avatar_match', 'trace')
+
+    def __init__(self, user_id: int, bio: str, has_bio_mentions: bool, bio_keywords: tuple,
+                 channels: tuple, suspicious_channels: tuple, completed_stages: tuple,
+                 partial: bool, failures: tuple = (), created_at: datetime = None,
+                 avatar_match: str = None, trace: dict = None):
+        self.user_id = user_id
+        self.bio = bio
+        self.has_bio_mentions = has_bio_mentions
+        self.bio_keywords = tuple(bio_keywords)
+        self.channels = tuple(channels)
+        self.suspicious_channels = tuple(suspicious_channels)
+        self.completed_stages = tuple(completed_stages)
+        self.partial = partial
+        self.failures = tuple(failures)
+        self.created_at = created_at or datetime.now()
+        self.avatar_match = avatar_match  # label of the blocked avatar the profile photo matched
+        self.trace = trace  # stages, API calls and cache hits so far (helper.trace.snapshot); not serialized
+
+    @property
+    def total_channels(self) -> int:
+        return len(self.channels)
+
+    @property
+    def nsfw_channels(self) -> tuple:
+        return tuple(finding for finding in self.suspicious_channels if finding.is_nsfw)
+
+    @property
+    def total_recent_joins(self) -> int:
+        return sum(channel.recent_joins for channel in self.channels)
+
+    @property
+    def is_suspicious(self) -> bool:
+        return self.has_bio_mentions or len(self.suspicious_channels) > 0 or self.avatar_match is not None
+
+    @property
+    def incomplete(self) -> bool:
+        return len(self.failures) > 0
+
+    def to_dict(self) -> dict:
+        """Plain, BSON/JSON friendly form; findings refer to channels by index"""
+        index = {id(channel): position for position, channel in enumerate(self.channels)}
+        return {
+            'user_id': self.user_id,
+            'bio': self.bio,
+            'has_bio_mentions': self.has_bio_mentions,
+            'bio_keywords': list(self.bio_keywords),
+            'channels': [list(channel.to_tuple()) for channel in self.channels],
+            'findings': [
+                [index[id(finding.channel)], finding.matched_keyword, list(finding.nsfw.to_tuple())]
+                for finding in self.suspicious_channels
+            ],
+            'completed_stages': list(self.completed_stages),
+            'partial': self.partial,
+            'failures': list(self.failures),
+            'created_at': self.created_at,
+            'avatar_match': self.avatar_match
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        channels = [ChannelInfo.from_tuple(values) for values in data['channels']]
+        findings = [
+            ChannelFinding(channels[position], keyword, NsfwVerdict.from_tuple(nsfw))
+            for position, keyword, nsfw in data['findings']
+        ]
+        return cls(
+            data['user_id'], data['bio'], data['has_bio_mentions'], data['bio_keywords'],
+            channels, findings, data['completed_stages'], data['partial'],
+            data.get('failures', ()), data.get('created_at'), data.get('avatar_match')
+        )
@@ -0,0 +1,298 @@
+"""
+Moderation helpers shared by the join check and sampled scans
+Decides whether an analysis warrants instant action and executes it through
+a bounded-concurrency executor that retries on FloodWait, drops repeat
+actions for the same user and batches chat notifications
+"""
+
+import asyncio
+import time
+
+from pyrogram import Client, errors
+from pyrogram.types import ChatPermissions
+
+from helper.utils import log_info, log_success, log_warning, log_error, log_debug, log_channel_info
+from helper.runtime_config import settings
+from helper.models import ProfileAnalysis
+
+from config import (
+    MODERATION_CONCURRENCY,
+    MODERATION_MAX_RETRIES,
+    MODERATION_DEDUP_SECONDS,
+    NOTIFICATION_BATCH_SECONDS
+)
+
+ACTION_TEXT = {'ban': 'banned', 'kick': 'kicked', 'mute': 'muted'}
+# Delay before retrying a failed unban of a kicked user; doubles with every further attempt
+UNBAN_RETRY_SECONDS = 30
+
+
+def decide_action(analysis: ProfileAnalysis, chat_id: int, on_join: bool = True):
+    """
+    Decide whether a profile analysis warrants instant action
+
+    Args:
+        analysis: Result of analyze_user_profile
+        chat_id: Chat ID whose settings apply
+        on_join: True for join checks, False for sampled scans of existing members
+
+    Returns:
+        tuple: (should_instant_action: bool, action_reason: str)
+    """
+    current = settings()
+    nsfw_auto_ban = current.get('AUTO_BAN_NSFW_ON_JOIN' if on_join else 'NSFW_AUTO_BAN', chat_id)
+    suspicious_auto_ban = current.get('AUTO_BAN_SUSPICIOUS_ON_JOIN' if on_join else 'AUTO_BAN_SUSPICIOUS', chat_id)
+
+    # Check NSFW first (highest priority)
+    nsfw_channels = analysis.nsfw_channels
+    if current.get('ENABLE_NSFW_DETECTION', chat_id) and nsfw_auto_ban and len(nsfw_channels) > 0:
+        action_reason = f"NSFW channels detected ({len(nsfw_channels)})"
+        log_warning(f"NSFW Auto-ban triggered: {action_reason}")
+        for finding in nsfw_channels[:3]:  # Log first 3
+            ch = finding.channel
+            log_channel_info(ch.title, ch.channel_id, f"NSFW - {finding.nsfw.confidence} confidence")
+        return True, action_reason
+
+    # Check suspicious channels (second priority)
+    if suspicious_auto_ban and len(analysis.suspicious_channels) > 0:
+        action_reason = f"Suspicious channels detected ({len(analysis.suspicious_channels)})"
+        log_warning(f"Suspicious Auto-ban triggered: {action_reason}")
+        for finding in analysis.suspicious_channels[:3]:  # Log first 3
+            ch = finding.channel
+            log_channel_info(ch.title, ch.channel_id, f"Matched: {finding.matched_keyword}")
+        return True, action_reason
+
+    # Profile photo reused from a known spam network
+    if suspicious_auto_ban and analysis.avatar_match is not None:
+        action_reason = f"Known spam avatar ({analysis.avatar_match})"
+        log_warning(f"Suspicious Auto-ban triggered: {action_reason}")
+        return True, action_reason
+
+    return False, ""
+
+
+class ModerationExecutor:
+    """
+    Runs moderation actions in the background with a bounded number of API calls in flight
+
+    Actions for a (chat, user) pair that was already acted on within
+    MODERATION_DEDUP_SECONDS are dropped. Notifications are collected per chat
+    and sent as a single message once NOTIFICATION_BATCH_SECONDS have passed.
+    """
+
+    def __init__(self, concurrency: int, max_retries: int, dedup_seconds: float, batch_seconds: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.dedup_seconds = dedup_seconds
+        self.batch_seconds = batch_seconds
+        self._recent = {}  # (chat_id, user_id) -> monotonic time of the accepted action
+        self._pending_notifications = {}  # chat_id -> list of notification entries
+        self._tasks = set()
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'executed': 0, 'failed': 0, 'flood_waits': 0,
+                      'unbans_failed': 0}
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _is_duplicate(self, key) -> bool:
+        now = time.monotonic()
+        if len(self._recent) > 10000:
+            cutoff = now - self.dedup_seconds
+            self._recent = {k: t for k, t in self._recent.items() if t >= cutoff}
+        last = self._recent.get(key)
+        if last is not None and now - last < self.dedup_seconds:
+            return True
+        self._recent[key] = now
+        return False
+
+    async def _call_with_retry(self, description: str, func, *args):
+        """
+        Await an API call in an executor slot, sleeping through FloodWait up to max_retries times
+
+        The slot is only held while the call runs, so other chats' actions
+        proceed while this one waits out a FloodWait.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    return await func(*args)
+            except errors.FloodWait as e:
+                self.stats['flood_waits'] += 1
+                if attempt == self.max_retries:
+                    raise
+                log_warning(f"FloodWait on {description}, retrying in {e.value}s")
+                await asyncio.sleep(e.value)
+
+    def submit(self, client: Client, chat_id: int, user_id: int, full_name: str, action: str,
+               reason: str, analysis: ProfileAnalysis, context: str = "on join") -> bool:
+        """
+        Queue a moderation action
+
+        Returns:
+            bool: True if the action was queued, False if it was a duplicate
+        """
+        key = (chat_id, user_id)
+        if self._is_duplicate(key):
+            self.stats['deduplicated'] += 1
+            log_debug(f"Skipping duplicate {action} for {full_name} [{user_id}] in chat {chat_id}")
+            return False
+
+        self.stats['submitted'] += 1
+        self._spawn(self._run(client, chat_id, user_id, full_name, action, reason, analysis, context))
+        return True
+
+    async def _run(self, client: Client, chat_id: int, user_id: int, full_name: str, action: str,
+                   reason: str, analysis: ProfileAnalysis, context: str):
+        executed = await self._execute(client, chat_id, user_id, full_name, action)
+
+        if not executed:
+            # Allow a later attempt instead of suppressing it as a duplicate
+            self._recent.pop((chat_id, user_id), None)
+            self.stats['failed'] += 1
+            return
+
+        self.stats['executed'] += 1
+        if not settings().get('SILENT_MODE', chat_id):
+            example = None
+            if analysis.suspicious_channels:
+                example = analysis.suspicious_channels[0].channel.title
+            self._queue_notification(client, chat_id, {
+                'user_id': user_id,
+                'full_name': full_name,
+                'action_text': ACTION_TEXT[action],
+                'reason': reason,
+                'context': context,
+                'suspicious_count': len(analysis.suspicious_channels),
+                'example': example
+            })
+
+    async def _execute(self, client: Client, chat_id: int, user_id: int, full_name: str, action: str) -> bool:
+        try:
+            if action == "ban":
+                await self._call_with_retry("ban", client.ban_chat_member, chat_id, user_id)
+                log_success(f"✅ User {full_name} has been BANNED")
+
+            elif action == "kick":
+                await self._call_with_retry("ban", client.ban_chat_member, chat_id, user_id)
+                try:
+                    await self._call_with_retry("unban", client.unban_chat_member, chat_id, user_id)
+                except Exception as e:
+                    # The user is out of the chat either way; only the unban is retried
+                    log_error(f"❌ Unban after kicking {full_name} failed, retrying in {UNBAN_RETRY_SECONDS}s: {e}")
+                    self._spawn(self._retry_unban(client, chat_id, user_id, full_name))
+                log_success(f"✅ User {full_name} has been KICKED")
+
+            elif action == "mute":
+                await self._call_with_retry(
+                    "restrict", client.restrict_chat_member,
+                    chat_id, user_id, ChatPermissions(can_send_messages=False)
+                )
+                log_success(f"✅ User {full_name} has been MUTED")
+            else:
+                log_error(f"Invalid AUTO_BAN_ACTION: {action}")
+                return False
+            return True
+
+        except errors.ChatAdminRequired:
+            log_error(f"❌ Failed to {action} {full_name}: Bot lacks admin permissions")
+        except errors.UserAdminInvalid:
+            log_error(f"❌ Failed to {action} {full_name}: Cannot restrict admin user")
+        except Exception as e:
+            log_error(f"❌ Failed to {action} {full_name}: {str(e)}")
+        return False
+
+    async def _retry_unban(self, client: Client, chat_id: int, user_id: int, full_name: str):
+        """Lift the ban of a kicked user whose unban failed, so they can rejoin"""
+        for attempt in range(self.max_retries):
+            await asyncio.sleep(UNBAN_RETRY_SECONDS * 2 ** attempt)
+            try:
+                await self._call_with_retry("unban", client.unban_chat_member, chat_id, user_id)
+                log_info(f"Unbanned kicked user {full_name} [{user_id}]")
+                return
+            except Exception as e:
+                log_warning(f"Unban of kicked user {full_name} [{user_id}] failed again: {e}")
+        self.stats['unbans_failed'] += 1
+        log_error(f"❌ Kicked user {full_name} [{user_id}] remains banned in chat {chat_id}")
+
+    def _queue_notification(self, client: Client, chat_id: int, entry: dict):
+        pending = self._pending_notifications.get(chat_id)
+        if pending is None:
+            self._pending_notifications[chat_id] = [entry]
+            self._spawn(self._flush_later(client, chat_id))
+        else:
+            pending.append(entry)
+
+    async def _flush_later(self, client: Client, chat_id: int):
+        await asyncio.sleep(self.batch_seconds)
+        entries = self._pending_notifications.pop(chat_id, [])
+        if not entries:
+            return
+
+        text = format_notification(entries)
+        try:
+            await self._call_with_retry("send_message", client.send_message, chat_id, text)
+        except Exception as e:
+            log_error(f"Failed to send notification: {e}")
+
+
+def format_notification(entries: list) -> str:
+    """Build one chat notification for a batch of moderation actions"""
+    if len(entries) == 1:
+        entry = entries[0]
+        mention = f"[{entry['full_name']}](tg://user?id={entry['user_id']})"
+
+        notification_text = f"**🚫 {mention} has been {entry['action_text']} {entry['context']}!**\n"
+        notification_text += f"**Reason:** {entry['reason']}\n"
+
+        if entry['suspicious_count'] > 0:
+            notification_text += f"**Suspicious Channels:** {entry['suspicious_count']}\n"
+            if entry['example']:
+                notification_text += f"**Example:** {entry['example']}"
+        return notification_text
+
+    actions = list(dict.fromkeys(entry['action_text'] for entry in entries))
+    action_text = actions[0] if len(actions) == 1 else ", ".join(actions[:-1]) + f" or {actions[-1]}"
+    notification_text = f"**🚫 {len(entries)} users have been {action_text}:**\n"
+    for entry in entries[:20]:
+        mention = f"[{entry['full_name']}](tg://user?id={entry['user_id']})"
+        notification_text += f"• {mention} — {entry['action_text']} {entry['context']} ({entry['reason']})\n"
+    if len(entries) > 20:
+        notification_text += f"…and {len(entries) - 20} more"
+    return notification_text
+
+
+executor = ModerationExecutor(
+    MODERATION_CONCURRENCY,
+    MODERATION_MAX_RETRIES,
+    MODERATION_DEDUP_SECONDS,
+    NOTIFICATION_BATCH_SECONDS
+)
+
+
+def enforce_verdict(client: Client, chat_id: int, user_id: int, full_name: str,
+                    analysis: ProfileAnalysis, action_reason: str, context: str = "on join") -> bool:
+    """
+    Queue the chat's AUTO_BAN_ACTION on a user; the chat is notified unless SILENT_MODE is on
+
+    Args:
+        client: Pyrogram client
+        chat_id: Chat ID
+        user_id: User ID to act on
+        full_name: User's display name for logs and notification
+        analysis: Result of analyze_user_profile
+        action_reason: Human readable reason from decide_action
+        context: Short description of what triggered the check (e.g. "on join")
+
+    Returns:
+        bool: True if the action was queued, False if it duplicates a recent action
+    """
+    auto_ban_action = settings().get('AUTO_BAN_ACTION', chat_id)
+
+    log_warning(f"Queueing instant action on {full_name} [{user_id}]")
+    log_info(f"Action type: {auto_ban_action}")
+
+    return executor.submit(client, chat_id, user_id, full_name, auto_ban_action,
+                           action_reason, analysis, context)
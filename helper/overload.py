@@ -0,0 +1,146 @@
+"""
+Overload protection for the single event loop
+Measures event-loop lag, in-flight Telegram API calls and pending profile
+analyses, and sheds low-value work in steps while they stay high:
+
+    level 1: no message sampling, no debug logging
+    level 2: no reaction scans either
+    level 3: NSFW checks skip channel history
+
+Escalation is immediate; recovery goes down one level at a time once the
+signals have stayed below the current level for OVERLOAD_RECOVERY_SECONDS.
+Join checks are never shed.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+
+from pyrogram import Client
+
+from helper.utils import log_warning, log_success, set_debug_logging
+from helper.trace import count_api_call
+
+from config import (
+    OVERLOAD_SAMPLE_SECONDS,
+    OVERLOAD_LAG_MS,
+    OVERLOAD_API_CALLS,
+    OVERLOAD_PENDING_ANALYSES,
+    OVERLOAD_RECOVERY_SECONDS
+)
+
+LEVEL_NAMES = ('normal', 'no sampling', 'no reaction scans', 'no NSFW history')
+
+_state = {
+    'level': 0,
+    'lag_ms': 0.0,
+    'api_calls': 0,
+    'pending_analyses': 0,
+    'transitions': 0,
+    'shed': {'message': 0, 'reaction': 0, 'nsfw_history': 0},
+}
+_inflight_api_calls = 0
+
+
+@contextmanager
+def track_api_call(method: str = None):
+    """Count a Telegram API call as in flight for the duration of the block (and in the decision trace)"""
+    global _inflight_api_calls
+    if method:
+        count_api_call(method)
+    _inflight_api_calls += 1
+    try:
+        yield
+    finally:
+        _inflight_api_calls -= 1
+
+
+class TrackedClient(Client):
+    """Pyrogram client that counts raw API calls in flight"""
+
+    async def invoke(self, query, *args, **kwargs):
+        with track_api_call(type(query).__name__):
+            return await super().invoke(query, *args, **kwargs)
+
+
+def overload_level() -> int:
+    return _state['level']
+
+
+def allow_scan(source: str) -> bool:
+    """Return False (and count it) if activity-triggered scans from `source` are being shed"""
+    shed_from = 1 if source == 'message' else 2 if source == 'reaction' else None
+    if shed_from is None or _state['level'] < shed_from:
+        return True
+    _state['shed'][source] += 1
+    return False
+
+
+def allow_nsfw_history() -> bool:
+    """Return False (and count it) if NSFW checks must not read channel history"""
+    if _state['level'] < 3:
+        return True
+    _state['shed']['nsfw_history'] += 1
+    return False
+
+
+def overload_stats() -> dict:
+    return {**_state, 'level_name': LEVEL_NAMES[_state['level']], 'shed': dict(_state['shed'])}
+
+
+def _signal_level(value: float, thresholds: list) -> int:
+    """Number of thresholds (ascending, one per level) that value reaches"""
+    return sum(1 for threshold in thresholds if value >= threshold)
+
+
+def _set_level(level: int):
+    previous = _state['level']
+    _state['level'] = level
+    _state['transitions'] += 1
+    set_debug_logging(level == 0)
+
+    details = (f"lag {_state['lag_ms']:.0f}ms, {_state['api_calls']} API calls in flight, "
+               f"{_state['pending_analyses']} pending analyses")
+    if level > previous:
+        log_warning(f"Overload level {previous} -> {level} ({LEVEL_NAMES[level]}): {details}")
+    else:
+        log_success(f"Overload level {previous} -> {level} ({LEVEL_NAMES[level]}): {details}")
+
+
+async def run_overload_monitor(pending_analyses):
+    """
+    Sample load signals forever and move between degradation levels
+
+    Args:
+        pending_analyses: Callable returning the number of profile analyses in flight
+    """
+    calm_since = None
+
+    while True:
+        expected = time.perf_counter() + OVERLOAD_SAMPLE_SECONDS
+        await asyncio.sleep(OVERLOAD_SAMPLE_SECONDS)
+        # A busy loop wakes the sleeper late; the delay is the loop lag
+        _state['lag_ms'] = max(0.0, (time.perf_counter() - expected) * 1000)
+        _state['api_calls'] = _inflight_api_calls
+        _state['pending_analyses'] = pending_analyses()
+
+        target = max(
+            _signal_level(_state['lag_ms'], OVERLOAD_LAG_MS),
+            _signal_level(_state['api_calls'], OVERLOAD_API_CALLS),
+            _signal_level(_state['pending_analyses'], OVERLOAD_PENDING_ANALYSES)
+        )
+        level = _state['level']
+
+        if target > level:
+            calm_since = None
+            _set_level(target)
+        elif target < level:
+            now = time.monotonic()
+            if calm_since is None:
+                calm_since = now
+            elif now - calm_since >= OVERLOAD_RECOVERY_SECONDS:
+                # Step down one level, then wait for another calm period
+                calm_since = now
+                _set_level(level - 1)
+        else:
+            calm_since = None
@@ -0,0 +1,241 @@
+"""
+On-demand sampling profiler for the running bot
+/profile starts it for a number of seconds without a restart or external
+tools. A daemon thread samples the event loop thread's stack every
+PROFILE_INTERVAL_MS (nothing is traced between samples), event loop
+callbacks are timed by wrapping Handle._run, and tasks are counted by
+coroutine once a second. The result is a collapsed-stack file (one
+"frame;frame;frame count" line per stack, for flamegraph.pl or speedscope)
+and a summary of the top frames, slowest callbacks and most numerous tasks.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from helper.utils import log_info, log_success
+
+from config import PROFILE_INTERVAL_MS, PROFILE_SLOW_CALLBACK_MS, PROFILE_TOP_N, PROFILE_DIR
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_original_handle_run = asyncio.events.Handle._run
+
+# Running profile (see run_profile), or None
+_session = None
+# filename -> shortened path shown in frame labels
+_paths = {}
+
+
+def _short_path(filename: str) -> str:
+    path = _paths.get(filename)
+    if path is None:
+        if filename.startswith(_ROOT):
+            path = filename[len(_ROOT):]
+        elif 'site-packages' + os.sep in filename:
+            path = filename.split('site-packages' + os.sep, 1)[1]
+        else:
+            path = os.path.basename(filename)
+        _paths[filename] = path
+    return path
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(code) -> bool:
+    """Whether the innermost frame is the event loop waiting in its selector"""
+    return code.co_name == 'select' and code.co_filename.endswith('selectors.py')
+
+
+def _callback_name(callback) -> str:
+    """Name a callback by the coroutine of the task it steps, or by its function"""
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return f"task {getattr(coro, '__qualname__', type(coro).__name__)}"
+    callback = getattr(callback, 'func', callback)  # functools.partial
+    return getattr(callback, '__qualname__', type(callback).__name__)
+
+
+class _Sampler(threading.Thread):
+    """Daemon thread counting the stacks of one thread, innermost frame last"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # tuple of code objects -> samples
+        self.sampling_seconds = 0.0
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_sample = time.perf_counter()
+        while not self.stopped.wait(max(0.0, next_sample - time.perf_counter())):
+            next_sample += self.interval
+            started = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+            self.sampling_seconds += time.perf_counter() - started
+
+
+class _Session:
+    __slots__ = ('sampler', 'callbacks', 'task_peaks', 'peak_tasks', 'started', 'stop')
+
+    def __init__(self, sampler: _Sampler):
+        self.sampler = sampler
+        self.callbacks = {}  # name -> [count, total seconds, max seconds, slow count]
+        self.task_peaks = Counter()  # coroutine -> most tasks seen at once
+        self.peak_tasks = 0
+        self.started = time.perf_counter()
+        self.stop = asyncio.Event()
+
+
+def _timed_handle_run(self):
+    started = time.perf_counter()
+    try:
+        _original_handle_run(self)
+    finally:
+        elapsed = time.perf_counter() - started
+        session = _session
+        if session is not None:
+            name = _callback_name(self._callback)
+            entry = session.callbacks.get(name)
+            if entry is None:
+                entry = session.callbacks[name] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            if elapsed * 1000 >= PROFILE_SLOW_CALLBACK_MS:
+                entry[3] += 1
+
+
+def _count_tasks(session: _Session):
+    counts = Counter()
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        counts[getattr(coro, '__qualname__', type(coro).__name__)] += 1
+    session.peak_tasks = max(session.peak_tasks, sum(counts.values()))
+    for name, count in counts.items():
+        if count > session.task_peaks[name]:
+            session.task_peaks[name] = count
+
+
+def is_profiling() -> bool:
+    return _session is not None
+
+
+def stop_profile() -> bool:
+    """End the running profile early; returns False if none is running"""
+    if _session is None:
+        return False
+    _session.stop.set()
+    return True
+
+
+def _summary(session: _Session, duration: float) -> str:
+    stacks = session.sampler.stacks
+    total = sum(stacks.values())
+    idle = sum(count for stack, count in stacks.items() if _is_idle(stack[-1]))
+    busy = max(total - idle, 1)
+
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        if _is_idle(stack[-1]):
+            continue
+        own[stack[-1]] += count
+        for code in set(stack):
+            inclusive[code] += count
+
+    lines = [
+        f"Profile of {duration:.1f}s: {total} samples every {PROFILE_INTERVAL_MS}ms, "
+        f"event loop busy {(total - idle) / total:.0%}" if total else f"Profile of {duration:.1f}s: no samples",
+        f"Sampler cost: {session.sampler.sampling_seconds * 1000:.0f}ms",
+        "",
+        f"Top {PROFILE_TOP_N} functions by own time (busy samples):",
+    ]
+    for code, count in own.most_common(PROFILE_TOP_N):
+        lines.append(f"  {count / busy:6.1%}  {_frame_label(code)}")
+    lines += ["", f"Top {PROFILE_TOP_N} functions including callees:"]
+    for code, count in inclusive.most_common(PROFILE_TOP_N):
+        lines.append(f"  {count / busy:6.1%}  {_frame_label(code)}")
+
+    callbacks = sorted(session.callbacks.items(), key=lambda item: item[1][1], reverse=True)
+    calls = sum(entry[0] for _, entry in callbacks)
+    slow = sum(entry[3] for _, entry in callbacks)
+    lines += ["", f"Event loop callbacks: {calls} run, {slow} slower than {PROFILE_SLOW_CALLBACK_MS}ms; "
+                  f"top {PROFILE_TOP_N} by total time:"]
+    for name, (count, seconds, longest, slow_count) in callbacks[:PROFILE_TOP_N]:
+        lines.append(f"  {seconds * 1000:8.0f}ms total  {count:6} runs  max {longest * 1000:6.1f}ms  "
+                     f"{slow_count:4} slow  {name}")
+
+    lines += ["", f"Tasks: peak {session.peak_tasks} at once; top {PROFILE_TOP_N} coroutines by peak count:"]
+    for name, count in session.task_peaks.most_common(PROFILE_TOP_N):
+        lines.append(f"  {count:6}  {name}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_results(session: _Session, summary: str) -> tuple:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+    folded = Counter()
+    for stack, count in session.sampler.stacks.items():
+        folded[";".join(_frame_label(code) for code in stack)] += count
+    with open(base + '.folded', 'w') as f:
+        for stack, count in folded.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(base + '.txt', 'w') as f:
+        f.write(summary)
+    return base + '.folded', base + '.txt'
+
+
+async def run_profile(seconds: float) -> dict:
+    """
+    Profile the event loop for `seconds` (or until stop_profile)
+
+    Returns:
+        dict: 'folded' and 'summary' file paths and the summary 'text',
+              or None if a profile is already running
+    """
+    global _session
+    if _session is not None:
+        return None
+
+    sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    session = _Session(sampler)
+    _session = session
+    asyncio.events.Handle._run = _timed_handle_run
+    sampler.start()
+    log_info(f"Profiling for {seconds:.0f}s")
+
+    try:
+        deadline = session.started + seconds
+        while not session.stop.is_set() and time.perf_counter() < deadline:
+            _count_tasks(session)
+            try:
+                await asyncio.wait_for(session.stop.wait(), timeout=min(1.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        sampler.stopped.set()
+        asyncio.events.Handle._run = _original_handle_run
+        _session = None
+    sampler.join()
+
+    summary = _summary(session, time.perf_counter() - session.started)
+    folded_path, summary_path = _write_results(session, summary)
+    log_success(f"Profile written to {folded_path}")
+    return {'folded': folded_path, 'summary': summary_path, 'text': summary}
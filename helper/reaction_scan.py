@@ -0,0 +1,163 @@
+"""
+Bulk scan of the users who reacted to recent messages
+Walks the last N messages of a chat with get_chat_history, pages the
+reactors of every message that has reactions, and streams each user the
+first time they are seen into a bounded queue. REACTION_SCAN_CONCURRENCY
+workers drain the queue through the regular profile scan (and so through
+the fair analysis scheduler) under an API budget, while a progress message
+is edited every REACTION_SCAN_PROGRESS_INTERVAL seconds.
+"""
+
+import asyncio
+import time
+
+from pyrogram import Client, errors
+
+from helper.utils import log_info, log_success, log_warning, log_error, get_admin_ids
+from helper.channel_checker import iter_message_reactors
+from helper.audit import scan_member
+from helper.sampler import ApiBudget
+
+from config import (
+    REACTION_SCAN_CONCURRENCY,
+    REACTION_SCAN_API_CALLS_PER_MINUTE,
+    REACTION_SCAN_PROGRESS_INTERVAL
+)
+
+# chat_id -> running reaction scan task
+_running = {}
+
+
+def is_reaction_scan_running(chat_id: int) -> bool:
+    task = _running.get(chat_id)
+    return task is not None and not task.done()
+
+
+def stop_reaction_scan(chat_id: int) -> bool:
+    """Cancel a chat's running reaction scan; returns False if none is running"""
+    if not is_reaction_scan_running(chat_id):
+        return False
+    _running[chat_id].cancel()
+    return True
+
+
+async def _read_history(client: Client, chat_id: int, limit: int, state: dict):
+    """Yield the last `limit` messages, newest first, resuming after the last one read on FloodWait"""
+    offset_id = 0
+    while state['messages'] < limit:
+        try:
+            async for message in client.get_chat_history(chat_id, limit=limit - state['messages'],
+                                                         offset_id=offset_id):
+                state['messages'] += 1
+                offset_id = message.id
+                yield message
+            return
+        except errors.FloodWait as e:
+            state['flood_waits'] += 1
+            log_warning(f"FloodWait reading the history of {chat_id}, resuming in {e.value}s")
+            await asyncio.sleep(e.value)
+
+
+def _progress_text(state: dict, message_count: int, elapsed: float, finished: bool = False) -> str:
+    rate = state['unique'] / elapsed if elapsed > 0 else 0.0
+    title = "✅ Reaction scan finished" if finished else "🔎 Reaction scan in progress"
+    text = f"**{title}**\n"
+    text += f"**Messages read:** {state['messages']} of {message_count} ({state['with_reactions']} with reactions)\n"
+    text += f"**Reactions:** {state['reactions']} from {state['unique']} unique users\n"
+    text += f"**Profiles scanned:** {state['scanned']}\n"
+    text += f"**Skipped (admins/whitelisted/fresh):** {state['skipped']}\n"
+    text += f"**Flagged:** {state['flagged']}\n"
+    text += f"**Throughput:** {rate:.1f} users/s"
+    return text
+
+
+async def run_reaction_scan(client: Client, chat_id: int, message_count: int, status_message_id: int = None) -> dict:
+    """
+    Scan the profiles of everyone who reacted to the last `message_count` messages
+
+    Args:
+        client: Pyrogram client
+        chat_id: Chat ID to scan
+        message_count: Number of recent messages to read
+        status_message_id: Message to edit with progress, if any
+
+    Returns:
+        dict: Final counters
+    """
+    state = {'messages': 0, 'with_reactions': 0, 'reactions': 0, 'unique': 0,
+             'scanned': 0, 'skipped': 0, 'flagged': 0, 'flood_waits': 0}
+    seen = set()
+    queue = asyncio.Queue(maxsize=REACTION_SCAN_CONCURRENCY * 4)
+    budget = ApiBudget(REACTION_SCAN_API_CALLS_PER_MINUTE)
+    admin_ids = await get_admin_ids(client, chat_id)
+    started = time.monotonic()
+    log_info(f"Starting reaction scan of the last {message_count} messages in chat {chat_id}")
+
+    async def update_progress(finished: bool = False):
+        if not status_message_id:
+            return
+        try:
+            await client.edit_message_text(chat_id, status_message_id,
+                                           _progress_text(state, message_count, time.monotonic() - started, finished))
+        except Exception as e:
+            log_warning(f"Could not update reaction scan progress: {e}")
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(REACTION_SCAN_PROGRESS_INTERVAL)
+            await update_progress()
+
+    async def worker():
+        while True:
+            user = await queue.get()
+            try:
+                await scan_member(client, chat_id, user, admin_ids, state, 'reaction scan', budget)
+            except Exception as e:
+                log_error(f"Reaction scan of {user.id} failed: {e}")
+            finally:
+                queue.task_done()
+
+    background = [asyncio.create_task(worker()) for _ in range(REACTION_SCAN_CONCURRENCY)]
+    background.append(asyncio.create_task(report_progress()))
+    try:
+        async for message in _read_history(client, chat_id, message_count, state):
+            if not message.reactions:
+                continue
+            state['with_reactions'] += 1
+            async for user in iter_message_reactors(client, chat_id, message):
+                state['reactions'] += 1
+                if user.id in seen:
+                    continue
+                seen.add(user.id)
+                state['unique'] += 1
+                await queue.put(user)  # Waits while the workers are behind
+        await queue.join()
+    except asyncio.CancelledError:
+        log_warning(f"Reaction scan of chat {chat_id} stopped after {state['messages']} messages")
+        raise
+    except Exception as e:
+        log_error(f"Reaction scan of chat {chat_id} interrupted after {state['messages']} messages: {e}")
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+
+    await update_progress(finished=True)
+    log_success(f"Reaction scan of chat {chat_id} finished: {state['messages']} messages, "
+                f"{state['unique']} unique reactors, {state['scanned']} scanned, {state['flagged']} flagged")
+    return state
+
+
+def start_reaction_scan(client: Client, chat_id: int, message_count: int, status_message_id: int = None) -> bool:
+    """
+    Start a reaction scan in the background
+
+    Returns:
+        bool: False if a reaction scan is already running for the chat
+    """
+    if is_reaction_scan_running(chat_id):
+        return False
+    task = asyncio.create_task(run_reaction_scan(client, chat_id, message_count, status_message_id))
+    _running[chat_id] = task
+    task.add_done_callback(lambda _: _running.pop(chat_id, None))
+    return True
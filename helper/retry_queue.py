@@ -0,0 +1,76 @@
+"""
+Background worker for the durable analysis retry queue
+Analyses that hit FloodWait or server errors are stored in MongoDB with an
+exponential backoff (see enqueue_analysis_retry); this worker re-runs them
+when they are due and live traffic leaves capacity, within its own API budget
+"""
+
+import asyncio
+from datetime import datetime
+
+from pyrogram import Client
+
+from helper.utils import (
+    log_info, log_error, log_debug,
+    is_whitelisted, next_analysis_retry, claim_analysis_retry, resolve_analysis_retry
+)
+from helper.sampler import ApiBudget
+from helper.scanner import scan_user, inflight_analyses
+from helper.runtime_config import settings
+
+from config import RETRY_API_CALLS_PER_MINUTE
+
+# Seconds to wait before checking again whether live traffic has gone idle
+IDLE_POLL_SECONDS = 2
+# Longest sleep while waiting for the next retry to become due
+DUE_POLL_SECONDS = 30
+# A claimed retry becomes due again after this long if the worker dies mid-scan
+CLAIM_SECONDS = 600
+
+retry_stats = {'attempted': 0, 'completed': 0, 'whitelisted': 0}
+
+
+async def run_retry_worker(client: Client):
+    """Re-run due analysis retries forever, yielding to live traffic"""
+    budget = ApiBudget(RETRY_API_CALLS_PER_MINUTE)
+
+    while True:
+        try:
+            # Only use capacity that live traffic is not using
+            if inflight_analyses() > 0:
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+
+            doc = await next_analysis_retry()
+            if doc is None:
+                await asyncio.sleep(DUE_POLL_SECONDS)
+                continue
+
+            wait = (doc['next_attempt_at'] - datetime.now()).total_seconds()
+            if wait > 0:
+                await asyncio.sleep(min(wait, DUE_POLL_SECONDS))
+                continue
+
+            chat_id, user_id = doc['chat_id'], doc['user_id']
+            await claim_analysis_retry(user_id, CLAIM_SECONDS)
+
+            if await is_whitelisted(chat_id, user_id):
+                retry_stats['whitelisted'] += 1
+                await resolve_analysis_retry(user_id)
+                continue
+
+            await budget.acquire(settings().get('SCAN_ESTIMATED_API_CALLS'))
+            log_debug(f"Retrying analysis of user {user_id} (attempt {doc['attempts'] + 1})")
+            retry_stats['attempted'] += 1
+
+            # A complete analysis clears the entry, another failure re-queues it
+            analysis = await scan_user(client, chat_id, user_id, f"User {user_id}", 'retry')
+            if analysis and not analysis.incomplete:
+                retry_stats['completed'] += 1
+                log_info(f"Retried analysis of user {user_id} completed")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_error(f"Error in analysis retry worker: {e}")
+            await asyncio.sleep(IDLE_POLL_SECONDS)
@@ -0,0 +1,120 @@
+"""
+Low-priority background re-verification of active members
+Keeps a queue of active (chat, user) pairs ordered by when their profile was
+last verified and re-scans the stalest ones whenever live traffic leaves the
+bot idle, within its own API budget
+"""
+
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta
+
+from pyrogram import Client
+
+from helper.utils import (
+    log_info, log_error, log_debug,
+    rollups_collection, verdicts_collection, get_verdict
+)
+from helper.sampler import ApiBudget
+from helper.scanner import scan_user, inflight_analyses
+from helper.runtime_config import settings
+
+from config import (
+    REVERIFY_AFTER_HOURS,
+    REVERIFY_ACTIVE_DAYS,
+    REVERIFY_API_CALLS_PER_MINUTE,
+    REVERIFY_REBUILD_MINUTES,
+    REVERIFY_QUEUE_LIMIT
+)
+
+# Seconds to wait before checking again whether live traffic has gone idle
+IDLE_POLL_SECONDS = 2
+
+reverify_stats = {'queued': 0, 'verified': 0, 'flagged': 0, 'skipped_fresh': 0}
+
+
+async def build_reverify_queue() -> list:
+    """
+    Build a heap of (last_verified, chat_id, user_id) for active members with stale verdicts
+
+    Activity is read from the hourly rollups, which hold one document per
+    member and hour instead of one per message. Members that were never
+    verified sort first; only the REVERIFY_QUEUE_LIMIT stalest are kept.
+    """
+    now = datetime.now()
+    active_cutoff = (now - timedelta(days=REVERIFY_ACTIVE_DAYS)).replace(minute=0, second=0, microsecond=0)
+    stale_cutoff = now - timedelta(hours=REVERIFY_AFTER_HOURS)
+
+    pipeline = [
+        {'$match': {'hour': {'$gte': active_cutoff}}},
+        {'$group': {'_id': {'chat_id': '$chat_id', 'user_id': '$user_id'}}},
+        {'$lookup': {
+            'from': verdicts_collection.name,
+            'localField': '_id.user_id',
+            'foreignField': 'user_id',
+            'as': 'verdict'
+        }},
+        {'$project': {'last_verified': {'$max': '$verdict.timestamp'}}},
+        {'$match': {'$or': [
+            {'last_verified': None},
+            {'last_verified': {'$lt': stale_cutoff}}
+        ]}},
+        # Missing verdicts sort before any timestamp
+        {'$sort': {'last_verified': 1}},
+        {'$limit': REVERIFY_QUEUE_LIMIT}
+    ]
+
+    queue = []
+    async for doc in rollups_collection.aggregate(pipeline, allowDiskUse=True):
+        last_verified = doc.get('last_verified') or datetime.min
+        queue.append((last_verified, doc['_id']['chat_id'], doc['_id']['user_id']))
+
+    heapq.heapify(queue)
+    reverify_stats['queued'] = len(queue)
+    log_info(f"Re-verification queue rebuilt: {len(queue)} stale active members")
+    return queue
+
+
+async def run_reverification(client: Client):
+    """Re-verify stale active members forever, yielding to live traffic"""
+    budget = ApiBudget(REVERIFY_API_CALLS_PER_MINUTE)
+    queue = []
+    next_rebuild = 0.0
+
+    while True:
+        try:
+            if time.monotonic() >= next_rebuild:
+                queue = await build_reverify_queue()
+                next_rebuild = time.monotonic() + REVERIFY_REBUILD_MINUTES * 60
+
+            if not queue:
+                await asyncio.sleep(max(1.0, next_rebuild - time.monotonic()))
+                continue
+
+            # Only use capacity that live traffic is not using
+            if inflight_analyses() > 0:
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+
+            _, chat_id, user_id = heapq.heappop(queue)
+            reverify_stats['queued'] = len(queue)
+
+            # Live traffic may have verified the user since the queue was built
+            verdict = await get_verdict(user_id)
+            if verdict and datetime.now() - verdict['timestamp'] < timedelta(hours=REVERIFY_AFTER_HOURS):
+                reverify_stats['skipped_fresh'] += 1
+                continue
+
+            await budget.acquire(settings().get('SCAN_ESTIMATED_API_CALLS'))
+            log_debug(f"Re-verifying user {user_id} in chat {chat_id}")
+            analysis = await scan_user(client, chat_id, user_id, f"User {user_id}", 'reverify')
+            reverify_stats['verified'] += 1
+            if analysis and analysis.is_suspicious:
+                reverify_stats['flagged'] += 1
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_error(f"Error in re-verification loop: {e}")
+            await asyncio.sleep(IDLE_POLL_SECONDS)
@@ -0,0 +1,366 @@
+"""
+Hot-reloadable runtime configuration
+Holds an immutable snapshot of the tunable settings from config.py plus
+per-chat overrides, with keyword matchers compiled ahead of time. Reloads
+build a new snapshot off the event loop and swap it in atomically.
+"""
+
+import asyncio
+import os
+import re
+import runpy
+
+import config
+from helper.utils import log_info, log_success, log_error, chat_settings_collection
+
+from config import CONFIG_WATCH_INTERVAL
+
+CONFIG_PATH = os.path.abspath(config.__file__)
+
+# Settings that can be changed without a restart
+RELOADABLE_KEYS = (
+    'SUSPICIOUS_CHANNEL_KEYWORDS',
+    'NSFW_KEYWORDS',
+    'CHECK_BIO_FOR_CHANNELS',
+    'RESOLVE_BIO_LINKS',
+    'MAX_BIO_LINKS',
+    'LINK_CACHE_TTL_MINUTES',
+    'LINK_CACHE_MAX_ENTRIES',
+    'CHECK_AVATARS',
+    'AVATAR_PHASH_DISTANCE',
+    'AVATAR_DHASH_DISTANCE',
+    'AVATAR_HASH_CACHE_SIZE',
+    'ENABLE_NSFW_DETECTION',
+    'NSFW_SCORE_WEIGHTS',
+    'CHANNEL_SCORE_MODEL',
+    'CHANNEL_FEATURE_LOG',
+    'NSFW_AUTO_BAN',
+    'CHECK_NEW_MEMBERS',
+    'AUTO_BAN_NSFW_ON_JOIN',
+    'AUTO_BAN_SUSPICIOUS_ON_JOIN',
+    'AUTO_BAN_SUSPICIOUS',
+    'AUTO_BAN_ACTION',
+    'SILENT_MODE',
+    'MONITOR_REACTIONS',
+    'REACTION_SCAN_PROBABILITY',
+    'MESSAGE_SCAN_PROBABILITY',
+    'TRACK_USER_ACTIVITY',
+    'ADAPTIVE_SAMPLING',
+    'SCAN_API_CALLS_PER_MINUTE',
+    'SCAN_ESTIMATED_API_CALLS',
+    'VERDICT_FRESH_MINUTES',
+    'VERDICT_STALE_HOURS',
+    'RECENT_JOIN_HOURS',
+    'BURST_WINDOW_MINUTES',
+    'BURST_ACTIVITY_THRESHOLD',
+    'ANALYSIS_DEADLINE_SECONDS',
+    'CHAT_MAX_CONCURRENT_ANALYSES',
+    'CHAT_SCHEDULER_WEIGHTS',
+    'CHAT_SCHEDULER_CAPS',
+    'DECISION_TRACES',
+    'CLAIMS_ENABLED',
+)
+
+# Settings that group admins may override for their own chat
+CHAT_OVERRIDABLE_KEYS = (
+    'SUSPICIOUS_CHANNEL_KEYWORDS',
+    'CHECK_BIO_FOR_CHANNELS',
+    'ENABLE_NSFW_DETECTION',
+    'NSFW_AUTO_BAN',
+    'CHECK_NEW_MEMBERS',
+    'AUTO_BAN_NSFW_ON_JOIN',
+    'AUTO_BAN_SUSPICIOUS_ON_JOIN',
+    'AUTO_BAN_SUSPICIOUS',
+    'AUTO_BAN_ACTION',
+    'SILENT_MODE',
+    'MONITOR_REACTIONS',
+    'REACTION_SCAN_PROBABILITY',
+    'MESSAGE_SCAN_PROBABILITY',
+    'SCAN_API_CALLS_PER_MINUTE',
+)
+
+# Allowed values of overridable settings beyond their type: a set of choices or an inclusive (min, max) range
+SETTING_CONSTRAINTS = {
+    'AUTO_BAN_ACTION': {'ban', 'kick', 'mute'},
+    'REACTION_SCAN_PROBABILITY': (0.0, 1.0),
+    'MESSAGE_SCAN_PROBABILITY': (0.0, 1.0),
+    'SCAN_API_CALLS_PER_MINUTE': (0, None),  # 0 disables sampled scans
+}
+
+
+class KeywordMatcher:
+    """
+    Precompiled case-insensitive substring matcher for a keyword list
+
+    A single combined regex rejects clean text in one pass; only texts that
+    contain at least one keyword fall back to the per-keyword scan, which
+    keeps the original list-order semantics.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        self._lowered = tuple((keyword, keyword.lower()) for keyword in self.keywords)
+        if self.keywords:
+            # Longest first so the alternation never stops at a shorter prefix
+            alternatives = sorted({kw for _, kw in self._lowered if kw}, key=len, reverse=True)
+            self._pattern = re.compile('|'.join(re.escape(kw) for kw in alternatives))
+        else:
+            self._pattern = None
+
+    def first_match(self, *texts):
+        """Return the first keyword (in list order) contained in any of the texts, or None"""
+        if self._pattern is None:
+            return None
+        lowered = [text.lower() for text in texts if text]
+        if not any(self._pattern.search(text) for text in lowered):
+            return None
+        for keyword, keyword_lower in self._lowered:
+            if any(keyword_lower in text for text in lowered):
+                return keyword
+        return None
+
+    def find_all(self, text: str) -> list:
+        """Return every keyword (in list order) contained in the text"""
+        if self._pattern is None or not text:
+            return []
+        text_lower = text.lower()
+        if not self._pattern.search(text_lower):
+            return []
+        return [keyword for keyword, keyword_lower in self._lowered if keyword_lower in text_lower]
+
+
+class RuntimeSettings:
+    """Immutable snapshot of settings, per-chat overrides and compiled matchers"""
+
+    def __init__(self, values: dict, chat_overrides: dict, version: int):
+        self.values = values
+        self.chat_overrides = chat_overrides
+        self.version = version
+        self.keyword_matcher = KeywordMatcher(values['SUSPICIOUS_CHANNEL_KEYWORDS'])
+        self.nsfw_matcher = KeywordMatcher(values['NSFW_KEYWORDS'])
+        self.chat_keyword_matchers = {
+            chat_id: KeywordMatcher(overrides['SUSPICIOUS_CHANNEL_KEYWORDS'])
+            for chat_id, overrides in chat_overrides.items()
+            if 'SUSPICIOUS_CHANNEL_KEYWORDS' in overrides
+        }
+
+    def get(self, key: str, chat_id: int = None):
+        if chat_id is not None:
+            overrides = self.chat_overrides.get(chat_id)
+            if overrides and key in overrides:
+                return overrides[key]
+        return self.values[key]
+
+    def keywords(self, chat_id: int = None) -> KeywordMatcher:
+        if chat_id is not None and chat_id in self.chat_keyword_matchers:
+            return self.chat_keyword_matchers[chat_id]
+        return self.keyword_matcher
+
+
+def _values_from_namespace(namespace: dict) -> dict:
+    missing = [key for key in RELOADABLE_KEYS if key not in namespace]
+    if missing:
+        raise ValueError(f"config.py is missing settings: {', '.join(missing)}")
+    return {key: namespace[key] for key in RELOADABLE_KEYS}
+
+
+_current = RuntimeSettings(_values_from_namespace(vars(config)), {}, 0)
+_reload_lock = asyncio.Lock()
+_config_mtime = None
+
+
+def settings() -> RuntimeSettings:
+    """Return the current settings snapshot (safe to hold for the duration of a handler)"""
+    return _current
+
+
+def get_setting(key: str, chat_id: int = None):
+    """Get a setting value, honoring per-chat overrides when chat_id is given"""
+    return _current.get(key, chat_id)
+
+
+def get_keyword_matcher(chat_id: int = None) -> KeywordMatcher:
+    """Get the compiled suspicious-keyword matcher for a chat"""
+    return _current.keywords(chat_id)
+
+
+def get_nsfw_matcher() -> KeywordMatcher:
+    """Get the compiled NSFW keyword matcher"""
+    return _current.nsfw_matcher
+
+
+def parse_setting_value(key: str, raw: str):
+    """
+    Convert a text value from an admin command to the type of the default setting
+
+    Raises:
+        ValueError: If the value cannot be converted or is outside SETTING_CONSTRAINTS
+    """
+    default = _current.values[key]
+    raw = raw.strip()
+    if isinstance(default, bool):
+        lowered = raw.lower()
+        if lowered in ('true', 'on', 'yes', '1'):
+            return True
+        if lowered in ('false', 'off', 'no', '0'):
+            return False
+        raise ValueError(f"{key} expects true/false")
+    if isinstance(default, int):
+        value = int(raw)
+    elif isinstance(default, float):
+        value = float(raw)
+    elif isinstance(default, (list, tuple)):
+        return [item.strip() for item in raw.split(',') if item.strip()]
+    else:
+        value = raw
+
+    if isinstance(SETTING_CONSTRAINTS.get(key), set):
+        value = value.lower()
+    validate_setting(key, value)
+    return value
+
+
+def validate_setting(key: str, value):
+    """
+    Check a typed setting value against SETTING_CONSTRAINTS
+
+    Raises:
+        ValueError: If the value is not allowed
+    """
+    allowed = SETTING_CONSTRAINTS.get(key)
+    if isinstance(allowed, set):
+        if value not in allowed:
+            raise ValueError(f"{key} expects one of {', '.join(sorted(allowed))}")
+    elif allowed is not None:
+        low, high = allowed
+        # Written as negations so NaN is rejected too
+        if not (low is None or value >= low) or not (high is None or value <= high):
+            raise ValueError(f"{key} expects a value " + (
+                f"between {low} and {high}" if high is not None else f"of at least {low}"))
+
+
+async def _swap(values: dict = None, update_overrides=None):
+    """
+    Build a new snapshot in a worker thread and install it atomically
+
+    Args:
+        values: New global values (default: keep the current ones)
+        update_overrides: Function from the current per-chat overrides to the
+            new ones; it runs under the lock, so concurrent changes are not lost
+    """
+    global _current
+    async with _reload_lock:
+        old = _current
+        new = await asyncio.to_thread(
+            RuntimeSettings,
+            values if values is not None else old.values,
+            update_overrides(old.chat_overrides) if update_overrides else old.chat_overrides,
+            old.version + 1
+        )
+        _current = new
+        return new
+
+
+async def reload_config() -> bool:
+    """
+    Re-read config.py and swap in the new settings
+
+    Returns:
+        bool: True if the reload succeeded, False if the old settings were kept
+    """
+    global _config_mtime
+    try:
+        _config_mtime = os.stat(CONFIG_PATH).st_mtime
+        namespace = await asyncio.to_thread(runpy.run_path, CONFIG_PATH)
+        values = _values_from_namespace(namespace)
+        new = await _swap(values=values)
+    except Exception as e:
+        log_error(f"Config reload failed, keeping previous settings: {e}")
+        return False
+
+    log_success(f"Runtime configuration reloaded (version {new.version})")
+    return True
+
+
+async def load_chat_overrides():
+    """Load all per-chat overrides from the database and merge them into the current snapshot"""
+    overrides = {}
+    try:
+        async for doc in chat_settings_collection.find({}):
+            values = {}
+            for key, value in doc.get('overrides', {}).items():
+                if key not in CHAT_OVERRIDABLE_KEYS:
+                    continue
+                try:
+                    validate_setting(key, value)
+                except (ValueError, TypeError) as e:
+                    log_error(f"Ignoring stored override of chat {doc['chat_id']}: {e}")
+                    continue
+                values[key] = value
+            if values:
+                overrides[doc['chat_id']] = values
+    except Exception as e:
+        log_error(f"Error loading chat overrides: {e}")
+        return
+
+    def merge(current: dict) -> dict:
+        # Overrides set while the documents were read stay in place
+        merged = dict(current)
+        for chat_id, values in overrides.items():
+            merged[chat_id] = {**current.get(chat_id, {}), **values}
+        return merged
+
+    await _swap(update_overrides=merge)
+    log_info(f"Loaded configuration overrides for {len(overrides)} chats")
+
+
+async def set_chat_override(chat_id: int, key: str, value):
+    """Persist a per-chat override and swap it into the current snapshot"""
+    await chat_settings_collection.update_one(
+        {'chat_id': chat_id},
+        {'$set': {f'overrides.{key}': value}},
+        upsert=True
+    )
+
+    def update(current: dict) -> dict:
+        return {**current, chat_id: {**current.get(chat_id, {}), key: value}}
+
+    await _swap(update_overrides=update)
+
+
+async def clear_chat_override(chat_id: int, key: str):
+    """Remove a per-chat override, falling back to the global value"""
+    await chat_settings_collection.update_one(
+        {'chat_id': chat_id},
+        {'$unset': {f'overrides.{key}': ""}}
+    )
+
+    def update(current: dict) -> dict:
+        chat_overrides = dict(current)
+        remaining = {k: v for k, v in chat_overrides.get(chat_id, {}).items() if k != key}
+        if remaining:
+            chat_overrides[chat_id] = remaining
+        else:
+            chat_overrides.pop(chat_id, None)
+        return chat_overrides
+
+    await _swap(update_overrides=update)
+
+
+async def watch_config_file():
+    """Poll config.py and reload it whenever it changes"""
+    global _config_mtime
+    if _config_mtime is None:
+        _config_mtime = os.stat(CONFIG_PATH).st_mtime
+    log_info(f"Watching {CONFIG_PATH} for changes every {CONFIG_WATCH_INTERVAL}s")
+
+    while True:
+        await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+        try:
+            mtime = os.stat(CONFIG_PATH).st_mtime
+        except OSError as e:
+            log_error(f"Cannot stat config file: {e}")
+            continue
+        if mtime != _config_mtime:
+            log_info("Detected change in config.py, reloading")
+            await reload_config()
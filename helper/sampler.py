@@ -0,0 +1,202 @@
+"""
+Adaptive risk-based scan sampling
+Decides which message senders and reactors get a profile scan, preferring
+users that were never analyzed, have stale verdicts, joined recently or show
+bursty activity, while staying inside a per-chat API call budget
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from helper.utils import (
+    log_debug, log_error,
+    get_verdict,
+    iter_recent_joins,
+    count_recent_user_activity
+)
+
+from helper.runtime_config import settings
+from helper.overload import allow_scan
+
+# How long the per-chat recent joiner set is reused before querying Mongo again
+RECENT_JOINS_REFRESH_SECONDS = 60
+
+
+class ApiBudget:
+    """Token bucket limiting Telegram API calls per minute"""
+
+    def __init__(self, calls_per_minute: int):
+        if not calls_per_minute > 0:
+            raise ValueError(f"API budget must be positive, got {calls_per_minute} calls per minute")
+        self.capacity = float(calls_per_minute)
+        self.rate = calls_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        """Return the number of API calls that can be spent right now"""
+        self._refill()
+        return self.tokens
+
+    def try_acquire(self, cost: float = 1) -> bool:
+        """Spend `cost` calls if the budget allows it"""
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    async def acquire(self, cost: float = 1):
+        """Wait until `cost` calls can be spent, then spend them"""
+        cost = min(cost, self.capacity)
+        while not self.try_acquire(cost):
+            await asyncio.sleep(max((cost - self.tokens) / self.rate, 0.05))
+
+
+_budgets = {}
+_recent_joiners = {}
+
+
+def get_chat_budget(chat_id: int) -> ApiBudget:
+    """
+    Get (or create) the scan budget for a chat, following runtime config changes
+
+    Returns:
+        ApiBudget: The chat's budget, or None if SCAN_API_CALLS_PER_MINUTE is 0 or less (scanning disabled)
+    """
+    calls_per_minute = settings().get('SCAN_API_CALLS_PER_MINUTE', chat_id)
+    if not calls_per_minute > 0:
+        _budgets.pop(chat_id, None)
+        return None
+    budget = _budgets.get(chat_id)
+    if budget is None or budget.capacity != calls_per_minute:
+        budget = ApiBudget(calls_per_minute)
+        _budgets[chat_id] = budget
+    return budget
+
+
+async def _get_recent_joiners(chat_id: int) -> set:
+    """Return user IDs that joined recently, refreshed at most once a minute"""
+    cached = _recent_joiners.get(chat_id)
+    now = time.monotonic()
+    if cached and now - cached[0] < RECENT_JOINS_REFRESH_SECONDS:
+        return cached[1]
+
+    try:
+        joiners = {doc['user_id'] async for doc in iter_recent_joins(chat_id, hours=settings().get('RECENT_JOIN_HOURS'))}
+    except Exception as e:
+        log_error(f"Error loading recent joiners: {e}")
+        return cached[1] if cached else set()
+    _recent_joiners[chat_id] = (now, joiners)
+    return joiners
+
+
+def note_join(chat_id: int, user_id: int):
+    """Add a fresh joiner to the cached recent joiner set"""
+    cached = _recent_joiners.get(chat_id)
+    if cached:
+        cached[1].add(user_id)
+
+
+def risk_score(verdict_age_hours, is_recent_joiner: bool, is_bursty: bool, base_probability: float) -> float:
+    """
+    Compute the probability that a user should be scanned
+
+    Args:
+        verdict_age_hours: Hours since the last verdict, or None if never analyzed
+        is_recent_joiner: Whether the user joined recently
+        is_bursty: Whether the user shows bursty activity
+        base_probability: Fixed probability used for unremarkable users
+
+    Returns:
+        float: Scan probability between 0.0 and 1.0
+    """
+    if verdict_age_hours is None:
+        return 1.0
+
+    current = settings()
+    if verdict_age_hours * 60 < current.get('VERDICT_FRESH_MINUTES'):
+        return 0.0
+
+    stale_hours = current.get('VERDICT_STALE_HOURS')
+    if verdict_age_hours >= stale_hours:
+        score = 0.8
+    else:
+        # Grow linearly from the base probability towards the stale score
+        score = base_probability + (0.8 - base_probability) * (verdict_age_hours / stale_hours)
+
+    if is_recent_joiner:
+        score += 0.5
+    if is_bursty:
+        score += 0.3
+
+    return min(1.0, score)
+
+
+async def should_scan_user(chat_id: int, user_id: int, source: str) -> bool:
+    """
+    Decide whether a message sender or reactor should get a profile scan
+
+    Args:
+        chat_id: Chat ID where the activity happened
+        user_id: User ID to consider
+        source: Activity type that triggered the decision ('message' or 'reaction')
+
+    Returns:
+        bool: True if the user should be scanned now
+    """
+    if not allow_scan(source):
+        return False
+
+    current = settings()
+    probability_key = 'REACTION_SCAN_PROBABILITY' if source == 'reaction' else 'MESSAGE_SCAN_PROBABILITY'
+    base_probability = current.get(probability_key, chat_id)
+    scan_cost = current.get('SCAN_ESTIMATED_API_CALLS')
+    budget = get_chat_budget(chat_id)
+    if budget is None:
+        return False
+
+    if not current.get('ADAPTIVE_SAMPLING'):
+        return random.random() < base_probability and budget.try_acquire(scan_cost)
+
+    # Cheap exit before touching the database when the budget is exhausted
+    if budget.available() < scan_cost:
+        return False
+
+    verdict = await get_verdict(user_id)
+    if verdict:
+        verdict_age_hours = (datetime.now() - verdict['timestamp']).total_seconds() / 3600
+        if verdict_age_hours * 60 < current.get('VERDICT_FRESH_MINUTES'):
+            return False
+    else:
+        verdict_age_hours = None
+
+    is_recent_joiner = False
+    is_bursty = False
+    if verdict_age_hours is not None:
+        is_recent_joiner = user_id in await _get_recent_joiners(chat_id)
+        activity_count = await count_recent_user_activity(
+            chat_id, user_id, minutes=current.get('BURST_WINDOW_MINUTES')
+        )
+        is_bursty = activity_count >= current.get('BURST_ACTIVITY_THRESHOLD')
+
+    score = risk_score(verdict_age_hours, is_recent_joiner, is_bursty, base_probability)
+    if random.random() >= score:
+        return False
+
+    if not budget.try_acquire(scan_cost):
+        log_debug(f"Scan budget exhausted for chat {chat_id}, skipping user {user_id}")
+        return False
+
+    log_debug(
+        f"Sampling user {user_id} in chat {chat_id} via {source} "
+        f"(score {score:.2f}, recent join: {is_recent_joiner}, bursty: {is_bursty})"
+    )
+    return True
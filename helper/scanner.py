@@ -0,0 +1,246 @@
+"""
+Profile scans of existing members triggered by sampled activity
+"""
+
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+
+from pyrogram import Client
+
+from helper.utils import (
+    log_info, log_success, log_warning, log_error, log_debug,
+    is_whitelisted, record_verdict,
+    enqueue_analysis_retry, resolve_analysis_retry, has_analysis_retry
+)
+from helper.channel_checker import analyze_user_profile, new_analysis_progress, build_analysis
+from helper.moderation import decide_action, enforce_verdict
+from helper.runtime_config import get_keyword_matcher
+from helper.singleflight import SingleFlight
+from helper.models import ProfileAnalysis
+from helper.fair_scheduler import scheduler
+from helper.trace import stage_done, note_joined_analysis, record_decision
+from helper.claims import acquire_claim, finish_claim
+
+_inflight_analyses = 0
+_profile_flights = SingleFlight()
+# (user_id, matcher) -> progress record of the in-flight analysis
+_progress = {}
+
+
+def inflight_analyses() -> int:
+    """Number of profile analyses currently running on behalf of live traffic"""
+    return _inflight_analyses
+
+
+def _analysis_done(chat_id: int, key: tuple, task: asyncio.Future):
+    """Queue a retry for an analysis cut short by errors, or clear one that now completed"""
+    progress = _progress.pop(key, None)
+    if task.cancelled() or progress is None:
+        return
+    user_id = key[0]
+    failures = progress['failures']
+
+    if task.exception() is not None:
+        error, retry_after = f"{type(task.exception()).__name__}: {task.exception()}", 0
+    elif failures:
+        error = "; ".join(f"{failure['where']}: {failure['error']}" for failure in failures[:3])
+        retry_after = max(failure['retry_after'] for failure in failures)
+    elif task.result() is not None:
+        if has_analysis_retry(user_id):
+            asyncio.ensure_future(resolve_analysis_retry(user_id))
+        return
+    elif has_analysis_retry(user_id):
+        # Non-transient errors are not recorded as failures; the retry still
+        # counts as an attempt so a user that always fails ends in dead letters
+        error, retry_after = "analysis failed with a non-transient error", 0
+    else:
+        return
+
+    asyncio.ensure_future(enqueue_analysis_retry(chat_id, user_id, error, retry_after))
+
+
+async def _scheduled_analysis(chat_id: int, priority: bool, client: Client, user_id: int, matcher, progress: dict):
+    """Run analyze_user_profile once the chat's turn comes up in the fair scheduler"""
+    async with scheduler.slot(chat_id, priority):
+        stage_done(progress['trace'], 'queue')
+        return await analyze_user_profile(client, user_id, matcher, progress)
+
+
+@contextmanager
+def analysis_slot():
+    """Count a profile analysis as in flight for the duration of the block"""
+    global _inflight_analyses
+    _inflight_analyses += 1
+    try:
+        yield
+    finally:
+        _inflight_analyses -= 1
+
+
+async def analyze_profile(client: Client, chat_id: int, user_id: int,
+                          deadline: float = None, on_late_result=None, priority: bool = False):
+    """
+    Analyze a user's profile with the chat's keywords
+
+    Concurrent requests for the same user (and keyword set) share a single
+    analyze_user_profile call instead of crawling the profile again. The call
+    waits for its turn in the per-chat fair scheduler, charged to chat_id.
+
+    Args:
+        client: Pyrogram client
+        chat_id: Chat ID whose keyword settings apply
+        user_id: User ID to analyze
+        deadline: Optional seconds to wait; when exceeded a partial verdict
+            built from the completed stages is returned and the analysis
+            keeps running in the background
+        on_late_result: Optional coroutine function called as
+            on_late_result(partial, full) once a timed-out analysis finishes
+        priority: Queue ahead of the chat's other analyses (join checks)
+
+    Returns:
+        ProfileAnalysis: Analysis results (partial if the deadline was hit), or None
+    """
+    matcher = get_keyword_matcher(chat_id)
+    key = (user_id, matcher)
+
+    joined = _profile_flights.running(key)
+    note_joined_analysis(joined)
+    if not joined:
+        _progress[key] = new_analysis_progress(user_id)
+        task = _profile_flights.start(
+            key, _scheduled_analysis, chat_id, priority, client, user_id, matcher, _progress[key]
+        )
+        task.add_done_callback(functools.partial(_analysis_done, chat_id, key))
+    else:
+        task = _profile_flights.start(key, _scheduled_analysis)
+    progress = _progress[key]
+
+    with analysis_slot():
+        if deadline is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), deadline)
+        except asyncio.TimeoutError:
+            pass
+
+    partial = build_analysis(progress)
+    log_warning(f"Analysis of user {user_id} exceeded {deadline}s, using partial verdict "
+                f"(completed: {', '.join(partial.completed_stages) or 'none'})")
+
+    if on_late_result:
+        def dispatch(done):
+            if done.cancelled() or done.exception() is not None or not done.result():
+                return
+            asyncio.ensure_future(on_late_result(partial, done.result()))
+        task.add_done_callback(dispatch)
+
+    return partial
+
+
+def analysis_dedup_stats() -> dict:
+    """Return single-flight counters: calls, executions and shared (duplicate crawls avoided)"""
+    return dict(_profile_flights.stats)
+
+
+def late_escalation(client: Client, chat_id: int, user_id: int, user_name: str, on_join: bool, context: str):
+    """
+    Build an on_late_result callback that upgrades the action when the late
+    analysis stages turn a partial verdict into one that warrants action
+    """
+    async def on_late_result(partial: ProfileAnalysis, full: ProfileAnalysis):
+        if not full.incomplete:
+            await record_verdict(user_id, full.is_suspicious)
+
+        if decide_action(partial, chat_id, on_join)[0]:
+            return  # Already acted on the partial verdict
+
+        should_instant_action, action_reason = decide_action(full, chat_id, on_join)
+        record_decision(chat_id, user_id, "late " + ("join" if on_join else "scan"), full,
+                        should_instant_action, action_reason)
+        if should_instant_action:
+            log_warning(f"Late analysis stages upgraded the verdict for {user_name} [{user_id}]")
+            enforce_verdict(client, chat_id, user_id, user_name, full, action_reason, context=context)
+        else:
+            log_debug(f"Late analysis stages did not change the verdict for {user_name} [{user_id}]")
+
+    return on_late_result
+
+
+async def scan_user(client: Client, chat_id: int, user_id: int, user_name: str, source: str,
+                    deadline: float = None):
+    """
+    Analyze an existing member's profile and act on the verdict
+
+    Args:
+        client: Pyrogram client
+        chat_id: Chat ID where the user was seen
+        user_id: User ID to scan
+        user_name: User's display name for logs and notification
+        source: What triggered the scan ('message', 'reaction', ...)
+        deadline: Optional latency budget in seconds (see analyze_profile)
+
+    Returns:
+        ProfileAnalysis: Analysis results, or None if the user was skipped or could not be analyzed
+    """
+    if await is_whitelisted(chat_id, user_id):
+        return None
+
+    # Another instance may already have scanned the user for the same activity
+    claim = await acquire_claim(chat_id, user_id, source)
+    if not claim.owned:
+        log_info(f"{user_name} [{user_id}] was already scanned by {claim.result['instance']}")
+        return claim.analysis()
+
+    analysis = None
+    should_instant_action, action_reason = False, ""
+    try:
+        analysis, should_instant_action, action_reason = await _scan_and_act(
+            client, chat_id, user_id, user_name, source, deadline
+        )
+    finally:
+        await finish_claim(claim, analysis, should_instant_action, action_reason)
+    return analysis
+
+
+async def _scan_and_act(client: Client, chat_id: int, user_id: int, user_name: str, source: str,
+                        deadline: float = None) -> tuple:
+    """
+    The body of scan_user once the claim is held
+
+    Returns:
+        tuple: (analysis or None, whether an action was queued, reason)
+    """
+    log_info(f"Scanning profile of {user_name} [{user_id}] (triggered by {source})")
+    context = f"after {source} scan"
+    started = time.perf_counter()
+
+    try:
+        analysis = await analyze_profile(
+            client, chat_id, user_id, deadline=deadline,
+            on_late_result=late_escalation(client, chat_id, user_id, user_name, False, context)
+        )
+    except Exception as e:
+        log_error(f"Error scanning {user_name}: {e}")
+        return None, False, ""
+
+    if not analysis:
+        log_warning(f"Could not analyze profile for {user_name}")
+        return None, False, ""
+
+    # Partial or incomplete verdicts are not stored: the user is analyzed again
+    if not analysis.partial and not analysis.incomplete:
+        await record_verdict(user_id, analysis.is_suspicious)
+
+    should_instant_action, action_reason = decide_action(analysis, chat_id, on_join=False)
+    record_decision(chat_id, user_id, source, analysis, should_instant_action, action_reason,
+                    latency=time.perf_counter() - started)
+    if should_instant_action:
+        enforce_verdict(client, chat_id, user_id, user_name, analysis, action_reason, context=context)
+    elif analysis.is_suspicious:
+        log_warning(f"⚠️ User {user_name} has suspicious activity but auto-ban is disabled")
+    else:
+        log_success(f"✅ User {user_name} profile is clean")
+
+    return analysis, should_instant_action, action_reason
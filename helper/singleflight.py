@@ -0,0 +1,54 @@
+"""
+Single-flight deduplication of concurrent async calls
+Callers asking for the same key while a call is in flight await that call
+instead of starting their own
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """Share one in-flight task per key between concurrent callers"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {'calls': 0, 'executions': 0, 'shared': 0}
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def start(self, key, func, *args, **kwargs) -> asyncio.Future:
+        """
+        Start func(*args, **kwargs) unless a call for `key` is already running
+
+        Returns:
+            The shared task; await it through asyncio.shield()
+        """
+        self.stats['calls'] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats['executions'] += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats['shared'] += 1
+        return task
+
+    def running(self, key) -> bool:
+        return key in self._inflight
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) unless a call for `key` is already running
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        task = self.start(key, func, *args, **kwargs)
+        # A cancelled caller must not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def inflight(self) -> int:
+        return len(self._inflight)
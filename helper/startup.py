@@ -0,0 +1,143 @@
+"""
+Startup sequence with timing and concurrent cache pre-warming
+Connects to MongoDB, loads the per-chat overrides and avatar blocklist while
+the indexes are ensured, and fills the admin, whitelist, chat config and
+verdict caches for every known chat while the bot is already handling
+updates, then reports a ready state with timings. The activity rollup
+backfill runs last, once the bot is ready.
+"""
+
+import asyncio
+import time
+
+from pyrogram import Client
+
+from helper.utils import (
+    log_info, log_success, log_warning, log_error, log_separator,
+    MONGO_INIT_SECONDS,
+    connect_database, ensure_indexes, backfill_activity_rollups, get_known_chat_ids,
+    get_admin_ids, load_whitelist, get_config, load_recent_verdicts, load_analysis_retries
+)
+from helper.runtime_config import settings, load_chat_overrides
+from helper.avatar_hash import load_avatar_blocklist
+
+from config import PREWARM_CONCURRENCY, PREWARM_VERDICT_LIMIT
+
+_readiness = {
+    'ready': False,
+    'import_seconds': None,
+    'mongo_init_seconds': MONGO_INIT_SECONDS,
+    'connect_seconds': None,
+    'index_seconds': None,
+    'prewarm_seconds': None,
+    'ready_seconds': None,
+    'chats_warmed': 0,
+    'chats_failed': 0,
+    'verdicts_loaded': 0,
+    'retries_pending': 0,
+    'avatars_blocked': 0,
+}
+
+
+def is_ready() -> bool:
+    """Return True once startup pre-warming has finished"""
+    return _readiness['ready']
+
+
+def get_readiness() -> dict:
+    """Return a copy of the startup timing report"""
+    return dict(_readiness)
+
+
+async def _timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+
+async def _warm_chat(client: Client, chat_id: int, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        try:
+            await asyncio.gather(
+                get_admin_ids(client, chat_id, refresh=True),
+                load_whitelist(chat_id),
+                get_config(chat_id)
+            )
+            return True
+        except Exception as e:
+            log_warning(f"Could not pre-warm chat {chat_id}: {e}")
+            return False
+
+
+async def prewarm(client: Client, boot_started: float, import_seconds: float):
+    """
+    Run the startup sequence in the background and mark the bot as ready
+
+    Args:
+        client: Started Pyrogram client
+        boot_started: time.perf_counter() value taken at process start
+        import_seconds: Seconds spent importing modules
+    """
+    _readiness['import_seconds'] = import_seconds
+
+    try:
+        _, _readiness['connect_seconds'] = await _timed(connect_database())
+    except Exception as e:
+        log_error(f"Database startup failed: {e}")
+
+    # Per-chat overrides and the avatar blocklist decide how live updates are
+    # handled, so they load alongside the index build instead of after it
+    indexes, _, avatars_blocked = await asyncio.gather(
+        _timed(ensure_indexes()),
+        load_chat_overrides(),
+        load_avatar_blocklist(),
+        return_exceptions=True
+    )
+    if isinstance(indexes, Exception):
+        log_error(f"Index setup failed: {indexes}")
+    else:
+        _readiness['index_seconds'] = indexes[1]
+    if isinstance(avatars_blocked, Exception):
+        log_error(f"Loading the avatar blocklist failed: {avatars_blocked}")
+    else:
+        _readiness['avatars_blocked'] = avatars_blocked
+
+    prewarm_started = time.perf_counter()
+    try:
+        chat_ids, verdicts_loaded, retries_pending = await asyncio.gather(
+            get_known_chat_ids(),
+            load_recent_verdicts(settings().get('VERDICT_STALE_HOURS'), PREWARM_VERDICT_LIMIT),
+            load_analysis_retries()
+        )
+        _readiness['verdicts_loaded'] = verdicts_loaded
+        _readiness['retries_pending'] = retries_pending
+
+        semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+        results = await asyncio.gather(*(_warm_chat(client, chat_id, semaphore) for chat_id in chat_ids))
+        _readiness['chats_warmed'] = sum(1 for ok in results if ok)
+        _readiness['chats_failed'] = len(results) - _readiness['chats_warmed']
+    except Exception as e:
+        log_error(f"Cache pre-warming failed: {e}")
+
+    _readiness['prewarm_seconds'] = time.perf_counter() - prewarm_started
+    _readiness['ready_seconds'] = time.perf_counter() - boot_started
+    _readiness['ready'] = True
+
+    log_separator("BOT READY")
+    log_success(f"Ready {_readiness['ready_seconds']:.2f}s after process start")
+    log_info(f"  - Imports: {import_seconds:.2f}s (Mongo client init {MONGO_INIT_SECONDS:.3f}s)")
+    if _readiness['connect_seconds'] is not None:
+        log_info(f"  - Mongo connect: {_readiness['connect_seconds']:.3f}s")
+    if _readiness['index_seconds'] is not None:
+        log_info(f"  - Index check: {_readiness['index_seconds']:.3f}s")
+    log_info(f"  - Pre-warm: {_readiness['prewarm_seconds']:.2f}s "
+             f"({_readiness['chats_warmed']} chats, {_readiness['chats_failed']} failed, "
+             f"{_readiness['verdicts_loaded']} verdicts, {_readiness['retries_pending']} pending retries, "
+             f"{_readiness['avatars_blocked']} blocked avatars)")
+    log_separator()
+
+    # Rebuilding rollups can scan all raw activity; it runs after the bot is ready
+    try:
+        await backfill_activity_rollups()
+    except Exception as e:
+        log_error(f"Activity rollup backfill failed: {e}")
@@ -0,0 +1,174 @@
+"""
+Decision traces: what each verdict was based on and what it cost
+A trace records the analysis stages with their durations (including the wait
+in the fair scheduler), Telegram API calls by method, cache hits, the
+signals that fired and the action taken. Traces are queued in memory and
+written in batches to a capped collection by run_trace_writer, so recording
+one never waits on MongoDB. /why shows the latest traces of a user.
+"""
+
+import asyncio
+import contextvars
+import time
+from datetime import datetime
+
+from helper.utils import log_error, insert_decision_traces
+from helper.runtime_config import settings
+
+from config import TRACE_QUEUE_SIZE, TRACE_BATCH_SIZE
+
+# Trace of the analysis running in the current context (see begin_trace)
+_active_trace = contextvars.ContextVar('decision_trace', default=None)
+# Whether the caller's last analyze_profile joined an analysis already in flight
+_joined_analysis = contextvars.ContextVar('joined_analysis', default=False)
+
+_queue = asyncio.Queue(maxsize=TRACE_QUEUE_SIZE)
+trace_stats = {'recorded': 0, 'written': 0, 'dropped': 0}
+
+
+def new_trace() -> dict:
+    """Create the per-analysis trace kept in the progress record"""
+    now = time.perf_counter()
+    return {'started': now, 'last': now, 'stages': [], 'api_calls': {}, 'cache': {}}
+
+
+def begin_trace(trace: dict):
+    """Attribute API calls and cache hits in this context to `trace`; returns a token for end_trace"""
+    return _active_trace.set(trace)
+
+
+def end_trace(token):
+    _active_trace.reset(token)
+
+
+def stage_done(trace: dict, stage: str):
+    """Record the time since the previous stage (or since the trace started) for `stage`"""
+    now = time.perf_counter()
+    trace['stages'].append((stage, now - trace['last']))
+    trace['last'] = now
+
+
+def count_api_call(method: str):
+    trace = _active_trace.get()
+    if trace is not None:
+        trace['api_calls'][method] = trace['api_calls'].get(method, 0) + 1
+
+
+def count_cache_hit(cache: str):
+    trace = _active_trace.get()
+    if trace is not None:
+        trace['cache'][cache] = trace['cache'].get(cache, 0) + 1
+
+
+def note_joined_analysis(joined: bool):
+    """Remember (in the caller's context) whether its analysis was shared with an earlier request"""
+    _joined_analysis.set(joined)
+
+
+def snapshot(trace: dict) -> dict:
+    """Copy of a trace as it stands, for a (possibly partial) ProfileAnalysis"""
+    return {'stages': list(trace['stages']), 'api_calls': dict(trace['api_calls']), 'cache': dict(trace['cache'])}
+
+
+def record_decision(chat_id: int, user_id: int, source: str, analysis, acted: bool, reason: str,
+                    latency: float = None):
+    """
+    Queue the decision trace of a verdict for writing
+
+    Args:
+        chat_id: Chat ID the verdict applies to
+        user_id: Analyzed user
+        source: What triggered the analysis ('join', 'message', 'reaction', 'retry', ...)
+        analysis: ProfileAnalysis the decision was based on
+        acted: Whether an action was queued
+        reason: Reason from decide_action
+        latency: Seconds from the trigger to the verdict, if known
+    """
+    if not settings().get('DECISION_TRACES') or analysis is None:
+        return
+
+    trace = analysis.trace or snapshot(new_trace())
+    cache = dict(trace['cache'])
+    if _joined_analysis.get():
+        cache['shared_analysis'] = 1
+
+    doc = {
+        'chat_id': chat_id,
+        'user_id': user_id,
+        'source': source,
+        'created_at': datetime.now(),
+        'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+        'stages': [[stage, round(seconds * 1000, 1)] for stage, seconds in trace['stages']],
+        'api_calls': trace['api_calls'],
+        'api_total': sum(trace['api_calls'].values()),
+        'cache': cache,
+        'signals': {
+            'bio_mentions': analysis.has_bio_mentions,
+            'bio_keywords': list(analysis.bio_keywords),
+            'channels': analysis.total_channels,
+            'findings': [f"{finding.channel.title}: {finding.matched_keyword}"
+                         for finding in analysis.suspicious_channels[:5]],
+            'nsfw_channels': len(analysis.nsfw_channels),
+            'avatar_match': analysis.avatar_match,
+        },
+        'partial': analysis.partial,
+        'failures': list(analysis.failures[:3]),
+        'action': settings().get('AUTO_BAN_ACTION', chat_id) if acted else 'none',
+        'reason': reason,
+    }
+
+    try:
+        _queue.put_nowait(doc)
+        trace_stats['recorded'] += 1
+    except asyncio.QueueFull:
+        trace_stats['dropped'] += 1
+
+
+async def run_trace_writer():
+    """Write queued decision traces in batches forever"""
+    while True:
+        batch = [await _queue.get()]
+        while len(batch) < TRACE_BATCH_SIZE and not _queue.empty():
+            batch.append(_queue.get_nowait())
+        try:
+            await insert_decision_traces(batch)
+            trace_stats['written'] += len(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            trace_stats['dropped'] += len(batch)
+            log_error(f"Error writing {len(batch)} decision traces: {e}")
+
+
+def format_trace(doc: dict) -> str:
+    """Render a stored trace for /why"""
+    text = f"`{doc['created_at'].strftime('%Y-%m-%d %H:%M:%S')}` **{doc['source']}** → **{doc['action']}**"
+    if doc.get('reason'):
+        text += f" ({doc['reason']})"
+    if doc.get('partial'):
+        text += " [partial]"
+    text += "\n"
+
+    if doc.get('latency_ms') is not None:
+        text += f"  Latency {doc['latency_ms'] / 1000:.2f}s, "
+    else:
+        text += "  "
+    calls = ", ".join(f"{method} {count}" for method, count in
+                      sorted(doc['api_calls'].items(), key=lambda item: item[1], reverse=True))
+    text += f"{doc['api_total']} API calls" + (f" ({calls})" if calls else "") + "\n"
+    if doc['stages']:
+        text += "  Stages: " + ", ".join(f"{stage} {ms / 1000:.2f}s" for stage, ms in doc['stages']) + "\n"
+    if doc['cache']:
+        text += "  Cache hits: " + ", ".join(f"{name} {count}" for name, count in doc['cache'].items()) + "\n"
+
+    signals = doc['signals']
+    fired = []
+    if signals['bio_mentions']:
+        fired.append("bio " + (", ".join(signals['bio_keywords']) or "channel link"))
+    fired.extend(signals['findings'])
+    if signals.get('avatar_match'):
+        fired.append(f"avatar {signals['avatar_match']}")
+    text += f"  Signals ({signals['channels']} channels): " + ("; ".join(fired) or "none") + "\n"
+    if doc['failures']:
+        text += "  Failures: " + "; ".join(doc['failures']) + "\n"
+    return text
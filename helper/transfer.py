@@ -0,0 +1,258 @@
+"""
+Streaming export and import of the bot's moderation state
+Moves warnings, whitelists, chat configs and overrides, the avatar
+blocklist, verdicts, analysis retries, audit checkpoints and activity between
+deployments, and carries a snapshot of the in-memory verdict cache so a new
+instance starts warm instead of re-analyzing every profile.
+
+An export file is a gzip stream of BSON documents, each length-prefixed by
+its own first four bytes. The first document is a header, the last a
+trailer with the document count of every section, and each one in between
+is a chunk {'s': section, 'd': [documents]} of up to EXPORT_CHUNK_DOCUMENTS.
+Collections are read through cursors fetching EXPORT_CURSOR_BATCH_SIZE
+documents per round trip and files are read one chunk at a time, so memory
+stays bounded by one batch plus one chunk whatever the size of the data.
+Import upserts every chunk with one unordered bulk write, so importing the
+same file twice changes nothing. Verdicts only replace older stored verdicts.
+
+Usage (outside the bot, which can snapshot its verdict cache with /export):
+    python -m helper.transfer export state.bin.gz
+    python -m helper.transfer import state.bin.gz
+    python -m helper.transfer export activity.bin.gz --sections user_activity activity_rollups
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import time
+from datetime import datetime
+
+import bson
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from helper.utils import (
+    log_info, log_success, log_warning,
+    warnings_collection, whitelists_collection, punishments_collection,
+    chat_settings_collection, avatars_collection, verdicts_collection,
+    retries_collection, audits_collection, activity_collection, rollups_collection,
+    snapshot_verdict_cache, merge_verdicts, forget_chat_caches, load_analysis_retries
+)
+from helper.runtime_config import load_chat_overrides
+from helper.avatar_hash import load_avatar_blocklist
+
+from config import EXPORT_CURSOR_BATCH_SIZE, EXPORT_CHUNK_DOCUMENTS, EXPORT_COMPRESS_LEVEL
+
+FORMAT_NAME = 'bio-bot-export'
+FORMAT_VERSION = 1
+
+# Section -> (collection, fields identifying a document). Activity has no natural
+# key, so its documents keep their _id; everything else is matched on its unique index.
+SECTIONS = {
+    'punishments': (punishments_collection, ('chat_id',)),
+    'chat_settings': (chat_settings_collection, ('chat_id',)),
+    'whitelists': (whitelists_collection, ('chat_id', 'user_id')),
+    'warnings': (warnings_collection, ('chat_id', 'user_id')),
+    'avatar_blocklist': (avatars_collection, ('phash',)),
+    'verdicts': (verdicts_collection, ('user_id',)),
+    'analysis_retries': (retries_collection, ('user_id',)),
+    'audits': (audits_collection, ('chat_id',)),
+    'user_activity': (activity_collection, ('_id',)),
+    'activity_rollups': (rollups_collection, ('chat_id', 'user_id', 'hour')),
+}
+# Snapshot of the in-memory verdict cache; imported into the verdicts collection
+VERDICT_CACHE = 'verdict_cache'
+
+
+class _ExportWriter:
+    """Buffer documents per section and write them as compressed chunks"""
+
+    __slots__ = ('file', 'counts', 'bytes')
+
+    def __init__(self, file):
+        self.file = file
+        self.counts = {}
+        self.bytes = 0
+
+    async def write(self, document: dict):
+        data = bson.encode(document)
+        self.bytes += len(data)
+        # Compression and disk writes run off the event loop
+        await asyncio.to_thread(self.file.write, data)
+
+    async def write_section(self, section: str, documents):
+        """Write an async iterable of documents as chunks of EXPORT_CHUNK_DOCUMENTS"""
+        chunk = []
+        self.counts[section] = 0
+        async for doc in documents:
+            chunk.append(doc)
+            if len(chunk) >= EXPORT_CHUNK_DOCUMENTS:
+                await self.write({'s': section, 'd': chunk})
+                self.counts[section] += len(chunk)
+                chunk = []
+        if chunk:
+            await self.write({'s': section, 'd': chunk})
+            self.counts[section] += len(chunk)
+
+
+async def _collection_documents(section: str):
+    collection, key = SECTIONS[section]
+    projection = None if '_id' in key else {'_id': 0}
+    async for doc in collection.find({}, projection).batch_size(EXPORT_CURSOR_BATCH_SIZE):
+        yield doc
+
+
+async def _list_documents(documents: list):
+    for doc in documents:
+        yield doc
+
+
+async def export_data(path: str, sections: list = None, include_verdict_cache: bool = True) -> dict:
+    """
+    Stream collections (and the verdict cache) to an export file
+
+    The file is written next to `path` and renamed into place when complete,
+    so an interrupted export never leaves a truncated file behind.
+
+    Args:
+        path: File to write
+        sections: Collections to export (default: all of SECTIONS)
+        include_verdict_cache: Also snapshot this process's in-memory verdict cache
+
+    Returns:
+        dict: Documents per section, plus 'bytes' (before compression) and 'seconds'
+    """
+    started = time.monotonic()
+    # Taken first, so the snapshot reflects the cache when the export was requested
+    cached_verdicts = snapshot_verdict_cache() if include_verdict_cache else []
+    partial_path = path + '.partial'
+
+    with gzip.open(partial_path, 'wb', compresslevel=EXPORT_COMPRESS_LEVEL) as f:
+        writer = _ExportWriter(f)
+        await writer.write({'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'created_at': datetime.now()})
+        for section in list(SECTIONS) if sections is None else sections:
+            log_info(f"Exporting {section}...")
+            await writer.write_section(section, _collection_documents(section))
+        if cached_verdicts:
+            await writer.write_section(VERDICT_CACHE, _list_documents(cached_verdicts))
+        await writer.write({'end': True, 'counts': writer.counts})
+    os.replace(partial_path, path)
+
+    result = {**writer.counts, 'bytes': writer.bytes, 'seconds': round(time.monotonic() - started, 2)}
+    log_success(f"Exported {sum(writer.counts.values())} documents to {path} "
+                f"({writer.bytes} bytes of BSON, {os.path.getsize(path)} compressed)")
+    return result
+
+
+def _upserts(section: str, documents: list) -> list:
+    key = SECTIONS[section][1]
+    return [ReplaceOne({field: doc[field] for field in key}, doc, upsert=True) for doc in documents]
+
+
+async def _write_verdicts(documents: list):
+    """
+    Upsert verdicts unless the stored verdict of the user is as new or newer
+
+    A newer stored verdict makes the filter miss, and the upsert then fails
+    on the unique user_id index; those duplicate key errors are the skips.
+    """
+    try:
+        await verdicts_collection.bulk_write([
+            UpdateOne({'user_id': doc['user_id'], 'timestamp': {'$lt': doc['timestamp']}},
+                      {'$set': {'timestamp': doc['timestamp'], 'is_suspicious': doc.get('is_suspicious', False)}},
+                      upsert=True)
+            for doc in documents
+        ], ordered=False)
+    except BulkWriteError as e:
+        if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+
+
+async def import_data(path: str, sections: list = None, refresh_caches: bool = True) -> dict:
+    """
+    Upsert the contents of an export file into MongoDB
+
+    Args:
+        path: File written by export_data
+        sections: Sections to import (default: all in the file; 'verdict_cache' included)
+        refresh_caches: Merge the verdict cache snapshot into this process's cache and
+                        reload its whitelists, configs, overrides, blocklist and retries
+
+    Returns:
+        dict: Documents per section, plus 'complete' (False if the file ended
+              before its trailer) and 'seconds'
+
+    Raises:
+        ValueError: The file is not an export file or has an unsupported version
+    """
+    started = time.monotonic()
+    counts = {}
+    complete = False
+
+    with gzip.open(path, 'rb') as f:
+        frames = bson.decode_file_iter(f)
+        header = await asyncio.to_thread(next, frames, None)
+        if not header or header.get('format') != FORMAT_NAME:
+            raise ValueError(f"{path} is not an export file")
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export version {header.get('version')}")
+
+        try:
+            while True:
+                frame = await asyncio.to_thread(next, frames, None)
+                if frame is None:
+                    break
+                if frame.get('end'):
+                    complete = True
+                    break
+                section, documents = frame['s'], frame['d']
+                if sections is not None and section not in sections:
+                    continue
+                if section in (VERDICT_CACHE, 'verdicts'):
+                    if section == VERDICT_CACHE and refresh_caches:
+                        merge_verdicts(documents)
+                    await _write_verdicts(documents)
+                elif section in SECTIONS:
+                    await SECTIONS[section][0].bulk_write(_upserts(section, documents), ordered=False)
+                else:
+                    log_warning(f"Skipping unknown section {section} in {path}")
+                    continue
+                counts[section] = counts.get(section, 0) + len(documents)
+        except (EOFError, bson.errors.InvalidBSON) as e:
+            log_warning(f"{path} is truncated, imported what was readable: {e}")
+
+    if refresh_caches:
+        # Imported documents replace what this process has cached
+        forget_chat_caches()
+        if 'chat_settings' in counts:
+            await load_chat_overrides()
+        if 'avatar_blocklist' in counts:
+            await load_avatar_blocklist()
+        if 'analysis_retries' in counts:
+            await load_analysis_retries()
+    result = {**counts, 'complete': complete, 'seconds': round(time.monotonic() - started, 2)}
+    log_success(f"Imported {sum(counts.values())} documents from {path}" + ("" if complete else " (incomplete file)"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=('export', 'import'))
+    parser.add_argument('path', help="Export file")
+    parser.add_argument('--sections', nargs='+', choices=list(SECTIONS) + [VERDICT_CACHE],
+                        help="Sections to export or import (default: all)")
+    args = parser.parse_args()
+
+    if args.action == 'export':
+        # This process has no verdict cache to snapshot; the verdicts collection is exported instead
+        sections = [name for name in args.sections or SECTIONS if name != VERDICT_CACHE]
+        result = asyncio.run(export_data(args.path, sections, include_verdict_cache=False))
+    else:
+        result = asyncio.run(import_data(args.path, args.sections, refresh_caches=False))
+    for key, value in result.items():
+        print(f"  {key:<20} {value}")
+
+
+if __name__ == '__main__':
+    main()
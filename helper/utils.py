@@ -1,5 +1,7 @@
 from pyrogram import Client, enums, filters
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, WriteConcern, UpdateOne
+from pymongo.errors import CollectionInvalid
 from datetime import datetime, timedelta
 from colorama import Fore, Back, Style, init
 
@@ -8,10 +10,34 @@ init(autoreset=True)
 
 from config import (
     MONGO_URI,
+    MONGO_DB_NAME,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_MAJORITY_WTIMEOUT_MS,
+    MONGO_WRITE_CONCERNS,
+    ACTIVITY_WRITE_BATCH_SIZE,
+    ACTIVITY_FLUSH_SECONDS,
     DEFAULT_CONFIG,
     DEFAULT_PUNISHMENT,
-    DEFAULT_WARNING_LIMIT
+    DEFAULT_WARNING_LIMIT,
+    ADMIN_CACHE_TTL,
+    ACTIVITY_RETENTION_DAYS,
+    STREAM_BATCH_SIZE,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    TRACE_COLLECTION_MB
 )
+import asyncio
+import random
+import time
+
+from helper.activity_buffer import record_activity, get_buffer_for
 
 # Verbose logging functions
 def log_info(message: str):
@@ -34,8 +60,17 @@ def log_error(message: str):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"{Fore.RED}[{timestamp}] ❌ ERROR: {message}{Style.RESET_ALL}")
 
+# Debug logging is switched off while the bot sheds load (see helper/overload.py)
+_debug_logging = True
+
+def set_debug_logging(enabled: bool):
+    global _debug_logging
+    _debug_logging = enabled
+
 def log_debug(message: str):
     """Log debug message"""
+    if not _debug_logging:
+        return
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"{Fore.MAGENTA}[{timestamp}] 🔍 DEBUG: {message}{Style.RESET_ALL}")
 
@@ -60,27 +95,254 @@ def log_separator(title: str = ""):
     else:
         print(f"{Fore.WHITE}{'='*60}{Style.RESET_ALL}")
 
-mongo_client = AsyncIOMotorClient(MONGO_URI)
-db = mongo_client['telegram_bot_db']
-warnings_collection = db['warnings']
-punishments_collection = db['punishments']
-whitelists_collection = db['whitelists']
-activity_collection = db['user_activity']
+# connect=False defers the connection until first use; the time spent here is
+# mostly URI parsing (and SRV resolution for mongodb+srv URIs)
+_mongo_init_started = time.perf_counter()
+mongo_client = AsyncIOMotorClient(
+    MONGO_URI,
+    connect=False,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS or None,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS
+)
+MONGO_INIT_SECONDS = time.perf_counter() - _mongo_init_started
+db = mongo_client[MONGO_DB_NAME]
+
+# Write concern profiles named in MONGO_WRITE_CONCERNS
+WRITE_CONCERNS = {
+    'fast': WriteConcern(w=0),
+    'acknowledged': WriteConcern(w=1),
+    'majority': WriteConcern(w='majority', j=True, wtimeout=MONGO_MAJORITY_WTIMEOUT_MS),
+}
+
+def get_collection(name: str, database=None):
+    """Get a collection with the write concern profile configured for it in MONGO_WRITE_CONCERNS"""
+    profile = MONGO_WRITE_CONCERNS.get(name, 'acknowledged')
+    return (database or db).get_collection(name, write_concern=WRITE_CONCERNS[profile])
+
+warnings_collection = get_collection('warnings')
+punishments_collection = get_collection('punishments')
+whitelists_collection = get_collection('whitelists')
+activity_collection = get_collection('user_activity')
+verdicts_collection = get_collection('verdicts')
+chat_settings_collection = get_collection('chat_settings')
+audits_collection = get_collection('audits')
+rollups_collection = get_collection('activity_rollups')
+retries_collection = get_collection('analysis_retries')
+avatars_collection = get_collection('avatar_blocklist')
+traces_collection = get_collection('decision_traces')
+claims_collection = get_collection('moderation_claims')
+# One document per one-time data migration that has completed
+migrations_collection = get_collection('migrations')
+
+# Fields returned by the activity streams
+ACTIVITY_FIELDS = {'_id': 0, 'chat_id': 1, 'user_id': 1, 'activity_type': 1, 'timestamp': 1}
+
+# Newest messages/reactions kept in check_user_comprehensive results
+COMPREHENSIVE_SAMPLE_SIZE = 20
+
+# Rollup counter field per activity type; anything else only counts towards 'total'
+ROLLUP_FIELDS = {'message': 'messages', 'reaction': 'reactions', 'join': 'joins'}
+
+# In-memory verdict cache: user_id -> {'timestamp': datetime, 'is_suspicious': bool}
+_verdict_cache = {}
+# chat_id -> (loaded_at, set of admin user IDs)
+_admin_cache = {}
+# chat_id -> set of whitelisted user IDs
+_whitelist_cache = {}
+# chat_id -> (mode, limit, penalty)
+_config_cache = {}
+# Activity documents waiting for the next batched write (see flush_activity)
+_pending_activity = []
+activity_write_stats = {'written': 0, 'batches': 0, 'failed': 0}
+# User IDs with a pending or dead-lettered analysis retry
+_retry_users = set()
+
+async def connect_database() -> float:
+    """
+    Open the MongoDB connection and measure the round trip
 
-async def is_admin(client: Client, chat_id: int, user_id: int) -> bool:
+    Returns:
+        float: Seconds taken by the initial ping
+    """
+    started = time.perf_counter()
+    await db.command('ping')
+    return time.perf_counter() - started
+
+async def _ensure_capped(name: str, size: int):
+    """Create a capped collection, converting it if it already exists uncapped"""
+    try:
+        await db.create_collection(name, capped=True, size=size)
+        return
+    except CollectionInvalid:
+        pass  # Already exists
+    # Inserts before the first ensure_indexes() create the collection uncapped
+    if not (await db[name].options()).get('capped'):
+        log_warning(f"{name} is not capped, converting it to a {size // (1024 * 1024)} MB capped collection")
+        await db.command('convertToCapped', name, size=size)
+
+# (collection, keys, options) of the indexes used by the hot queries
+INDEXES = [
+    (warnings_collection, [('chat_id', 1), ('user_id', 1)], {'unique': True}),
+    (punishments_collection, 'chat_id', {'unique': True}),
+    (whitelists_collection, [('chat_id', 1), ('user_id', 1)], {'unique': True}),
+    (activity_collection, [('chat_id', 1), ('user_id', 1), ('timestamp', -1)], {}),
+    (activity_collection, [('chat_id', 1), ('activity_type', 1), ('timestamp', -1)], {}),
+    (verdicts_collection, 'user_id', {'unique': True}),
+    (verdicts_collection, 'timestamp', {}),
+    (chat_settings_collection, 'chat_id', {'unique': True}),
+    (rollups_collection, [('chat_id', 1), ('user_id', 1), ('hour', 1)], {'unique': True}),
+    (rollups_collection, [('chat_id', 1), ('hour', 1)], {}),
+    (rollups_collection, 'hour', {'expireAfterSeconds': ACTIVITY_RETENTION_DAYS * 86400}),
+    (retries_collection, 'user_id', {'unique': True}),
+    (retries_collection, [('status', 1), ('next_attempt_at', 1)], {}),
+    (avatars_collection, 'phash', {'unique': True}),
+    (traces_collection, [('user_id', 1), ('created_at', -1)], {}),
+    (claims_collection, [('chat_id', 1), ('user_id', 1), ('event', 1)], {'unique': True}),
+    (claims_collection, 'expires_at', {'expireAfterSeconds': 0}),
+]
+
+async def ensure_indexes():
+    """
+    Create the indexes used by the hot queries (no-op if they already exist)
+
+    Every index is created on its own, so one that cannot be built (e.g. a
+    unique index over duplicates in existing data) is logged and the rest
+    are still created.
+    """
+    # Capped: the oldest decision traces are overwritten once the size is reached
+    try:
+        await _ensure_capped('decision_traces', TRACE_COLLECTION_MB * 1024 * 1024)
+    except Exception as e:
+        log_error(f"Could not set up the capped decision_traces collection: {e}")
+
+    for collection, keys, options in INDEXES:
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            log_error(f"Could not create index {keys} on {collection.name}: {e}")
+
+ROLLUP_BACKFILL_MIGRATION = 'activity_rollups_backfill'
+
+async def backfill_activity_rollups() -> bool:
+    """
+    Build the hourly rollups from the raw activity collection, once per database
+
+    The run is recorded in the migrations collection, so later starts skip it
+    even though live writes keep the rollups non-empty. Hours that already
+    have rollups are replaced by the counts of the raw activity, which holds
+    every record the rollups were built from. The pipeline uses $dateTrunc
+    and needs MongoDB 5.0 or newer; older servers skip the backfill and retry
+    it on the next start.
+
+    Returns:
+        bool: True if a backfill was run
+    """
+    if await migrations_collection.find_one({'_id': ROLLUP_BACKFILL_MIGRATION}):
+        return False
+
+    build_info = await db.command('buildInfo')
+    if tuple(build_info.get('versionArray', (0,))[:2]) < (5, 0):
+        log_warning(f"Skipping the activity rollup backfill: MongoDB {build_info.get('version')} "
+                    f"has no $dateTrunc (5.0 or newer is needed)")
+        return False
+
+    def count_type(activity_type):
+        return {'$sum': {'$cond': [{'$eq': ['$activity_type', activity_type]}, 1, 0]}}
+
+    pipeline = [
+        {'$group': {
+            '_id': {
+                'chat_id': '$chat_id',
+                'user_id': '$user_id',
+                'hour': {'$dateTrunc': {'date': '$timestamp', 'unit': 'hour'}}
+            },
+            'total': {'$sum': 1},
+            'messages': count_type('message'),
+            'reactions': count_type('reaction'),
+            'joins': count_type('join'),
+            'first_seen': {'$min': '$timestamp'},
+            'last_seen': {'$max': '$timestamp'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'chat_id': '$_id.chat_id',
+            'user_id': '$_id.user_id',
+            'hour': '$_id.hour',
+            'total': 1, 'messages': 1, 'reactions': 1, 'joins': 1,
+            'first_seen': 1, 'last_seen': 1
+        }},
+        {'$merge': {'into': rollups_collection.name, 'on': ['chat_id', 'user_id', 'hour']}}
+    ]
+    # Raw activity is written unacknowledged; the $merge must not be
+    acknowledged = activity_collection.with_options(write_concern=WRITE_CONCERNS['acknowledged'])
+    started = time.perf_counter()
+    await acknowledged.aggregate(pipeline).to_list(length=None)
+    await migrations_collection.update_one(
+        {'_id': ROLLUP_BACKFILL_MIGRATION},
+        {'$set': {'completed_at': datetime.now(), 'seconds': round(time.perf_counter() - started, 2)}},
+        upsert=True
+    )
+    log_info("Backfilled hourly activity rollups from raw activity")
+    return True
+
+async def get_known_chat_ids() -> set:
+    """
+    Get the chats the bot has state for
+
+    Bots cannot list their dialogs, so the chats are collected from the
+    configuration, whitelist and activity collections instead.
+    """
+    chat_ids = set()
+    for collection in (punishments_collection, whitelists_collection, chat_settings_collection):
+        chat_ids.update(await collection.distinct('chat_id'))
+    recent = datetime.now() - timedelta(days=1)
+    chat_ids.update(await activity_collection.distinct('chat_id', {'timestamp': {'$gte': recent}}))
+    return chat_ids
+
+async def get_admin_ids(client: Client, chat_id: int, refresh: bool = False) -> set:
+    """
+    Get the administrator user IDs of a chat, cached for ADMIN_CACHE_TTL seconds
+
+    Args:
+        client: Pyrogram client
+        chat_id: Chat ID
+        refresh: Bypass the cache and fetch the roster again
+
+    Returns:
+        set: User IDs of the chat administrators
+    """
+    cached = _admin_cache.get(chat_id)
+    if cached and not refresh and time.monotonic() - cached[0] < ADMIN_CACHE_TTL:
+        return cached[1]
+
+    admin_ids = set()
     async for member in client.get_chat_members(
         chat_id,
         filter=enums.ChatMembersFilter.ADMINISTRATORS
     ):
-        if member.user.id == user_id:
-            return True
-    return False
+        admin_ids.add(member.user.id)
+    _admin_cache[chat_id] = (time.monotonic(), admin_ids)
+    return admin_ids
+
+async def is_admin(client: Client, chat_id: int, user_id: int) -> bool:
+    return user_id in await get_admin_ids(client, chat_id)
 
 async def get_config(chat_id: int):
+    cached = _config_cache.get(chat_id)
+    if cached:
+        return cached
     doc = await punishments_collection.find_one({'chat_id': chat_id})
     if doc:
-        return doc.get('mode', 'warn'), doc.get('limit', DEFAULT_WARNING_LIMIT), doc.get('penalty', DEFAULT_PUNISHMENT)
-    return DEFAULT_CONFIG
+        chat_config = doc.get('mode', 'warn'), doc.get('limit', DEFAULT_WARNING_LIMIT), doc.get('penalty', DEFAULT_PUNISHMENT)
+    else:
+        chat_config = DEFAULT_CONFIG
+    _config_cache[chat_id] = chat_config
+    return chat_config
 
 async def update_config(chat_id: int, mode=None, limit=None, penalty=None):
     update = {}
@@ -96,22 +358,33 @@ async def update_config(chat_id: int, mode=None, limit=None, penalty=None):
             {'$set': update},
             upsert=True
         )
+        _config_cache.pop(chat_id, None)
 
 async def increment_warning(chat_id: int, user_id: int) -> int:
-    await warnings_collection.update_one(
+    """Add a warning and return the new count, in one atomic round trip"""
+    doc = await warnings_collection.find_one_and_update(
         {'chat_id': chat_id, 'user_id': user_id},
         {'$inc': {'count': 1}},
-        upsert=True
+        projection={'_id': 0, 'count': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
-    doc = await warnings_collection.find_one({'chat_id': chat_id, 'user_id': user_id})
     return doc['count']
 
 async def reset_warnings(chat_id: int, user_id: int):
     await warnings_collection.delete_one({'chat_id': chat_id, 'user_id': user_id})
 
+async def load_whitelist(chat_id: int) -> set:
+    """Load a chat's whitelist into memory"""
+    whitelist = set(await get_whitelist(chat_id))
+    _whitelist_cache[chat_id] = whitelist
+    return whitelist
+
 async def is_whitelisted(chat_id: int, user_id: int) -> bool:
-    doc = await whitelists_collection.find_one({'chat_id': chat_id, 'user_id': user_id})
-    return bool(doc)
+    whitelist = _whitelist_cache.get(chat_id)
+    if whitelist is None:
+        whitelist = await load_whitelist(chat_id)
+    return user_id in whitelist
 
 async def add_whitelist(chat_id: int, user_id: int):
     await whitelists_collection.update_one(
@@ -119,15 +392,279 @@ async def add_whitelist(chat_id: int, user_id: int):
         {'$set': {'user_id': user_id}},
         upsert=True
     )
+    if chat_id in _whitelist_cache:
+        _whitelist_cache[chat_id].add(user_id)
 
 async def remove_whitelist(chat_id: int, user_id: int):
     await whitelists_collection.delete_one({'chat_id': chat_id, 'user_id': user_id})
+    if chat_id in _whitelist_cache:
+        _whitelist_cache[chat_id].discard(user_id)
 
 async def get_whitelist(chat_id: int) -> list:
     cursor = whitelists_collection.find({'chat_id': chat_id})
     docs = await cursor.to_list(length=None)
     return [doc['user_id'] for doc in docs]
 
+async def record_verdict(user_id: int, is_suspicious: bool):
+    """
+    Remember when a user's profile was last analyzed and what the outcome was
+
+    Args:
+        user_id: User ID that was analyzed
+        is_suspicious: Whether the analysis flagged the user
+    """
+    verdict = {'timestamp': datetime.now(), 'is_suspicious': is_suspicious}
+    _verdict_cache[user_id] = verdict
+    try:
+        await verdicts_collection.update_one(
+            {'user_id': user_id},
+            {'$set': verdict},
+            upsert=True
+        )
+    except Exception as e:
+        log_error(f"Error recording verdict: {e}")
+
+async def get_verdict(user_id: int):
+    """
+    Get the last known verdict for a user
+
+    Args:
+        user_id: User ID to look up
+
+    Returns:
+        dict: Verdict with 'timestamp' and 'is_suspicious', or None if never analyzed
+    """
+    verdict = _verdict_cache.get(user_id)
+    if verdict:
+        return verdict
+    try:
+        doc = await verdicts_collection.find_one({'user_id': user_id})
+    except Exception as e:
+        log_error(f"Error getting verdict: {e}")
+        return None
+    if doc:
+        verdict = {'timestamp': doc['timestamp'], 'is_suspicious': doc.get('is_suspicious', False)}
+        _verdict_cache[user_id] = verdict
+    return verdict
+
+async def load_recent_verdicts(hours: int, limit: int) -> int:
+    """
+    Load recently recorded verdicts into the in-memory cache
+
+    Args:
+        hours: Only load verdicts newer than this
+        limit: Maximum number of verdicts to load
+
+    Returns:
+        int: Number of verdicts loaded
+    """
+    cursor = verdicts_collection.find(
+        {'timestamp': {'$gte': datetime.now() - timedelta(hours=hours)}},
+        {'_id': 0, 'user_id': 1, 'timestamp': 1, 'is_suspicious': 1}
+    ).sort('timestamp', -1).limit(limit)
+
+    loaded = 0
+    async for doc in cursor:
+        _verdict_cache.setdefault(doc['user_id'], {
+            'timestamp': doc['timestamp'],
+            'is_suspicious': doc.get('is_suspicious', False)
+        })
+        loaded += 1
+    return loaded
+
+def snapshot_verdict_cache() -> list:
+    """Copy the in-memory verdict cache as verdict documents ({'user_id', 'timestamp', 'is_suspicious'})"""
+    return [{'user_id': user_id, **verdict} for user_id, verdict in list(_verdict_cache.items())]
+
+def merge_verdicts(docs: list) -> int:
+    """
+    Add verdict documents to the in-memory cache, keeping the newer verdict of a user
+
+    Returns:
+        int: Number of cache entries added or replaced
+    """
+    merged = 0
+    for doc in docs:
+        cached = _verdict_cache.get(doc['user_id'])
+        if cached is None or cached['timestamp'] < doc['timestamp']:
+            _verdict_cache[doc['user_id']] = {
+                'timestamp': doc['timestamp'],
+                'is_suspicious': doc.get('is_suspicious', False)
+            }
+            merged += 1
+    return merged
+
+def forget_chat_caches():
+    """Drop the cached whitelists and chat configs so they are reloaded from MongoDB"""
+    _whitelist_cache.clear()
+    _config_cache.clear()
+
+def _retry_delay(attempts: int, retry_after: int = 0) -> float:
+    """Exponential backoff with jitter, never shorter than a FloodWait"""
+    delay = min(RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_DELAY_SECONDS)
+    delay *= random.uniform(0.8, 1.2)
+    return max(delay, retry_after)
+
+async def enqueue_analysis_retry(chat_id: int, user_id: int, error: str, retry_after: int = 0):
+    """
+    Schedule another analysis of a user whose last analysis was incomplete
+
+    Each failure counts as an attempt; after RETRY_MAX_ATTEMPTS retries the
+    entry is moved to the dead-letter list instead.
+
+    Args:
+        chat_id: Chat ID the analysis ran for
+        user_id: User ID that could not be fully analyzed
+        error: Description of the error that interrupted the analysis
+        retry_after: Minimum seconds to wait (e.g. from a FloodWait)
+    """
+    now = datetime.now()
+    try:
+        doc = await retries_collection.find_one_and_update(
+            {'user_id': user_id},
+            {
+                '$inc': {'attempts': 1},
+                '$set': {'chat_id': chat_id, 'last_error': error, 'updated_at': now},
+                '$setOnInsert': {'created_at': now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        _retry_users.add(user_id)
+
+        retries = doc['attempts'] - 1
+        if retries >= RETRY_MAX_ATTEMPTS:
+            await retries_collection.update_one({'_id': doc['_id']}, {'$set': {'status': 'dead'}})
+            log_warning(f"Analysis of user {user_id} moved to dead letters after {retries} retries: {error}")
+            return
+
+        delay = _retry_delay(doc['attempts'], retry_after)
+        await retries_collection.update_one(
+            {'_id': doc['_id']},
+            {'$set': {'status': 'pending', 'next_attempt_at': now + timedelta(seconds=delay)}}
+        )
+        log_warning(f"Analysis of user {user_id} incomplete ({error}); "
+                    f"retry {retries + 1}/{RETRY_MAX_ATTEMPTS} in {delay:.0f}s")
+    except Exception as e:
+        log_error(f"Error queueing analysis retry: {e}")
+
+async def resolve_analysis_retry(user_id: int):
+    """Drop a user's retry entry (pending or dead) after a complete analysis"""
+    if user_id not in _retry_users:
+        return
+    _retry_users.discard(user_id)
+    try:
+        await retries_collection.delete_one({'user_id': user_id})
+    except Exception as e:
+        log_error(f"Error resolving analysis retry: {e}")
+
+def has_analysis_retry(user_id: int) -> bool:
+    return user_id in _retry_users
+
+async def next_analysis_retry():
+    """Get the pending retry that is due first, or None"""
+    return await retries_collection.find_one({'status': 'pending'}, sort=[('next_attempt_at', 1)])
+
+async def claim_analysis_retry(user_id: int, seconds: int):
+    """Push a retry's due time back while it is being worked on, so it is not picked twice"""
+    await retries_collection.update_one(
+        {'user_id': user_id, 'status': 'pending'},
+        {'$set': {'next_attempt_at': datetime.now() + timedelta(seconds=seconds)}}
+    )
+
+async def load_analysis_retries() -> int:
+    """
+    Load the user IDs of stored retry entries into memory
+
+    Returns:
+        int: Number of pending retries
+    """
+    pending = 0
+    async for doc in retries_collection.find({}, {'_id': 0, 'user_id': 1, 'status': 1}):
+        _retry_users.add(doc['user_id'])
+        if doc.get('status') == 'pending':
+            pending += 1
+    return pending
+
+async def get_dead_letters(limit: int = 20) -> list:
+    """Get analyses that exhausted their retries, most recently failed first"""
+    try:
+        cursor = retries_collection.find({'status': 'dead'}).sort('updated_at', -1).limit(limit)
+        return await cursor.to_list(length=limit)
+    except Exception as e:
+        log_error(f"Error getting dead letters: {e}")
+        return []
+
+async def requeue_dead_letters(user_id: int = None) -> int:
+    """
+    Give dead-lettered analyses a fresh set of retries
+
+    Args:
+        user_id: Only requeue this user (default: all dead letters)
+
+    Returns:
+        int: Number of entries requeued
+    """
+    query = {'status': 'dead'}
+    if user_id is not None:
+        query['user_id'] = user_id
+    result = await retries_collection.update_many(
+        query,
+        {'$set': {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.now()}}
+    )
+    return result.modified_count
+
+async def insert_decision_traces(docs: list):
+    await traces_collection.insert_many(docs, ordered=False)
+
+async def get_decision_traces(user_id: int, chat_id: int = None, limit: int = 3) -> list:
+    """Get a user's most recent decision traces (optionally for one chat), newest first"""
+    query = {'user_id': user_id}
+    if chat_id is not None:
+        query['chat_id'] = chat_id
+    try:
+        cursor = traces_collection.find(query, {'_id': 0}).sort('created_at', -1).limit(limit)
+        return await cursor.to_list(length=limit)
+    except Exception as e:
+        log_error(f"Error getting decision traces: {e}")
+        return []
+
+async def add_avatar_hash(phash: str, dhash: str, label: str, chat_id: int, added_by: int):
+    """Store a blocked avatar (hashes as 16-digit hex strings, see helper.avatar_hash)"""
+    await avatars_collection.update_one(
+        {'phash': phash},
+        {'$set': {'dhash': dhash, 'label': label, 'chat_id': chat_id,
+                  'added_by': added_by, 'added_at': datetime.now()}},
+        upsert=True
+    )
+
+async def remove_avatar_hash(phash: str) -> bool:
+    result = await avatars_collection.delete_one({'phash': phash})
+    return result.deleted_count > 0
+
+async def get_avatar_hashes() -> list:
+    """Get every blocked avatar as {'phash', 'dhash', 'label'}"""
+    cursor = avatars_collection.find({}, {'_id': 0, 'phash': 1, 'dhash': 1, 'label': 1})
+    return await cursor.to_list(length=None)
+
+async def count_recent_user_activity(chat_id: int, user_id: int, minutes: int = 5) -> int:
+    """
+    Count a user's activities in the group over a short window
+
+    Args:
+        chat_id: Chat ID
+        user_id: User ID
+        minutes: Number of minutes to look back (default 5)
+
+    Returns:
+        int: Number of tracked activities in the window
+    """
+    try:
+        return await count_activity(chat_id, datetime.now() - timedelta(minutes=minutes), user_id=user_id)
+    except Exception as e:
+        log_error(f"Error counting user activity: {e}")
+        return 0
+
 # New activity tracking functions
 async def track_user_activity(chat_id: int, user_id: int, activity_type: str, details: str = ""):
     """
@@ -147,21 +684,76 @@ async def track_user_activity(chat_id: int, user_id: int, activity_type: str, de
             'details': details,
             'timestamp': datetime.now()
         }
+        record_activity(chat_id, user_id, activity_type, activity_doc['timestamp'])
 
-        await activity_collection.insert_one(activity_doc)
+        _pending_activity.append(activity_doc)
+        if len(_pending_activity) >= ACTIVITY_WRITE_BATCH_SIZE:
+            await flush_activity()
         log_debug(f"Tracked activity: User {user_id} | {activity_type} | {details}")
 
+    except Exception as e:
+        log_error(f"Error tracking user activity: {e}")
+
+def _rollup_updates(docs: list) -> list:
+    """Merge the rollup counters of activity documents into one upsert per (chat, user, hour)"""
+    merged = {}  # (chat_id, user_id, hour) -> [increments, first_seen, last_seen]
+    for doc in docs:
+        timestamp = doc['timestamp']
+        key = (doc['chat_id'], doc['user_id'], timestamp.replace(minute=0, second=0, microsecond=0))
+        entry = merged.get(key)
+        if entry is None:
+            entry = merged[key] = [{'total': 0}, timestamp, timestamp]
+        increments = entry[0]
+        increments['total'] += 1
+        field = ROLLUP_FIELDS.get(doc['activity_type'])
+        if field:
+            increments[field] = increments.get(field, 0) + 1
+        entry[1] = min(entry[1], timestamp)
+        entry[2] = max(entry[2], timestamp)
+
+    return [
+        UpdateOne(
+            {'chat_id': chat_id, 'user_id': user_id, 'hour': hour},
+            {'$inc': increments, '$min': {'first_seen': first_seen}, '$max': {'last_seen': last_seen}},
+            upsert=True
+        )
+        for (chat_id, user_id, hour), (increments, first_seen, last_seen) in merged.items()
+    ]
+
+async def flush_activity() -> int:
+    """
+    Write the pending activity records, their rollup counters and the cleanup
+    of records older than 7 days in one batch per collection
+
+    Returns:
+        int: Number of activity records written
+    """
+    if not _pending_activity:
+        return 0
+    batch = _pending_activity[:]
+    _pending_activity.clear()
+
+    try:
+        await activity_collection.insert_many(batch, ordered=False)
+        await rollups_collection.bulk_write(_rollup_updates(batch), ordered=False)
+
         # Clean up old activities (keep only last 7 days)
         cutoff_date = datetime.now() - timedelta(days=7)
-        deleted = await activity_collection.delete_many({
-            'chat_id': chat_id,
-            'timestamp': {'$lt': cutoff_date}
-        })
-        if deleted.deleted_count > 0:
-            log_debug(f"Cleaned up {deleted.deleted_count} old activity records")
-
+        for chat_id in {doc['chat_id'] for doc in batch}:
+            await activity_collection.delete_many({'chat_id': chat_id, 'timestamp': {'$lt': cutoff_date}})
+        activity_write_stats['written'] += len(batch)
+        activity_write_stats['batches'] += 1
     except Exception as e:
-        log_error(f"Error tracking user activity: {e}")
+        activity_write_stats['failed'] += len(batch)
+        log_error(f"Error writing {len(batch)} activity records: {e}")
+        return 0
+    return len(batch)
+
+async def run_activity_flusher():
+    """Write pending activity records every ACTIVITY_FLUSH_SECONDS forever"""
+    while True:
+        await asyncio.sleep(ACTIVITY_FLUSH_SECONDS)
+        await flush_activity()
 
 async def get_recent_activity(chat_id: int, hours: int = 24, user_id: int = None):
     """
@@ -178,6 +770,10 @@ async def get_recent_activity(chat_id: int, hours: int = 24, user_id: int = None
     try:
         cutoff_date = datetime.now() - timedelta(hours=hours)
 
+        buffer = get_buffer_for(chat_id, cutoff_date)
+        if buffer:
+            return buffer.query(cutoff_date.timestamp(), user_id=user_id or None, limit=100)
+
         query = {
             'chat_id': chat_id,
             'timestamp': {'$gte': cutoff_date}
@@ -208,16 +804,11 @@ async def get_user_activity_stats(chat_id: int, user_id: int, days: int = 7):
         dict: Statistics including message count, reaction count, etc.
     """
     try:
-        cutoff_date = datetime.now() - timedelta(days=days)
-
-        activities = await activity_collection.find({
-            'chat_id': chat_id,
-            'user_id': user_id,
-            'timestamp': {'$gte': cutoff_date}
-        }).to_list(length=None)
+        # Rollups are hourly, so the window starts at the top of the cutoff hour
+        cutoff_hour = (datetime.now() - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
 
         stats = {
-            'total_activities': len(activities),
+            'total_activities': 0,
             'messages': 0,
             'reactions': 0,
             'joins': 0,
@@ -225,23 +816,22 @@ async def get_user_activity_stats(chat_id: int, user_id: int, days: int = 7):
             'last_seen': None
         }
 
-        for activity in activities:
-            activity_type = activity.get('activity_type', '')
-
-            if activity_type == 'message':
-                stats['messages'] += 1
-            elif activity_type == 'reaction':
-                stats['reactions'] += 1
-            elif activity_type == 'join':
-                stats['joins'] += 1
+        async for rollup in rollups_collection.find(
+            {'chat_id': chat_id, 'user_id': user_id, 'hour': {'$gte': cutoff_hour}},
+            {'_id': 0, 'total': 1, 'messages': 1, 'reactions': 1, 'joins': 1, 'first_seen': 1, 'last_seen': 1}
+        ):
+            stats['total_activities'] += rollup.get('total', 0)
+            stats['messages'] += rollup.get('messages', 0)
+            stats['reactions'] += rollup.get('reactions', 0)
+            stats['joins'] += rollup.get('joins', 0)
 
             # Track first and last seen
-            timestamp = activity.get('timestamp')
-            if timestamp:
-                if stats['first_seen'] is None or timestamp < stats['first_seen']:
-                    stats['first_seen'] = timestamp
-                if stats['last_seen'] is None or timestamp > stats['last_seen']:
-                    stats['last_seen'] = timestamp
+            first_seen = rollup.get('first_seen')
+            if first_seen and (stats['first_seen'] is None or first_seen < stats['first_seen']):
+                stats['first_seen'] = first_seen
+            last_seen = rollup.get('last_seen')
+            if last_seen and (stats['last_seen'] is None or last_seen > stats['last_seen']):
+                stats['last_seen'] = last_seen
 
         return stats
 
@@ -262,19 +852,20 @@ async def get_active_users(chat_id: int, hours: int = 24, limit: int = 20):
         list: List of user IDs sorted by activity count
     """
     try:
-        cutoff_date = datetime.now() - timedelta(hours=hours)
+        # Rollups are hourly, so the window starts at the top of the cutoff hour
+        cutoff_hour = (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
 
         pipeline = [
             {
                 '$match': {
                     'chat_id': chat_id,
-                    'timestamp': {'$gte': cutoff_date}
+                    'hour': {'$gte': cutoff_hour}
                 }
             },
             {
                 '$group': {
                     '_id': '$user_id',
-                    'activity_count': {'$sum': 1}
+                    'activity_count': {'$sum': '$total'}
                 }
             },
             {
@@ -285,7 +876,7 @@ async def get_active_users(chat_id: int, hours: int = 24, limit: int = 20):
             }
         ]
 
-        results = await activity_collection.aggregate(pipeline).to_list(length=None)
+        results = await rollups_collection.aggregate(pipeline).to_list(length=None)
 
         return [{'user_id': r['_id'], 'count': r['activity_count']} for r in results]
 
@@ -293,6 +884,91 @@ async def get_active_users(chat_id: int, hours: int = 24, limit: int = 20):
         log_error(f"Error getting active users: {e}")
         return []
 
+async def stream_activity(chat_id: int, cutoff_date: datetime, user_id: int = None,
+                          activity_type: str = None, fields: dict = None):
+    """
+    Stream activity documents newer than cutoff_date, newest first
+
+    Short windows are served from the in-memory buffer; otherwise documents
+    are read from MongoDB in batches of STREAM_BATCH_SIZE with only the
+    requested fields, so memory stays bounded however many documents match.
+
+    Args:
+        chat_id: Chat ID
+        cutoff_date: Oldest timestamp to include
+        user_id: Optional user filter
+        activity_type: Optional activity type filter
+        fields: MongoDB projection (default ACTIVITY_FIELDS)
+
+    Yields:
+        dict: Activity documents
+    """
+    buffer = get_buffer_for(chat_id, cutoff_date)
+    if buffer:
+        for doc in buffer.query(cutoff_date.timestamp(), user_id=user_id, activity_type=activity_type):
+            yield doc
+        return
+
+    query = {'chat_id': chat_id, 'timestamp': {'$gte': cutoff_date}}
+    if user_id is not None:
+        query['user_id'] = user_id
+    if activity_type is not None:
+        query['activity_type'] = activity_type
+
+    cursor = activity_collection.find(query, fields or ACTIVITY_FIELDS).sort('timestamp', -1)
+    async for doc in cursor.batch_size(STREAM_BATCH_SIZE):
+        yield doc
+
+async def count_activity(chat_id: int, cutoff_date: datetime, user_id: int = None, activity_type: str = None) -> int:
+    """
+    Count activity newer than cutoff_date without loading the documents
+
+    Args:
+        chat_id: Chat ID
+        cutoff_date: Oldest timestamp to include
+        user_id: Optional user filter
+        activity_type: Optional activity type filter
+
+    Returns:
+        int: Number of matching activities
+    """
+    buffer = get_buffer_for(chat_id, cutoff_date)
+    if buffer:
+        return buffer.count(cutoff_date.timestamp(), user_id=user_id, activity_type=activity_type)
+
+    query = {'chat_id': chat_id, 'timestamp': {'$gte': cutoff_date}}
+    if user_id is not None:
+        query['user_id'] = user_id
+    if activity_type is not None:
+        query['activity_type'] = activity_type
+    return await activity_collection.count_documents(query)
+
+def iter_recent_joins(chat_id: int, hours: int = 24):
+    """Stream join activities of the last `hours` hours (see stream_activity)"""
+    return stream_activity(chat_id, datetime.now() - timedelta(hours=hours), activity_type='join')
+
+def iter_user_recent_messages(chat_id: int, user_id: int, hours: int = 24):
+    """Stream a user's message activities of the last `hours` hours (see stream_activity)"""
+    return stream_activity(chat_id, datetime.now() - timedelta(hours=hours), user_id=user_id, activity_type='message')
+
+def iter_user_recent_reactions(chat_id: int, user_id: int, hours: int = 24):
+    """Stream a user's reaction activities of the last `hours` hours (see stream_activity)"""
+    return stream_activity(chat_id, datetime.now() - timedelta(hours=hours), user_id=user_id, activity_type='reaction')
+
+def iter_all_recent_reactions(chat_id: int, hours: int = 24):
+    """Stream all reaction activities of the last `hours` hours (see stream_activity)"""
+    return stream_activity(chat_id, datetime.now() - timedelta(hours=hours), activity_type='reaction')
+
+async def _take(stream, limit: int) -> list:
+    """Collect at most `limit` documents from an async stream and close it"""
+    docs = []
+    async for doc in stream:
+        docs.append(doc)
+        if len(docs) >= limit:
+            break
+    await stream.aclose()
+    return docs
+
 async def get_recent_joins(chat_id: int, hours: int = 24):
     """
     Get users who recently joined the group
@@ -305,14 +981,7 @@ async def get_recent_joins(chat_id: int, hours: int = 24):
         list: List of recent join activities
     """
     try:
-        cutoff_date = datetime.now() - timedelta(hours=hours)
-
-        joins = await activity_collection.find({
-            'chat_id': chat_id,
-            'activity_type': 'join',
-            'timestamp': {'$gte': cutoff_date}
-        }).sort('timestamp', -1).to_list(length=None)
-
+        joins = [doc async for doc in iter_recent_joins(chat_id, hours)]
         log_info(f"Found {len(joins)} recent joins in last {hours} hours")
         return joins
 
@@ -333,15 +1002,7 @@ async def get_user_recent_messages(chat_id: int, user_id: int, hours: int = 24):
         list: List of message activities
     """
     try:
-        cutoff_date = datetime.now() - timedelta(hours=hours)
-
-        messages = await activity_collection.find({
-            'chat_id': chat_id,
-            'user_id': user_id,
-            'activity_type': 'message',
-            'timestamp': {'$gte': cutoff_date}
-        }).sort('timestamp', -1).to_list(length=None)
-
+        messages = [doc async for doc in iter_user_recent_messages(chat_id, user_id, hours)]
         log_debug(f"User {user_id} has {len(messages)} messages in last {hours} hours")
         return messages
 
@@ -362,15 +1023,7 @@ async def get_user_recent_reactions(chat_id: int, user_id: int, hours: int = 24)
         list: List of reaction activities
     """
     try:
-        cutoff_date = datetime.now() - timedelta(hours=hours)
-
-        reactions = await activity_collection.find({
-            'chat_id': chat_id,
-            'user_id': user_id,
-            'activity_type': 'reaction',
-            'timestamp': {'$gte': cutoff_date}
-        }).sort('timestamp', -1).to_list(length=None)
-
+        reactions = [doc async for doc in iter_user_recent_reactions(chat_id, user_id, hours)]
         log_debug(f"User {user_id} has {len(reactions)} reactions in last {hours} hours")
         return reactions
 
@@ -390,14 +1043,7 @@ async def get_all_recent_reactions(chat_id: int, hours: int = 24):
         list: List of all reaction activities
     """
     try:
-        cutoff_date = datetime.now() - timedelta(hours=hours)
-
-        reactions = await activity_collection.find({
-            'chat_id': chat_id,
-            'activity_type': 'reaction',
-            'timestamp': {'$gte': cutoff_date}
-        }).sort('timestamp', -1).to_list(length=None)
-
+        reactions = [doc async for doc in iter_all_recent_reactions(chat_id, hours)]
         log_info(f"Found {len(reactions)} total reactions in last {hours} hours")
         return reactions
 
@@ -416,7 +1062,9 @@ async def check_user_comprehensive(client: Client, chat_id: int, user_id: int, h
         hours: Hours to look back (default 24)
 
     Returns:
-        dict: Comprehensive user activity data
+        dict: Comprehensive user activity data; 'recent_messages' and
+        'recent_reactions' hold only the newest COMPREHENSIVE_SAMPLE_SIZE
+        entries, the full totals are in 'message_count' and 'reaction_count'
     """
     try:
         log_separator(f"COMPREHENSIVE CHECK: User {user_id}")
@@ -430,13 +1078,10 @@ async def check_user_comprehensive(client: Client, chat_id: int, user_id: int, h
             user_name = f"User {user_id}"
             log_warning(f"Could not fetch user info for {user_id}")
 
+        cutoff_date = datetime.now() - timedelta(hours=hours)
+
         # Check join activity
-        joins = await activity_collection.find({
-            'chat_id': chat_id,
-            'user_id': user_id,
-            'activity_type': 'join',
-            'timestamp': {'$gte': datetime.now() - timedelta(hours=hours)}
-        }).to_list(length=None)
+        joins = [doc async for doc in stream_activity(chat_id, cutoff_date, user_id=user_id, activity_type='join')]
 
         if joins:
             join_time = joins[0]['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
@@ -444,13 +1089,14 @@ async def check_user_comprehensive(client: Client, chat_id: int, user_id: int, h
         else:
             log_info("No recent join recorded (may be old member)")
 
-        # Check messages
-        messages = await get_user_recent_messages(chat_id, user_id, hours)
-        log_info(f"Recent messages: {len(messages)}")
+        # Check messages and reactions: count them all, keep only the newest few
+        message_count = await count_activity(chat_id, cutoff_date, user_id=user_id, activity_type='message')
+        messages = await _take(iter_user_recent_messages(chat_id, user_id, hours), COMPREHENSIVE_SAMPLE_SIZE)
+        log_info(f"Recent messages: {message_count}")
 
-        # Check reactions
-        reactions = await get_user_recent_reactions(chat_id, user_id, hours)
-        log_info(f"Recent reactions: {len(reactions)}")
+        reaction_count = await count_activity(chat_id, cutoff_date, user_id=user_id, activity_type='reaction')
+        reactions = await _take(iter_user_recent_reactions(chat_id, user_id, hours), COMPREHENSIVE_SAMPLE_SIZE)
+        log_info(f"Recent reactions: {reaction_count}")
 
         # Get activity stats
         stats = await get_user_activity_stats(chat_id, user_id, days=7)
@@ -468,6 +1114,8 @@ async def check_user_comprehensive(client: Client, chat_id: int, user_id: int, h
             'recent_joins': joins,
             'recent_messages': messages,
             'recent_reactions': reactions,
+            'message_count': message_count,
+            'reaction_count': reaction_count,
             'stats': stats
         }
 
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import helper.activity_buffer as activity_buffer
+from helper.activity_buffer import ActivityRingBuffer, record_activity, get_buffer_for, buffer_memory_usage
+
+
+@pytest.fixture(autouse=True)
+def buffers(monkeypatch):
+    monkeypatch.setattr(activity_buffer, '_buffers', {})
+    # Coverage starts well before the windows used below
+    monkeypatch.setattr(activity_buffer, '_started', datetime.now().timestamp() - 3600)
+
+
+def test_ring_buffer_keeps_the_newest_entries():
+    buffer = ActivityRingBuffer(-100, 3, coverage_start=0.0)
+    for second in range(5):
+        buffer.append(1000.0 + second, second, 'message' if second % 2 == 0 else 'reaction')
+    assert [doc['user_id'] for doc in buffer.query(0.0)] == [4, 3, 2]
+    assert buffer.count(0.0, activity_type='reaction') == 1
+    assert buffer.count(0.0, activity_type='unknown') == 0
+    # The overwritten entries make older windows unanswerable
+    assert buffer.covers(1002.5) and not buffer.covers(1001.0)
+
+
+def test_reads_for_unknown_chats_allocate_nothing():
+    cutoff = datetime.now() - timedelta(minutes=1)
+    view = get_buffer_for(-100, cutoff)
+    assert view and view.query(cutoff.timestamp()) == [] and view.count(cutoff.timestamp()) == 0
+    assert buffer_memory_usage()['chats'] == 0
+
+
+def test_writes_create_the_buffer():
+    now = datetime.now()
+    record_activity(-100, 7, 'join', now)
+    view = get_buffer_for(-100, now - timedelta(minutes=1))
+    assert [doc['activity_type'] for doc in view.query(0.0, user_id=7)] == ['join']
+    assert buffer_memory_usage()['chats'] == 1
+
+
+def test_windows_before_startup_go_to_the_database(monkeypatch):
+    monkeypatch.setattr(activity_buffer, '_started', datetime.now().timestamp() - 600)
+    assert get_buffer_for(-100, datetime.now() - timedelta(minutes=30)) is None
+    assert get_buffer_for(-100, datetime.now() - timedelta(days=1)) is None
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import helper.utils as utils
+
+
+class _Cursor:
+    def __init__(self, documents, reads):
+        self.documents = documents
+        self.reads = reads
+        self.sorted_by = None
+        self.batch = None
+
+    def sort(self, field, direction):
+        self.sorted_by = (field, direction)
+        return self
+
+    def batch_size(self, size):
+        self.batch = size
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.documents:
+            self.reads.append(doc['user_id'])
+            yield doc
+
+
+class _Activity:
+    """user_activity returning `count` documents for any query"""
+
+    def __init__(self, count: int):
+        self.documents = [{'user_id': user_id, 'activity_type': 'join'} for user_id in range(count)]
+        self.reads = []
+        self.finds = []
+
+    def find(self, query, projection):
+        cursor = _Cursor(self.documents, self.reads)
+        self.finds.append((query, projection, cursor))
+        return cursor
+
+    async def count_documents(self, query):
+        self.finds.append((query, None, None))
+        return len(self.documents)
+
+
+@pytest.fixture
+def activity(monkeypatch):
+    collection = _Activity(50)
+    monkeypatch.setattr(utils, 'activity_collection', collection)
+    # Windows too old for the in-memory buffer
+    monkeypatch.setattr(utils, 'get_buffer_for', lambda chat_id, cutoff: None)
+    return collection
+
+
+def test_stream_reads_projected_batches_newest_first(activity):
+    async def run():
+        return [doc async for doc in utils.iter_user_recent_messages(-100, 7, hours=48)]
+
+    docs = asyncio.run(run())
+    assert len(docs) == 50
+    query, projection, cursor = activity.finds[0]
+    assert query['chat_id'] == -100 and query['user_id'] == 7 and query['activity_type'] == 'message'
+    assert query['timestamp']['$gte'] < datetime.now() - timedelta(hours=47)
+    assert projection == utils.ACTIVITY_FIELDS
+    assert cursor.sorted_by == ('timestamp', -1) and cursor.batch == utils.STREAM_BATCH_SIZE
+
+
+def test_take_stops_reading_at_the_limit(activity):
+    docs = asyncio.run(utils._take(utils.iter_recent_joins(-100), 5))
+    assert [doc['user_id'] for doc in docs] == [0, 1, 2, 3, 4]
+    assert activity.reads == [0, 1, 2, 3, 4]
+
+
+def test_count_does_not_load_documents(activity):
+    assert asyncio.run(utils.count_activity(-100, datetime.now() - timedelta(days=1), activity_type='reaction')) == 50
+    assert activity.reads == []
+    assert activity.finds[0][0]['activity_type'] == 'reaction'
+
+
+def test_short_windows_come_from_the_buffer(activity, monkeypatch):
+    class Buffer:
+        def query(self, since, user_id=None, activity_type=None, limit=None):
+            return [{'user_id': user_id, 'activity_type': activity_type}]
+
+    monkeypatch.setattr(utils, 'get_buffer_for', lambda chat_id, cutoff: Buffer())
+
+    async def run():
+        return [doc async for doc in utils.iter_user_recent_reactions(-100, 7, hours=1)]
+
+    assert asyncio.run(run()) == [{'user_id': 7, 'activity_type': 'reaction'}]
+    assert activity.finds == []
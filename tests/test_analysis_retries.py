@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import helper.utils as utils
+import helper.scanner as scanner
+from helper.channel_checker import new_analysis_progress
+
+
+class _Retries:
+    """The parts of the analysis_retries collection the retry queue uses"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = self.documents.get(query['user_id'])
+        if doc is None:
+            doc = self.documents[query['user_id']] = {'_id': query['user_id'], 'user_id': query['user_id'],
+                                                      'attempts': 0, **update['$setOnInsert']}
+        doc['attempts'] += update['$inc']['attempts']
+        doc.update(update['$set'])
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        doc = self.documents.get(query.get('_id', query.get('user_id')))
+        if doc is not None and doc.get('status', 'pending') == query.get('status', doc.get('status', 'pending')):
+            doc.update(update['$set'])
+
+    async def delete_one(self, query):
+        self.documents.pop(query['user_id'], None)
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    collection = _Retries()
+    monkeypatch.setattr(utils, 'retries_collection', collection)
+    monkeypatch.setattr(utils, '_retry_users', set())
+    return collection
+
+
+def test_failures_back_off_then_dead_letter(retries, monkeypatch):
+    monkeypatch.setattr(utils, 'random', type('NoJitter', (), {'uniform': staticmethod(lambda a, b: 1.0)}))
+    delays = []
+    for _ in range(utils.RETRY_MAX_ATTEMPTS):
+        before = datetime.now()
+        asyncio.run(utils.enqueue_analysis_retry(-100, 7, "FloodWait"))
+        doc = retries.documents[7]
+        assert doc['status'] == 'pending'
+        delays.append(round((doc['next_attempt_at'] - before).total_seconds()))
+    assert delays == [min(utils.RETRY_BASE_DELAY_SECONDS * 2 ** n, utils.RETRY_MAX_DELAY_SECONDS)
+                      for n in range(utils.RETRY_MAX_ATTEMPTS)]
+
+    asyncio.run(utils.enqueue_analysis_retry(-100, 7, "FloodWait"))
+    assert retries.documents[7]['status'] == 'dead'
+    assert retries.documents[7]['attempts'] == utils.RETRY_MAX_ATTEMPTS + 1
+
+
+def test_flood_wait_is_honored(retries):
+    before = datetime.now()
+    asyncio.run(utils.enqueue_analysis_retry(-100, 7, "FloodWait", retry_after=3600))
+    assert (retries.documents[7]['next_attempt_at'] - before).total_seconds() >= 3600
+
+
+def test_complete_analysis_resolves(retries):
+    asyncio.run(utils.enqueue_analysis_retry(-100, 7, "FloodWait"))
+    assert utils.has_analysis_retry(7)
+    asyncio.run(utils.resolve_analysis_retry(7))
+    assert not utils.has_analysis_retry(7)
+    assert retries.documents == {}
+
+
+def test_claim_only_delays_pending_entries(retries):
+    asyncio.run(utils.enqueue_analysis_retry(-100, 7, "FloodWait"))
+    retries.documents[7]['status'] = 'dead'
+    due = retries.documents[7]['next_attempt_at']
+    asyncio.run(utils.claim_analysis_retry(7, 600))
+    assert retries.documents[7]['next_attempt_at'] == due
+
+
+class _Outcome:
+    """Records what _analysis_done decides for a finished analysis"""
+
+    def __init__(self, monkeypatch, has_retry: bool):
+        self.enqueued, self.resolved = [], []
+        monkeypatch.setattr(scanner, 'has_analysis_retry', lambda user_id: has_retry)
+        monkeypatch.setattr(scanner, 'enqueue_analysis_retry', self._enqueue)
+        monkeypatch.setattr(scanner, 'resolve_analysis_retry', self._resolve)
+
+    async def _enqueue(self, chat_id, user_id, error, retry_after=0):
+        self.enqueued.append((user_id, error, retry_after))
+
+    async def _resolve(self, user_id):
+        self.resolved.append(user_id)
+
+
+def _finish(result=None, exception=None, failures=()):
+    """Run _analysis_done for an analysis of user 7 that ended with the given outcome"""
+    async def run():
+        key = (7, 'matcher')
+        progress = new_analysis_progress(7)
+        progress['failures'].extend(failures)
+        scanner._progress[key] = progress
+        task = asyncio.get_running_loop().create_future()
+        if exception is not None:
+            task.set_exception(exception)
+        else:
+            task.set_result(result)
+        scanner._analysis_done(-100, key, task)
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_transient_failures_requeue(monkeypatch):
+    outcome = _Outcome(monkeypatch, has_retry=False)
+    _finish(result=None, failures=[{'where': 'history', 'error': 'FloodWait: 30', 'retry_after': 30}])
+    assert outcome.enqueued == [(7, 'history: FloodWait: 30', 30)]
+
+
+def test_non_transient_failure_of_a_retry_counts_as_an_attempt(monkeypatch):
+    outcome = _Outcome(monkeypatch, has_retry=True)
+    _finish(result=None)
+    assert len(outcome.enqueued) == 1 and outcome.resolved == []
+
+
+def test_non_transient_failure_without_a_retry_is_not_queued(monkeypatch):
+    outcome = _Outcome(monkeypatch, has_retry=False)
+    _finish(result=None)
+    assert outcome.enqueued == [] and outcome.resolved == []
+
+
+def test_complete_result_resolves_the_retry(monkeypatch):
+    outcome = _Outcome(monkeypatch, has_retry=True)
+    _finish(result=object())
+    assert outcome.resolved == [7] and outcome.enqueued == []
+
+
+def test_exceptions_requeue(monkeypatch):
+    outcome = _Outcome(monkeypatch, has_retry=False)
+    _finish(exception=RuntimeError("boom"))
+    assert outcome.enqueued == [(7, "RuntimeError: boom", 0)]
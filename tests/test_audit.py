@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import helper.audit as audit
+from helper.runtime_config import settings
+
+
+def _member(user_id: int, is_bot: bool = False):
+    user = SimpleNamespace(id=user_id, is_bot=is_bot, is_deleted=False, first_name=f"User{user_id}", last_name=None)
+    return SimpleNamespace(user=user)
+
+
+class _Client:
+    def __init__(self, members, fail_after: int = None):
+        self.members = members
+        self.fail_after = fail_after
+
+    async def get_chat_members(self, chat_id):
+        for index, member in enumerate(self.members):
+            if index == self.fail_after:
+                raise ConnectionError("member list failed")
+            yield member
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        pass
+
+
+class _Budget:
+    def __init__(self, calls_per_minute):
+        self.acquired = []
+
+    async def acquire(self, calls):
+        self.acquired.append(calls)
+
+
+class _Audit:
+    """Stand-ins for the audit's collaborators, recording what it did"""
+
+    def __init__(self, monkeypatch, stored=None, admins=(), whitelisted=(), fresh=()):
+        self.checkpoints, self.scanned, self.budgets = [], [], []
+        self.blocked = set()
+        self.release = None
+
+        async def get_audit(chat_id):
+            return stored
+
+        async def save_checkpoint(chat_id, state, status='running'):
+            self.checkpoints.append((dict(state), status))
+
+        async def get_admin_ids(client, chat_id):
+            return set(admins)
+
+        async def is_whitelisted(chat_id, user_id):
+            return user_id in whitelisted
+
+        async def get_verdict(user_id):
+            return {'timestamp': datetime.now(), 'is_suspicious': False} if user_id in fresh else None
+
+        async def scan_user(client, chat_id, user_id, user_name, source):
+            self.scanned.append(user_id)
+            if user_id in self.blocked:
+                await self.release.wait()
+            return SimpleNamespace(is_suspicious=user_id % 2 == 1)
+
+        def budget(calls_per_minute):
+            self.budgets.append(_Budget(calls_per_minute))
+            return self.budgets[-1]
+
+        for name, value in (('get_audit', get_audit), ('_save_checkpoint', save_checkpoint),
+                            ('get_admin_ids', get_admin_ids), ('is_whitelisted', is_whitelisted),
+                            ('get_verdict', get_verdict), ('scan_user', scan_user), ('ApiBudget', budget)):
+            monkeypatch.setattr(audit, name, value)
+        monkeypatch.setattr(audit, 'AUDIT_CHECKPOINT_EVERY', 2)
+
+    def block(self, *user_ids):
+        self.blocked.update(user_ids)
+        self.release = asyncio.Event()
+
+
+def test_fresh_audit_scans_every_member(monkeypatch):
+    recorded = _Audit(monkeypatch)
+    asyncio.run(audit.run_audit(_Client([_member(i) for i in range(10)]), -100))
+    assert sorted(recorded.scanned) == list(range(10))
+    state, status = recorded.checkpoints[-1]
+    assert status == 'finished'
+    assert (state['position'], state['processed'], state['scanned'], state['flagged']) == (10, 10, 10, 5)
+
+
+def test_resume_skips_members_before_the_checkpoint(monkeypatch):
+    stored = {'status': 'stopped', 'position': 6, 'processed': 6, 'scanned': 4, 'skipped': 2, 'flagged': 1}
+    recorded = _Audit(monkeypatch, stored=stored)
+    asyncio.run(audit.run_audit(_Client([_member(i) for i in range(10)]), -100))
+    assert sorted(recorded.scanned) == [6, 7, 8, 9]
+    state, status = recorded.checkpoints[-1]
+    assert status == 'finished'
+    assert (state['position'], state['processed'], state['scanned'], state['flagged']) == (10, 10, 8, 3)
+
+
+def test_budget_is_charged_for_scanned_members_only(monkeypatch):
+    recorded = _Audit(monkeypatch, admins={1}, whitelisted={2}, fresh={3})
+    members = [_member(0, is_bot=True)] + [_member(i) for i in range(1, 6)]
+    asyncio.run(audit.run_audit(_Client(members), -100))
+    assert sorted(recorded.scanned) == [4, 5]
+    assert recorded.budgets[0].acquired == [settings().get('SCAN_ESTIMATED_API_CALLS')] * 2
+    state, _ = recorded.checkpoints[-1]
+    assert (state['scanned'], state['skipped']) == (2, 4)
+
+
+def test_stopping_checkpoints_the_oldest_unfinished_member(monkeypatch):
+    monkeypatch.setattr(audit, 'AUDIT_CONCURRENCY', 4)
+    recorded = _Audit(monkeypatch)
+
+    async def run():
+        recorded.block(3, 4, 5, 6)
+        task = asyncio.create_task(audit.run_audit(_Client([_member(i) for i in range(10)]), -100))
+        while len(recorded.scanned) < 7:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The blocked scans were cancelled rather than left running
+        assert len(asyncio.all_tasks()) == 1
+
+    asyncio.run(run())
+    state, status = recorded.checkpoints[-1]
+    assert status == 'stopped'
+    assert state['position'] == 3
+    assert state['processed'] == 3
+
+
+def test_failed_member_list_cancels_running_scans(monkeypatch):
+    recorded = _Audit(monkeypatch)
+
+    async def run():
+        recorded.block(1)
+        await audit.run_audit(_Client([_member(i) for i in range(5)], fail_after=3), -100)
+        assert len(asyncio.all_tasks()) == 1
+
+    asyncio.run(run())
+    state, status = recorded.checkpoints[-1]
+    # Resumable, from the first member whose scan had not finished
+    assert status == 'running'
+    assert state['position'] == 0
@@ -0,0 +1,61 @@
+import random
+
+from helper.avatar_hash import MultiIndexHash, AvatarBlocklist, hamming
+
+
+def _flip(value: int, bits: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(7)
+    index = MultiIndexHash()
+    stored = [rng.getrandbits(64) for _ in range(2000)]
+    # Near duplicates, as reused avatars produce
+    stored += [_flip(value, rng.randint(1, 8), rng) for value in stored[:200]]
+    for value in stored:
+        index.add(value, value)
+
+    for query in stored[:50] + [rng.getrandbits(64) for _ in range(50)]:
+        for radius in (0, 3, 8, 11):
+            expected = sorted((hamming(query, value), value) for value in set(stored)
+                              if hamming(query, value) <= radius)
+            assert sorted(index.search(query, radius)) == expected
+
+
+def test_results_are_closest_first():
+    index = MultiIndexHash()
+    index.add(0b1111, 'four')
+    index.add(0b1, 'one')
+    index.add(0, 'zero')
+    assert [value for _, value in index.search(0, 4)] == ['zero', 'one', 'four']
+
+
+def test_add_replaces_and_remove_forgets():
+    index = MultiIndexHash()
+    index.add(12345, 'old')
+    index.add(12345, 'new')
+    assert len(index) == 1
+    assert index.search(12345, 0) == [(0, 'new')]
+
+    assert index.remove(12345)
+    assert not index.remove(12345)
+    assert len(index) == 0
+    assert index.search(12345, 10) == []
+    assert all(not table for table in index._tables)
+
+
+def test_blocklist_needs_both_hashes_close():
+    rng = random.Random(3)
+    phash, dhash = rng.getrandbits(64), rng.getrandbits(64)
+    blocklist = AvatarBlocklist()
+    blocklist.add(phash, dhash, "spam network")
+
+    assert blocklist.match(_flip(phash, 4, rng), _flip(dhash, 4, rng), 10, 10) == "spam network"
+    assert blocklist.match(_flip(phash, 4, rng), _flip(dhash, 20, rng), 10, 10) is None
+    assert blocklist.match(_flip(phash, 20, rng), dhash, 10, 10) is None
+
+    assert blocklist.remove(phash)
+    assert blocklist.match(phash, dhash, 10, 10) is None
@@ -0,0 +1,101 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+import helper.channel_scoring as channel_scoring
+from helper.channel_scoring import (
+    ChannelFeatures, feature_matrix, score_nsfw, score_structure, train_model, load_model, SMALL_BATCH
+)
+from helper.runtime_config import settings
+
+
+def _channels(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    records = []
+    for channel_id in range(count):
+        checked = rng.choice((0, 10, 20))
+        records.append(ChannelFeatures(
+            channel_id,
+            title_keywords=rng.sample(('xxx', 'nsfw', '18+'), rng.randint(0, 2)),
+            description_keywords=rng.sample(('onlyfans', 'adult'), rng.randint(0, 1)),
+            protected=rng.random() < 0.3,
+            history_checked=checked,
+            media_messages=rng.randint(0, checked),
+            keyword_messages=rng.randint(0, checked // 2),
+            members_count=rng.choice((0, 50, 500, 5000)),
+            reacted_messages=rng.randint(0, 5),
+            avg_reactions=rng.choice((0.0, 10.0, 400.0)),
+            recent_joins=rng.randint(0, 300)
+        ))
+    return records
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    monkeypatch.setitem(settings().values, 'CHANNEL_SCORE_MODEL', None)
+    monkeypatch.setitem(settings().values, 'CHANNEL_FEATURE_LOG', None)
+
+
+def test_batched_rules_match_per_channel_scoring(rules):
+    records = _channels(200)
+    batched = score_nsfw(records)
+    one_by_one = [verdict for record in records for verdict in score_nsfw([record])]
+    assert [v.to_tuple() for v in batched] == [v.to_tuple() for v in one_by_one]
+    assert any(v.is_nsfw for v in batched) and not all(v.is_nsfw for v in batched)
+
+
+def test_batched_structure_matches_small_batches():
+    records = _channels(SMALL_BATCH * 4, seed=9)
+    small = [result for start in range(0, len(records), SMALL_BATCH - 1)
+             for result in score_structure(records[start:start + SMALL_BATCH - 1])]
+    assert score_structure(records) == small
+
+
+def test_feature_rows():
+    record = ChannelFeatures(1, ('xxx',), (), True, history_checked=10, media_messages=4,
+                             keyword_messages=2, members_count=40, recent_joins=20)
+    row = record.to_row()
+    assert row['nsfw_ratio'] == 0.6 and row['high_nsfw_ratio'] == 1.0 and row['moderate_nsfw_ratio'] == 0.0
+    assert row['low_members'] == 1.0 and row['rapid_growth'] == 1.0
+    assert feature_matrix([]).shape == (0, len(channel_scoring.FEATURES))
+
+
+def test_trained_model_scores_batches(tmp_path, monkeypatch):
+    records = _channels(300, seed=11)
+    matrix = feature_matrix(records)
+    labels = (matrix[:, channel_scoring._COLUMN['nsfw_ratio']] > 0.5).astype(int)
+    model = train_model(matrix, labels, features=('nsfw_ratio', 'protected'), epochs=500)
+    assert model['training_accuracy'] > 0.95
+
+    path = tmp_path / 'model.json'
+    path.write_text(json.dumps(model))
+    monkeypatch.setitem(settings().values, 'CHANNEL_SCORE_MODEL', str(path))
+    monkeypatch.setitem(settings().values, 'CHANNEL_FEATURE_LOG', None)
+    verdicts = score_nsfw(records)
+    agreement = np.mean([verdict.is_nsfw == bool(label) for verdict, label in zip(verdicts, labels)])
+    assert agreement > 0.95
+
+
+def test_unusable_model_is_reported_once_per_change(tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr(channel_scoring, 'log_error', errors.append)
+    monkeypatch.setattr(channel_scoring, '_model_cache', {})
+    path = tmp_path / 'model.json'
+
+    assert load_model(str(path)) is None
+    assert load_model(str(path)) is None
+    assert len(errors) == 1
+
+    path.write_text(json.dumps({'features': ['unknown_feature']}))
+    assert load_model(str(path)) is None
+    assert load_model(str(path)) is None
+    assert len(errors) == 2
+
+    model = train_model(np.eye(len(channel_scoring.FEATURES))[:2], [0, 1], features=('title_hits',), epochs=10)
+    path.write_text(json.dumps(model))
+    os.utime(path, (1, 1))
+    assert load_model(str(path))['features'] == ['title_hits']
+    assert len(errors) == 2
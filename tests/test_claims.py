@@ -0,0 +1,170 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import helper.claims as claims
+from helper.claims import acquire_claim, finish_claim
+from helper.models import ProfileAnalysis
+from helper.runtime_config import settings
+
+KEY_FIELDS = ('chat_id', 'user_id', 'event')
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if '$lte' in condition and not (value is not None and value <= condition['$lte']):
+                return False
+            if '$exists' in condition and (field in doc) != condition['$exists']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Claims:
+    """moderation_claims with its unique (chat_id, user_id, event) index"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def _doc(self, query):
+        doc = self.documents.get(tuple(query[field] for field in KEY_FIELDS))
+        return doc if doc is not None and _matches(doc, query) else None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        key = tuple(query[field] for field in KEY_FIELDS)
+        doc = self._doc(query)
+        if doc is None:
+            if key in self.documents:
+                raise DuplicateKeyError("E11000 duplicate key")
+            self.documents[key] = {field: query[field] for field in KEY_FIELDS}
+            self.documents[key].update(update['$set'])
+            return None
+        before = dict(doc)
+        doc.update(update['$set'])
+        for field in update.get('$unset', {}):
+            doc.pop(field, None)
+        return before
+
+    async def find_one(self, query, projection=None):
+        return self._doc(query)
+
+    async def update_one(self, query, update):
+        doc = self._doc(query)
+        if doc is not None:
+            doc.update(update['$set'])
+        return SimpleNamespace(matched_count=int(doc is not None))
+
+    async def delete_one(self, query):
+        doc = self._doc(query)
+        if doc is not None:
+            del self.documents[tuple(query[field] for field in KEY_FIELDS)]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    fake = _Claims()
+    monkeypatch.setattr(claims, 'claims_collection', fake)
+    monkeypatch.setattr(claims, 'CLAIM_POLL_SECONDS', 0.01)
+    monkeypatch.setattr(claims, 'claim_stats', {key: 0 for key in claims.claim_stats})
+    monkeypatch.setitem(settings().values, 'CLAIMS_ENABLED', True)
+    return fake
+
+
+def _as(monkeypatch, instance: str):
+    monkeypatch.setattr(claims, 'INSTANCE_ID', instance)
+
+
+def _analysis() -> ProfileAnalysis:
+    return ProfileAnalysis(7, "see @freecrypto", True, ('crypto',), (), (), ('profile', 'bio'), False)
+
+
+def test_second_instance_reuses_the_owners_verdict(collection, monkeypatch):
+    async def run():
+        _as(monkeypatch, 'a')
+        owned = await acquire_claim(-100, 7, 'join')
+        assert owned.owned and owned.coordinated
+
+        _as(monkeypatch, 'b')
+        waiting = asyncio.create_task(acquire_claim(-100, 7, 'join'))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+
+        _as(monkeypatch, 'a')
+        await finish_claim(owned, _analysis(), acted=True, reason="spam")
+        return await waiting
+
+    reused = asyncio.run(run())
+    assert not reused.owned
+    assert reused.result['acted'] and reused.result['instance'] == 'a'
+    assert reused.analysis().bio_keywords == ('crypto',)
+    assert claims.claim_stats['owned'] == 1 and claims.claim_stats['reused'] == 1
+
+
+def test_expired_claim_is_taken_over(collection, monkeypatch):
+    async def run():
+        _as(monkeypatch, 'a')
+        crashed = await acquire_claim(-100, 7, 'message')
+        crashed._renewer.cancel()
+        # 'a' stopped renewing and its lease ran out
+        collection.documents[(-100, 7, 'activity')]['expires_at'] = datetime.now() - timedelta(seconds=1)
+
+        _as(monkeypatch, 'b')
+        claim = await acquire_claim(-100, 7, 'reaction')
+        await finish_claim(claim, _analysis())
+        return claim
+
+    claim = asyncio.run(run())
+    assert claim.owned and claim.event == 'activity'
+    assert collection.documents[(-100, 7, 'activity')]['owner'] == 'b'
+    assert claims.claim_stats['taken_over'] == 1
+
+
+def test_owner_notices_a_lost_claim(collection, monkeypatch):
+    monkeypatch.setattr(claims, 'CLAIM_LEASE_SECONDS', 0.03)
+
+    async def run():
+        _as(monkeypatch, 'a')
+        claim = await acquire_claim(-100, 7, 'join')
+        collection.documents[(-100, 7, 'join')]['owner'] = 'b'
+        await asyncio.wait_for(claim._renewer, 1)
+
+    asyncio.run(run())
+    assert claims.claim_stats['lost'] == 1
+
+
+def test_given_up_claim_is_free_at_once(collection, monkeypatch):
+    async def run():
+        _as(monkeypatch, 'a')
+        await finish_claim(await acquire_claim(-100, 7, 'join'), None)
+        _as(monkeypatch, 'b')
+        return await acquire_claim(-100, 7, 'join')
+
+    claim = asyncio.run(run())
+    assert claim.owned
+    assert claims.claim_stats['taken_over'] == 0
+
+
+def test_unclaimed_sources_and_disabled_claims(collection, monkeypatch):
+    claim = asyncio.run(acquire_claim(-100, 7, 'audit'))
+    assert claim.owned and not claim.coordinated
+
+    monkeypatch.setitem(settings().values, 'CLAIMS_ENABLED', False)
+    claim = asyncio.run(acquire_claim(-100, 7, 'join'))
+    assert claim.owned and not claim.coordinated
+    assert collection.documents == {}
+
+
+def test_unreachable_database_acts_as_owner(collection, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise ConnectionError("no primary")
+
+    monkeypatch.setattr(collection, 'find_one_and_update', fail)
+    claim = asyncio.run(acquire_claim(-100, 7, 'join'))
+    assert claim.owned and not claim.coordinated
+    assert claims.claim_stats['unavailable'] == 1
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import helper.scanner as scanner
+from helper.fair_scheduler import FairScheduler
+from helper.models import ChannelInfo, ChannelFinding, NsfwVerdict, ProfileAnalysis
+from helper.runtime_config import settings
+
+
+def _suspicious(user_id: int) -> ProfileAnalysis:
+    channel = ChannelInfo(-1002, "Free crypto", None, 40, 'personal', 2, 4, 3)
+    finding = ChannelFinding(channel, 'crypto', NsfwVerdict(False, 'low', 0, ()))
+    return ProfileAnalysis(user_id, "", False, (), (channel,), (finding,),
+                           ('profile', 'bio', 'channels', 'nsfw'), False)
+
+
+@pytest.fixture
+def slow_analysis(monkeypatch):
+    """
+    Make analyze_user_profile finish the profile and bio stages, then wait
+
+    Returns a function creating the event that lets the analysis finish; it
+    is created inside the test's event loop.
+    """
+    events = []
+
+    async def analyze(client, user_id, matcher, progress):
+        progress['bio'] = "see @freecrypto"
+        progress['has_bio_mentions'] = True
+        progress['bio_keywords'] = ['crypto']
+        progress['completed_stages'] += ['profile', 'bio']
+        await events[-1].wait()
+        return _suspicious(user_id)
+
+    def release_event() -> asyncio.Event:
+        events.append(asyncio.Event())
+        return events[-1]
+
+    monkeypatch.setattr(scanner, 'analyze_user_profile', analyze)
+    monkeypatch.setattr(scanner, 'scheduler', FairScheduler(2))
+    return release_event
+
+
+def test_deadline_returns_a_partial_verdict_then_the_full_one(slow_analysis):
+    late = []
+
+    async def on_late_result(partial, full):
+        late.append((partial, full))
+
+    async def run():
+        release = slow_analysis()
+        partial = await scanner.analyze_profile(None, -100, 7, deadline=0.05, on_late_result=on_late_result)
+        assert late == []
+        release.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return partial
+
+    partial = asyncio.run(run())
+    assert partial.partial
+    assert partial.completed_stages == ('profile', 'bio')
+    assert partial.has_bio_mentions and partial.is_suspicious
+    assert len(late) == 1
+    assert late[0][0] is partial and not late[0][1].partial
+    assert len(late[0][1].suspicious_channels) == 1
+
+
+def test_analysis_within_the_deadline_is_complete(slow_analysis):
+    async def run():
+        release = slow_analysis()
+        release.set()
+        return await scanner.analyze_profile(None, -100, 7, deadline=5)
+
+    analysis = asyncio.run(run())
+    assert not analysis.partial and len(analysis.suspicious_channels) == 1
+
+
+def test_late_stages_escalate_a_clean_partial_verdict(monkeypatch):
+    monkeypatch.setitem(settings().values, 'AUTO_BAN_SUSPICIOUS_ON_JOIN', True)
+    enforced, recorded = [], []
+
+    async def record_verdict(user_id, is_suspicious):
+        recorded.append((user_id, is_suspicious))
+
+    monkeypatch.setattr(scanner, 'record_verdict', record_verdict)
+    monkeypatch.setattr(scanner, 'enforce_verdict',
+                        lambda client, chat_id, user_id, name, analysis, reason, context: enforced.append(reason))
+
+    partial = ProfileAnalysis(7, "", False, (), (), (), ('profile', 'bio'), True)
+    callback = scanner.late_escalation(None, -100, 7, "Seven", True, "on join")
+    asyncio.run(callback(partial, _suspicious(7)))
+    assert recorded == [(7, True)]
+    assert enforced == ["Suspicious channels detected (1)"]
+
+    # Nothing more happens when the partial verdict was already acted on
+    enforced.clear()
+    asyncio.run(callback(_suspicious(7), _suspicious(7)))
+    assert enforced == []
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from helper.fair_scheduler import FairScheduler
+from helper.runtime_config import settings
+
+
+async def _run_jobs(scheduler: FairScheduler, jobs: list, hold: float = 0) -> tuple:
+    """
+    Queue (chat_id, priority) jobs behind a blocker holding every slot, then let them run
+
+    Returns:
+        tuple: (chat IDs in the order they got a slot, peak concurrent jobs per chat)
+    """
+    order = []
+    running = {}
+    peaks = {}
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.slot(0):
+            await release.wait()
+
+    async def job(chat_id, priority, tag):
+        async with scheduler.slot(chat_id, priority=priority):
+            order.append(tag)
+            running[chat_id] = running.get(chat_id, 0) + 1
+            peaks[chat_id] = max(peaks.get(chat_id, 0), running[chat_id])
+            await asyncio.sleep(hold)
+            running[chat_id] -= 1
+
+    blockers = [asyncio.create_task(blocker()) for _ in range(scheduler.concurrency)]
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(job(chat_id, priority, tag)) for chat_id, priority, tag in jobs]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*blockers, *tasks)
+    return order, peaks
+
+
+def test_chats_take_turns():
+    scheduler = FairScheduler(1)
+    jobs = [(1, False, 1)] * 4 + [(2, False, 2)] * 4
+    order, _ = asyncio.run(_run_jobs(scheduler, jobs))
+    assert order == [1, 2, 1, 2, 1, 2, 1, 2]
+
+
+def test_weights_share_slots(monkeypatch):
+    monkeypatch.setitem(settings().values, 'CHAT_SCHEDULER_WEIGHTS', {1: 2.0})
+    scheduler = FairScheduler(1)
+    jobs = [(1, False, 1)] * 6 + [(2, False, 2)] * 3
+    order, _ = asyncio.run(_run_jobs(scheduler, jobs))
+    assert order == [1, 1, 2, 1, 1, 2, 1, 1, 2]
+
+
+def test_cap_limits_concurrency_of_a_chat(monkeypatch):
+    monkeypatch.setitem(settings().values, 'CHAT_SCHEDULER_CAPS', {1: 1})
+    scheduler = FairScheduler(4)
+    jobs = [(1, False, 1)] * 5 + [(2, False, 2)] * 5
+    _, peaks = asyncio.run(_run_jobs(scheduler, jobs, hold=0.01))
+    assert peaks[1] == 1
+    assert peaks[2] > 1
+
+
+def test_priority_jumps_the_chat_queue():
+    scheduler = FairScheduler(1)
+    jobs = [(1, False, 'a'), (1, False, 'b'), (1, True, 'join')]
+    order, _ = asyncio.run(_run_jobs(scheduler, jobs))
+    assert order == ['join', 'a', 'b']
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        scheduler = FairScheduler(1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot(1):
+                await release.wait()
+
+        async def waiter():
+            async with scheduler.slot(2):
+                pass
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        release.set()
+        await held
+
+        # The slot is free again for the next job
+        await asyncio.wait_for(waiter(), timeout=1)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert all(chat['running'] == 0 and chat['queued'] == 0 for chat in stats.values())
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import bson
+
+from helper.models import ChannelInfo, NsfwVerdict, ChannelFinding, ProfileAnalysis
+
+
+def _analysis() -> ProfileAnalysis:
+    plain = ChannelInfo(-1001, "Daily news", "news", 1200, 'bio', 10, 55, 12, 3, ('file', 'unique'))
+    spam = ChannelInfo(-1002, "Free crypto", None, 40, 'personal', 2, 4, 3)
+    return ProfileAnalysis(
+        42, "see @freecrypto", True, ('crypto',), (plain, spam),
+        (ChannelFinding(spam, 'crypto', NsfwVerdict(True, 'high', 9, ('title',))),),
+        ('bio', 'channels'), False, failures=('history: FloodWait',),
+        created_at=datetime(2026, 1, 2, 3, 4, 5), avatar_match="spam network"
+    )
+
+
+def _assert_same(restored: ProfileAnalysis, original: ProfileAnalysis):
+    for name in ('user_id', 'bio', 'has_bio_mentions', 'bio_keywords', 'completed_stages', 'partial',
+                 'failures', 'created_at', 'avatar_match'):
+        assert getattr(restored, name) == getattr(original, name), name
+    assert [c.to_tuple() for c in restored.channels] == [c.to_tuple() for c in original.channels]
+    assert len(restored.suspicious_channels) == 1
+    finding = restored.suspicious_channels[0]
+    # Findings point at the restored channel records rather than copies
+    assert finding.channel is restored.channels[1]
+    assert finding.matched_keyword == 'crypto'
+    assert finding.nsfw.to_tuple() == (True, 'high', 9, ('title',))
+    assert restored.is_suspicious and restored.incomplete
+    assert len(restored.nsfw_channels) == 1
+
+
+def test_profile_analysis_round_trip():
+    original = _analysis()
+    _assert_same(ProfileAnalysis.from_dict(original.to_dict()), original)
+
+
+def test_profile_analysis_survives_bson():
+    original = _analysis()
+    stored = bson.decode(bson.encode({'analysis': original.to_dict()}))['analysis']
+    _assert_same(ProfileAnalysis.from_dict(stored), original)
+
+
+def test_channel_summary_from_stats():
+    stats = {'title': "T", 'username': 'u', 'members_count': None, 'photo': None}
+    reactions = [{'reaction_count': 3}, {'reaction_count': 9}]
+    channel = ChannelInfo.from_stats(-1, stats, reactions, [object()], 'bio')
+    assert (channel.reacted_messages, channel.total_reactions, channel.max_reactions) == (2, 12, 9)
+    assert channel.avg_reactions == 6.0
+    assert channel.recent_joins == 1
+    assert channel.members_count == 0
+    assert ChannelInfo.from_tuple(channel.to_tuple()).to_tuple() == channel.to_tuple()
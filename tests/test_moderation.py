@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pyrogram import errors
+
+import helper.moderation as moderation
+from helper.moderation import ModerationExecutor, decide_action, format_notification
+from helper.runtime_config import settings
+
+
+def _flood_wait(seconds: float) -> errors.FloodWait:
+    error = errors.FloodWait(value=1)
+    error.value = seconds
+    return error
+
+
+class _Client:
+    """Records moderation calls; `failures` maps a method to errors raised by its next calls"""
+
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = failures or {}
+
+    async def _call(self, method, chat_id, user_id):
+        self.calls.append((method, user_id))
+        pending = self.failures.get((method, user_id))
+        if pending:
+            error = pending.pop(0)
+            if isinstance(error, errors.FloodWait):
+                await asyncio.sleep(0)
+            raise error
+
+    async def ban_chat_member(self, chat_id, user_id):
+        await self._call('ban', chat_id, user_id)
+
+    async def unban_chat_member(self, chat_id, user_id):
+        await self._call('unban', chat_id, user_id)
+
+    async def restrict_chat_member(self, chat_id, user_id, permissions):
+        await self._call('restrict', chat_id, user_id)
+
+    async def send_message(self, chat_id, text):
+        self.calls.append(('send_message', text))
+
+
+def _analysis(suspicious: bool = True, nsfw: bool = False):
+    channel = SimpleNamespace(title="Free crypto", channel_id=-1002)
+    finding = SimpleNamespace(channel=channel, matched_keyword='crypto',
+                              nsfw=SimpleNamespace(confidence='high'))
+    return SimpleNamespace(
+        suspicious_channels=[finding] if suspicious else [],
+        nsfw_channels=[finding] if nsfw else [],
+        has_bio_mentions=False, bio_keywords=(), avatar_match=None
+    )
+
+
+@pytest.fixture
+def quiet(monkeypatch):
+    monkeypatch.setitem(settings().values, 'SILENT_MODE', True)
+
+
+async def _drain(executor: ModerationExecutor):
+    while executor._tasks:
+        await asyncio.gather(*list(executor._tasks))
+
+
+def test_flood_wait_releases_the_slot(quiet):
+    client = _Client({('ban', 1): [_flood_wait(0.2)]})
+    executor = ModerationExecutor(concurrency=1, max_retries=2, dedup_seconds=60, batch_seconds=0)
+
+    async def run():
+        executor.submit(client, -100, 1, "One", 'ban', "reason", _analysis())
+        executor.submit(client, -100, 2, "Two", 'ban', "reason", _analysis())
+        await _drain(executor)
+
+    asyncio.run(run())
+    # User 2 is banned while user 1's call waits out its FloodWait
+    assert client.calls == [('ban', 1), ('ban', 2), ('ban', 1)]
+    assert executor.stats['executed'] == 2 and executor.stats['flood_waits'] == 1
+
+
+def test_failed_unban_of_a_kick_is_retried_alone(quiet, monkeypatch):
+    monkeypatch.setattr(moderation, 'UNBAN_RETRY_SECONDS', 0)
+    client = _Client({('unban', 1): [ConnectionError("lost"), ConnectionError("lost")]})
+    executor = ModerationExecutor(concurrency=2, max_retries=3, dedup_seconds=60, batch_seconds=0)
+
+    async def run():
+        assert executor.submit(client, -100, 1, "One", 'kick', "reason", _analysis())
+        await _drain(executor)
+        # Still deduplicated: the kick itself succeeded
+        assert not executor.submit(client, -100, 1, "One", 'kick', "reason", _analysis())
+
+    asyncio.run(run())
+    assert client.calls == [('ban', 1), ('unban', 1), ('unban', 1), ('unban', 1)]
+    assert executor.stats['executed'] == 1 and executor.stats['failed'] == 0
+    assert executor.stats['unbans_failed'] == 0
+
+
+def test_unban_retries_give_up(quiet, monkeypatch):
+    monkeypatch.setattr(moderation, 'UNBAN_RETRY_SECONDS', 0)
+    client = _Client({('unban', 1): [ConnectionError("lost")] * 3})
+    executor = ModerationExecutor(concurrency=2, max_retries=2, dedup_seconds=60, batch_seconds=0)
+
+    async def run():
+        executor.submit(client, -100, 1, "One", 'kick', "reason", _analysis())
+        await _drain(executor)
+
+    asyncio.run(run())
+    assert [call for call in client.calls if call[0] == 'unban'] == [('unban', 1)] * 3
+    assert executor.stats['executed'] == 1 and executor.stats['unbans_failed'] == 1
+
+
+def test_failed_action_can_be_retried(quiet):
+    client = _Client({('ban', 1): [errors.ChatAdminRequired()]})
+    executor = ModerationExecutor(concurrency=1, max_retries=0, dedup_seconds=60, batch_seconds=0)
+
+    async def run():
+        executor.submit(client, -100, 1, "One", 'ban', "reason", _analysis())
+        await _drain(executor)
+        assert executor.submit(client, -100, 1, "One", 'ban', "reason", _analysis())
+        await _drain(executor)
+
+    asyncio.run(run())
+    assert executor.stats['failed'] == 1 and executor.stats['executed'] == 1
+
+
+def test_notifications_are_batched(monkeypatch):
+    monkeypatch.setitem(settings().values, 'SILENT_MODE', False)
+    client = _Client()
+    executor = ModerationExecutor(concurrency=2, max_retries=0, dedup_seconds=60, batch_seconds=0.01)
+
+    async def run():
+        executor.submit(client, -100, 1, "One", 'ban', "reason", _analysis())
+        executor.submit(client, -100, 2, "Two", 'mute', "reason", _analysis())
+        await _drain(executor)
+
+    asyncio.run(run())
+    messages = [text for method, text in client.calls if method == 'send_message']
+    assert len(messages) == 1
+    assert messages[0].startswith("**🚫 2 users have been banned or muted:**")
+
+
+def test_single_notification_names_the_example_channel():
+    text = format_notification([{'user_id': 1, 'full_name': "One", 'action_text': 'kicked', 'reason': "spam",
+                                 'context': "on join", 'suspicious_count': 1, 'example': "Free crypto"}])
+    assert "has been kicked on join" in text and "**Example:** Free crypto" in text
+
+
+def test_suspicious_auto_ban_switch(monkeypatch):
+    monkeypatch.setitem(settings().values, 'AUTO_BAN_SUSPICIOUS', False)
+    monkeypatch.setitem(settings().values, 'AUTO_BAN_SUSPICIOUS_ON_JOIN', True)
+    assert decide_action(_analysis(), -100, on_join=False) == (False, "")
+    assert decide_action(_analysis(), -100, on_join=True)[0]
+
+    monkeypatch.setitem(settings().values, 'AUTO_BAN_SUSPICIOUS', True)
+    assert decide_action(_analysis(), -100, on_join=False)[0]
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import helper.overload as overload
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """Overload state driven only by the pending analyses count, with fast sampling"""
+    monkeypatch.setattr(overload, '_state', {
+        'level': 0, 'lag_ms': 0.0, 'api_calls': 0, 'pending_analyses': 0, 'transitions': 0,
+        'shed': {'message': 0, 'reaction': 0, 'nsfw_history': 0},
+    })
+    monkeypatch.setattr(overload, 'OVERLOAD_SAMPLE_SECONDS', 0.001)
+    monkeypatch.setattr(overload, 'OVERLOAD_RECOVERY_SECONDS', 0.03)
+    monkeypatch.setattr(overload, 'OVERLOAD_LAG_MS', [1e9, 2e9, 3e9])
+    monkeypatch.setattr(overload, 'OVERLOAD_API_CALLS', [10 ** 6] * 3)
+    monkeypatch.setattr(overload, 'OVERLOAD_PENDING_ANALYSES', [10, 20, 30])
+    debug_logging = []
+    monkeypatch.setattr(overload, 'set_debug_logging', debug_logging.append)
+    return debug_logging
+
+
+async def _wait_for_level(level: int, timeout: float = 2.0):
+    async def reached():
+        while overload.overload_level() != level:
+            await asyncio.sleep(0.001)
+    await asyncio.wait_for(reached(), timeout)
+
+
+def test_signal_levels():
+    assert [overload._signal_level(value, [10, 20, 30]) for value in (0, 10, 25, 99)] == [0, 1, 2, 3]
+
+
+def test_shedding_by_level(monitor):
+    overload._state['level'] = 1
+    assert not overload.allow_scan('message') and overload.allow_scan('reaction')
+    assert overload.allow_nsfw_history()
+    overload._state['level'] = 3
+    assert not overload.allow_scan('reaction') and not overload.allow_nsfw_history()
+    # Joins are never shed
+    assert overload.allow_scan('join')
+    assert overload.overload_stats()['shed'] == {'message': 1, 'reaction': 1, 'nsfw_history': 1}
+
+
+def test_escalates_at_once_and_recovers_one_level_at_a_time(monitor):
+    pending = [0]
+    levels = []
+
+    async def run():
+        task = asyncio.create_task(overload.run_overload_monitor(lambda: pending[0]))
+        pending[0] = 35
+        await _wait_for_level(3)
+        levels.append(overload.overload_level())
+        assert overload._state['transitions'] == 1  # Straight to level 3
+
+        pending[0] = 0
+        for level in (2, 1, 0):
+            await _wait_for_level(level)
+            levels.append(level)
+        task.cancel()
+
+    asyncio.run(run())
+    assert levels == [3, 2, 1, 0]
+    assert overload._state['transitions'] == 4
+    # Debug logging is off while overloaded and back on at level 0
+    assert monitor == [False, False, False, True]
+
+
+def test_recovery_waits_for_a_calm_period(monitor, monkeypatch):
+    monkeypatch.setattr(overload, 'OVERLOAD_RECOVERY_SECONDS', 60)
+    pending = [25]
+
+    async def run():
+        task = asyncio.create_task(overload.run_overload_monitor(lambda: pending[0]))
+        await _wait_for_level(2)
+        pending[0] = 0
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert overload.overload_level() == 2
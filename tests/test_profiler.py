@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+import helper.profiler as profiler
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(profiler, 'PROFILE_INTERVAL_MS', 2)
+    monkeypatch.setattr(profiler, 'PROFILE_SLOW_CALLBACK_MS', 5)
+    return tmp_path
+
+
+def _spin_for(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def _busy_worker(stop: asyncio.Event):
+    while not stop.is_set():
+        _spin_for(0.01)
+        await asyncio.sleep(0)
+
+
+def test_profile_samples_the_event_loop(profile_dir):
+    async def run():
+        stop = asyncio.Event()
+        worker = asyncio.create_task(_busy_worker(stop))
+        result = await profiler.run_profile(0.3)
+        stop.set()
+        await worker
+        return result
+
+    result = asyncio.run(run())
+    assert not profiler.is_profiling()
+    assert asyncio.events.Handle._run is profiler._original_handle_run
+
+    with open(result['folded']) as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('_spin_for (tests/test_profiler.py' in line for line in lines)
+    assert "_spin_for" in result['text']
+    assert "task _busy_worker" in result['text']
+    assert (profile_dir / result['summary'].rsplit('/', 1)[1]).exists()
+
+
+def test_one_profile_at_a_time_and_early_stop(profile_dir):
+    async def run():
+        first = asyncio.create_task(profiler.run_profile(30))
+        await asyncio.sleep(0.05)
+        assert profiler.is_profiling()
+        assert await profiler.run_profile(1) is None
+        assert profiler.stop_profile()
+        return await asyncio.wait_for(first, 5)
+
+    assert asyncio.run(run())['text']
+    assert not profiler.stop_profile()
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+from pyrogram import errors
+
+import helper.audit as audit
+import helper.reaction_scan as reaction_scan
+from helper.runtime_config import settings
+
+
+def _user(user_id: int, is_bot: bool = False):
+    return SimpleNamespace(id=user_id, is_bot=is_bot, is_deleted=False, first_name=f"User{user_id}", last_name=None)
+
+
+def _message(message_id: int, emojis: tuple):
+    reactions = SimpleNamespace(reactions=[SimpleNamespace(emoji=emoji) for emoji in emojis]) if emojis else None
+    return SimpleNamespace(id=message_id, reactions=reactions)
+
+
+class _Client:
+    """Chat history of 10 messages (newest first) whose reading hits one FloodWait"""
+
+    def __init__(self, reactors: dict):
+        self.reactors = reactors  # (message_id, emoji) -> users
+        self.messages = [_message(message_id, ('👍', '🔥') if message_id % 3 == 0 else ())
+                         for message_id in range(10, 0, -1)]
+        self.history_reads = []
+        self.flooded = False
+
+    async def get_chat_history(self, chat_id, limit, offset_id=0):
+        self.history_reads.append((limit, offset_id))
+        start = 0 if not offset_id else next(i for i, m in enumerate(self.messages) if m.id == offset_id) + 1
+        for index, message in enumerate(self.messages[start:start + limit]):
+            if index == 2 and not self.flooded:
+                self.flooded = True
+                raise errors.FloodWait(value=0)
+            yield message
+
+    async def get_message_reactions(self, chat_id, message_id, emoji):
+        for user in self.reactors.get((message_id, emoji), ()):
+            yield user
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        pass
+
+
+class _Budget:
+    def __init__(self, calls_per_minute):
+        _Budget.acquired = []
+
+    async def acquire(self, calls):
+        _Budget.acquired.append(calls)
+
+
+def test_reaction_scan_reads_history_once_and_scans_each_reactor_once(monkeypatch):
+    admin, bot = _user(1), _user(2, is_bot=True)
+    reactors = {
+        (9, '👍'): [admin, _user(10), _user(11)],
+        (9, '🔥'): [_user(10), bot],
+        (6, '👍'): [_user(11), _user(12)],
+        (3, '🔥'): [_user(13)],
+    }
+    client = _Client(reactors)
+    scanned = []
+
+    async def get_admin_ids(client, chat_id):
+        return {1}
+
+    async def is_whitelisted(chat_id, user_id):
+        return user_id == 13
+
+    async def get_verdict(user_id):
+        return None
+
+    async def scan_user(client, chat_id, user_id, user_name, source):
+        scanned.append((user_id, source))
+        return SimpleNamespace(is_suspicious=user_id == 12)
+
+    monkeypatch.setattr(reaction_scan, 'get_admin_ids', get_admin_ids)
+    monkeypatch.setattr(reaction_scan, 'ApiBudget', _Budget)
+    monkeypatch.setattr(audit, 'is_whitelisted', is_whitelisted)
+    monkeypatch.setattr(audit, 'get_verdict', get_verdict)
+    monkeypatch.setattr(audit, 'scan_user', scan_user)
+
+    state = asyncio.run(reaction_scan.run_reaction_scan(client, -100, 10))
+
+    # The FloodWait resumes after the last message read instead of starting over
+    assert client.history_reads == [(10, 0), (8, 9)]
+    assert state['messages'] == 10 and state['flood_waits'] == 1
+    assert state['with_reactions'] == 3
+    assert (state['reactions'], state['unique']) == (7, 5)
+    assert sorted(scanned) == [(10, 'reaction scan'), (11, 'reaction scan'), (12, 'reaction scan')]
+    assert (state['scanned'], state['skipped'], state['flagged']) == (3, 2, 1)
+    assert _Budget.acquired == [settings().get('SCAN_ESTIMATED_API_CALLS')] * 3
@@ -0,0 +1,41 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+
+import helper.reverify as reverify
+
+
+class _Rollups:
+    def __init__(self, results):
+        self.results = results
+        self.pipelines = []
+
+    def aggregate(self, pipeline, **options):
+        self.pipelines.append(pipeline)
+
+        async def documents():
+            for doc in self.results:
+                yield doc
+        return documents()
+
+
+def test_queue_is_built_from_rollups_with_a_cap(monkeypatch):
+    old = datetime.now() - timedelta(days=2)
+    rollups = _Rollups([
+        {'_id': {'chat_id': -1, 'user_id': 2}, 'last_verified': old},
+        {'_id': {'chat_id': -1, 'user_id': 1}},
+        {'_id': {'chat_id': -2, 'user_id': 3}, 'last_verified': old - timedelta(hours=1)},
+    ])
+    monkeypatch.setattr(reverify, 'rollups_collection', rollups)
+    monkeypatch.setattr(reverify, 'REVERIFY_QUEUE_LIMIT', 500)
+
+    queue = asyncio.run(reverify.build_reverify_queue())
+    # Never verified first, then the oldest verdicts
+    assert [heapq.heappop(queue)[1:] for _ in range(3)] == [(-1, 1), (-2, 3), (-1, 2)]
+    assert reverify.reverify_stats['queued'] == 3
+
+    pipeline = rollups.pipelines[0]
+    cutoff = pipeline[0]['$match']['hour']['$gte']
+    assert (cutoff.minute, cutoff.second, cutoff.microsecond) == (0, 0, 0)
+    assert pipeline[-2] == {'$sort': {'last_verified': 1}}
+    assert pipeline[-1] == {'$limit': 500}
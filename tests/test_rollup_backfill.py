@@ -0,0 +1,69 @@
+import asyncio
+
+import helper.utils as utils
+
+
+class _Cursor:
+    def __init__(self, calls, pipeline):
+        calls.append(pipeline)
+
+    async def to_list(self, length=None):
+        return []
+
+
+class _Activity:
+    def __init__(self):
+        self.pipelines = []
+        self.write_concern = None
+
+    def with_options(self, write_concern=None):
+        self.write_concern = write_concern
+        return self
+
+    def aggregate(self, pipeline):
+        return _Cursor(self.pipelines, pipeline)
+
+
+class _Migrations:
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query):
+        return self.documents.get(query['_id'])
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query['_id']] = update['$set']
+
+
+class _Database:
+    def __init__(self, version):
+        self.version = version
+
+    async def command(self, name):
+        assert name == 'buildInfo'
+        return {'version': '.'.join(map(str, self.version)), 'versionArray': list(self.version) + [0]}
+
+
+def _patch(monkeypatch, version=(7, 0, 2)):
+    activity, migrations = _Activity(), _Migrations()
+    monkeypatch.setattr(utils, 'activity_collection', activity)
+    monkeypatch.setattr(utils, 'migrations_collection', migrations)
+    monkeypatch.setattr(utils, 'db', _Database(version))
+    return activity, migrations
+
+
+def test_backfill_runs_once(monkeypatch):
+    activity, migrations = _patch(monkeypatch)
+    assert asyncio.run(utils.backfill_activity_rollups())
+    assert len(activity.pipelines) == 1
+    assert activity.write_concern == utils.WRITE_CONCERNS['acknowledged']
+    assert utils.ROLLUP_BACKFILL_MIGRATION in migrations.documents
+
+    assert not asyncio.run(utils.backfill_activity_rollups())
+    assert len(activity.pipelines) == 1
+
+
+def test_backfill_waits_for_a_server_with_date_trunc(monkeypatch):
+    activity, migrations = _patch(monkeypatch, version=(4, 4, 18))
+    assert not asyncio.run(utils.backfill_activity_rollups())
+    assert activity.pipelines == [] and migrations.documents == {}
@@ -0,0 +1,96 @@
+import asyncio
+import math
+
+import pytest
+
+import helper.runtime_config as runtime_config
+from helper.runtime_config import parse_setting_value, validate_setting
+
+
+@pytest.mark.parametrize('raw, expected', [('on', True), ('TRUE', True), ('0', False), ('no', False)])
+def test_booleans(raw, expected):
+    assert parse_setting_value('SILENT_MODE', raw) is expected
+
+
+def test_numbers_and_lists():
+    assert parse_setting_value('SCAN_API_CALLS_PER_MINUTE', ' 90 ') == 90
+    assert parse_setting_value('REACTION_SCAN_PROBABILITY', '0.25') == 0.25
+    assert parse_setting_value('SUSPICIOUS_CHANNEL_KEYWORDS', 'crypto, , casino ') == ['crypto', 'casino']
+
+
+def test_action_must_be_known():
+    assert parse_setting_value('AUTO_BAN_ACTION', 'Mute') == 'mute'
+    with pytest.raises(ValueError):
+        parse_setting_value('AUTO_BAN_ACTION', 'nuke')
+
+
+@pytest.mark.parametrize('raw', ['-0.1', '1.5', 'nan'])
+def test_probabilities_stay_in_range(raw):
+    with pytest.raises(ValueError):
+        parse_setting_value('MESSAGE_SCAN_PROBABILITY', raw)
+
+
+def test_scan_budget_cannot_be_negative():
+    assert parse_setting_value('SCAN_API_CALLS_PER_MINUTE', '0') == 0
+    with pytest.raises(ValueError):
+        parse_setting_value('SCAN_API_CALLS_PER_MINUTE', '-5')
+
+
+def test_unconvertible_values_raise():
+    with pytest.raises(ValueError):
+        parse_setting_value('SILENT_MODE', 'maybe')
+    with pytest.raises(ValueError):
+        parse_setting_value('SCAN_API_CALLS_PER_MINUTE', 'lots')
+
+
+def test_validate_stored_values():
+    validate_setting('REACTION_SCAN_PROBABILITY', 1.0)
+    validate_setting('CHECK_NEW_MEMBERS', False)  # Unconstrained
+    with pytest.raises(ValueError):
+        validate_setting('REACTION_SCAN_PROBABILITY', math.inf)
+    with pytest.raises(ValueError):
+        validate_setting('AUTO_BAN_ACTION', 'warn')
+
+
+class _ChatSettings:
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+
+    async def update_one(self, query, update, upsert=False):
+        await asyncio.sleep(0)
+
+    def find(self, query):
+        async def documents():
+            for doc in self.documents:
+                yield doc
+        return documents()
+
+
+@pytest.fixture
+def overrides(monkeypatch):
+    """Keep override changes made by a test out of the shared snapshot"""
+    monkeypatch.setattr(runtime_config, '_current', runtime_config._current)
+    monkeypatch.setattr(runtime_config, 'chat_settings_collection', _ChatSettings())
+    return lambda: runtime_config.settings().chat_overrides
+
+
+def test_concurrent_overrides_are_all_kept(overrides):
+    async def run():
+        await asyncio.gather(
+            runtime_config.set_chat_override(-1, 'SILENT_MODE', True),
+            runtime_config.set_chat_override(-1, 'AUTO_BAN_ACTION', 'mute'),
+            runtime_config.set_chat_override(-2, 'SILENT_MODE', False),
+        )
+        await runtime_config.clear_chat_override(-2, 'SILENT_MODE')
+    asyncio.run(run())
+    assert overrides() == {-1: {'SILENT_MODE': True, 'AUTO_BAN_ACTION': 'mute'}}
+
+
+def test_loading_merges_with_overrides_in_memory(overrides, monkeypatch):
+    asyncio.run(runtime_config.set_chat_override(-1, 'SILENT_MODE', True))
+    stored = [{'chat_id': -1, 'overrides': {'AUTO_BAN_ACTION': 'kick'}},
+              {'chat_id': -2, 'overrides': {'AUTO_BAN_ACTION': 'nuke', 'SILENT_MODE': False}}]
+    monkeypatch.setattr(runtime_config, 'chat_settings_collection', _ChatSettings(stored))
+    asyncio.run(runtime_config.load_chat_overrides())
+    # The invalid stored action is skipped, the rest merged
+    assert overrides() == {-1: {'SILENT_MODE': True, 'AUTO_BAN_ACTION': 'kick'}, -2: {'SILENT_MODE': False}}
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import helper.sampler as sampler
+from helper.sampler import ApiBudget, get_chat_budget, risk_score, should_scan_user
+from helper.runtime_config import settings
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(sampler, 'time', fake)
+    return fake
+
+
+def test_budget_refills_at_its_rate(clock):
+    budget = ApiBudget(60)
+    assert budget.try_acquire(60)
+    assert not budget.try_acquire(1)
+    clock.now += 10
+    assert budget.available() == pytest.approx(10)
+    clock.now += 3600
+    assert budget.available() == 60  # Capped at one minute's worth
+
+
+@pytest.mark.parametrize('calls_per_minute', [0, -5])
+def test_budget_must_be_positive(calls_per_minute):
+    with pytest.raises(ValueError):
+        ApiBudget(calls_per_minute)
+
+
+def test_risk_score():
+    fresh_hours = settings().get('VERDICT_FRESH_MINUTES') / 120
+    stale_hours = settings().get('VERDICT_STALE_HOURS')
+    assert risk_score(None, False, False, 0.1) == 1.0
+    assert risk_score(fresh_hours, True, True, 0.1) == 0.0
+    assert risk_score(stale_hours, False, False, 0.1) == 0.8
+    halfway = risk_score(stale_hours / 2, False, False, 0.1)
+    assert halfway == pytest.approx(0.45)
+    assert risk_score(stale_hours / 2, True, False, 0.1) == pytest.approx(0.95)
+    assert risk_score(stale_hours, True, True, 0.1) == 1.0
+
+
+@pytest.fixture
+def chat(monkeypatch, clock):
+    """Sampling for chat -100 with a known verdict store and no overload shedding"""
+    verdicts = {}
+
+    async def get_verdict(user_id):
+        return verdicts.get(user_id)
+
+    async def recent_joiners(chat_id):
+        return set()
+
+    async def count_activity(chat_id, user_id, minutes):
+        return 0
+
+    monkeypatch.setattr(sampler, 'get_verdict', get_verdict)
+    monkeypatch.setattr(sampler, '_get_recent_joiners', recent_joiners)
+    monkeypatch.setattr(sampler, 'count_recent_user_activity', count_activity)
+    monkeypatch.setattr(sampler, 'allow_scan', lambda source: True)
+    monkeypatch.setattr(sampler, '_budgets', {})
+    monkeypatch.setitem(settings().values, 'ADAPTIVE_SAMPLING', True)
+    monkeypatch.setitem(settings().values, 'SCAN_ESTIMATED_API_CALLS', 5)
+    monkeypatch.setitem(settings().values, 'SCAN_API_CALLS_PER_MINUTE', 10)
+    return verdicts
+
+
+def test_unknown_users_are_scanned_until_the_budget_runs_out(chat):
+    results = [asyncio.run(should_scan_user(-100, user_id, 'message')) for user_id in range(3)]
+    assert results == [True, True, False]
+
+
+def test_fresh_verdicts_are_not_rescanned(chat):
+    chat[7] = {'timestamp': datetime.now(), 'is_suspicious': False}
+    assert not asyncio.run(should_scan_user(-100, 7, 'message'))
+    assert get_chat_budget(-100).available() == 10
+
+
+def test_zero_budget_disables_scanning(chat, monkeypatch):
+    monkeypatch.setitem(settings().values, 'SCAN_API_CALLS_PER_MINUTE', 0)
+    assert get_chat_budget(-100) is None
+    assert not asyncio.run(should_scan_user(-100, 7, 'message'))
+
+
+def test_budget_follows_config_changes(chat, monkeypatch):
+    assert get_chat_budget(-100).capacity == 10
+    monkeypatch.setitem(settings().values, 'SCAN_API_CALLS_PER_MINUTE', 30)
+    assert get_chat_budget(-100).capacity == 30
+
+
+def test_stale_verdicts_are_sampled_by_risk(chat, monkeypatch):
+    chat[7] = {'timestamp': datetime.now() - timedelta(hours=settings().get('VERDICT_STALE_HOURS')),
+               'is_suspicious': False}
+    monkeypatch.setattr(sampler.random, 'random', lambda: 0.79)
+    assert asyncio.run(should_scan_user(-100, 7, 'message'))
+    monkeypatch.setattr(sampler.random, 'random', lambda: 0.81)
+    assert not asyncio.run(should_scan_user(-100, 7, 'message'))
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from helper.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do('user', work, 21) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert results == [42] * 5
+    assert calls == [21]
+    assert flight.stats == {'calls': 5, 'executions': 1, 'shared': 4}
+    assert flight.inflight() == 0
+
+
+def test_different_keys_run_separately():
+    async def work(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.do(1, work, 'a'), flight.do(2, work, 'b')), flight.stats
+
+    results, stats = asyncio.run(scenario())
+    assert results == ['a', 'b']
+    assert stats['executions'] == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.02)
+            return 'done'
+
+        impatient = asyncio.create_task(flight.do('key', work))
+        await started.wait()
+        patient = asyncio.create_task(flight.do('key', work))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(scenario()) == 'done'
+
+
+def test_errors_reach_every_caller_and_the_key_is_retried():
+    attempts = []
+
+    async def work():
+        attempts.append(1)
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            raise RuntimeError("flood")
+        return 'ok'
+
+    async def scenario():
+        flight = SingleFlight()
+        first = await asyncio.gather(flight.do('key', work), flight.do('key', work), return_exceptions=True)
+        return first, flight.running('key'), await flight.do('key', work)
+
+    first, still_running, retried = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert not still_running
+    assert retried == 'ok'
+    assert len(attempts) == 2
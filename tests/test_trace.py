@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import helper.trace as trace
+from helper.models import ChannelInfo, ChannelFinding, NsfwVerdict, ProfileAnalysis
+from helper.overload import track_api_call
+from helper.runtime_config import settings
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setitem(settings().values, 'DECISION_TRACES', True)
+    monkeypatch.setitem(settings().values, 'AUTO_BAN_ACTION', 'ban')
+    monkeypatch.setattr(trace, '_queue', asyncio.Queue(maxsize=2))
+    monkeypatch.setattr(trace, 'trace_stats', {'recorded': 0, 'written': 0, 'dropped': 0})
+    yield trace._queue
+    trace.note_joined_analysis(False)
+
+
+def _traced_analysis() -> ProfileAnalysis:
+    record = trace.new_trace()
+    token = trace.begin_trace(record)
+    try:
+        trace.stage_done(record, 'queue')
+        with track_api_call('GetFullUser'):
+            pass
+        trace.count_api_call('get_chat')
+        trace.count_api_call('get_chat')
+        trace.count_cache_hit('link_cache')
+        trace.stage_done(record, 'profile')
+    finally:
+        trace.end_trace(token)
+    # Outside the analysis nothing is attributed to it
+    trace.count_api_call('send_message')
+
+    channel = ChannelInfo(-1002, "Free crypto", None, 40, 'personal', 2, 4, 3)
+    finding = ChannelFinding(channel, 'crypto', NsfwVerdict(False, 'none', 0, ()))
+    return ProfileAnalysis(7, "", False, (), (channel,), (finding,), ('profile',), True,
+                           trace=trace.snapshot(record))
+
+
+def test_trace_accounts_api_calls_stages_and_cache(queue):
+    trace.note_joined_analysis(True)
+    trace.record_decision(-100, 7, 'join', _traced_analysis(), True, "Suspicious channels detected (1)", latency=0.25)
+    doc = queue.get_nowait()
+
+    assert doc['api_calls'] == {'GetFullUser': 1, 'get_chat': 2} and doc['api_total'] == 3
+    assert [stage for stage, _ in doc['stages']] == ['queue', 'profile']
+    assert doc['cache'] == {'link_cache': 1, 'shared_analysis': 1}
+    assert doc['signals']['findings'] == ["Free crypto: crypto"]
+    assert (doc['action'], doc['partial'], doc['latency_ms']) == ('ban', True, 250.0)
+
+    text = trace.format_trace(doc)
+    assert "**join** → **ban**" in text and "[partial]" in text
+    assert "3 API calls (get_chat 2, GetFullUser 1)" in text
+
+
+def test_full_queue_drops_instead_of_waiting(queue):
+    analysis = _traced_analysis()
+    for _ in range(3):
+        trace.record_decision(-100, 7, 'message', analysis, False, "")
+    assert trace.trace_stats == {'recorded': 2, 'written': 0, 'dropped': 1}
+
+
+def test_traces_can_be_turned_off(queue, monkeypatch):
+    monkeypatch.setitem(settings().values, 'DECISION_TRACES', False)
+    trace.record_decision(-100, 7, 'message', _traced_analysis(), False, "")
+    assert queue.empty()
+
+
+def test_writer_batches_queued_traces(queue, monkeypatch):
+    batches = []
+
+    async def insert(docs):
+        batches.append(docs)
+
+    monkeypatch.setattr(trace, 'insert_decision_traces', insert)
+    analysis = _traced_analysis()
+
+    async def run():
+        trace.record_decision(-100, 7, 'message', analysis, False, "")
+        trace.record_decision(-100, 8, 'message', analysis, False, "")
+        writer = asyncio.create_task(trace.run_trace_writer())
+        await asyncio.sleep(0.01)
+        writer.cancel()
+
+    asyncio.run(run())
+    assert [[doc['user_id'] for doc in batch] for batch in batches] == [[7, 8]]
+    assert trace.trace_stats['written'] == 2
@@ -0,0 +1,98 @@
+import asyncio
+import gzip
+from datetime import datetime, timedelta
+
+import bson
+import pytest
+
+import helper.utils as utils
+import helper.transfer as transfer
+
+NOW = datetime(2026, 5, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def verdict_cache(monkeypatch):
+    cache = {}
+    monkeypatch.setattr(utils, '_verdict_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def written_verdicts(monkeypatch):
+    """Verdict chunks import_data would write to MongoDB"""
+    chunks = []
+
+    async def record(documents):
+        chunks.append(documents)
+
+    monkeypatch.setattr(transfer, '_write_verdicts', record)
+    return chunks
+
+
+def _export_cache(path, verdict_cache, monkeypatch, users: int = 5) -> dict:
+    monkeypatch.setattr(transfer, 'EXPORT_CHUNK_DOCUMENTS', 2)
+    for user_id in range(users):
+        verdict_cache[user_id] = {'timestamp': NOW - timedelta(minutes=user_id), 'is_suspicious': user_id % 2 == 0}
+    return asyncio.run(transfer.export_data(str(path), sections=[]))
+
+
+def test_export_frames(tmp_path, verdict_cache, monkeypatch):
+    path = tmp_path / 'state.bin.gz'
+    result = _export_cache(path, verdict_cache, monkeypatch)
+    assert result['verdict_cache'] == 5
+    assert not (tmp_path / 'state.bin.gz.partial').exists()
+
+    with gzip.open(path, 'rb') as f:
+        frames = list(bson.decode_file_iter(f))
+    header, chunks, trailer = frames[0], frames[1:-1], frames[-1]
+    assert header['format'] == transfer.FORMAT_NAME and header['version'] == transfer.FORMAT_VERSION
+    assert [len(chunk['d']) for chunk in chunks] == [2, 2, 1]
+    assert {chunk['s'] for chunk in chunks} == {transfer.VERDICT_CACHE}
+    assert trailer == {'end': True, 'counts': {transfer.VERDICT_CACHE: 5}}
+    exported = {doc['user_id']: doc for chunk in chunks for doc in chunk['d']}
+    assert exported[2] == {'user_id': 2, 'timestamp': NOW - timedelta(minutes=2), 'is_suspicious': True}
+
+
+def test_import_round_trip_keeps_newer_cached_verdicts(tmp_path, verdict_cache, written_verdicts, monkeypatch):
+    path = tmp_path / 'state.bin.gz'
+    _export_cache(path, verdict_cache, monkeypatch)
+    verdict_cache.clear()
+    verdict_cache[0] = {'timestamp': NOW + timedelta(hours=1), 'is_suspicious': False}
+
+    result = asyncio.run(transfer.import_data(str(path)))
+    assert result[transfer.VERDICT_CACHE] == 5
+    assert result['complete']
+    assert sum(len(chunk) for chunk in written_verdicts) == 5
+    assert len(verdict_cache) == 5
+    assert verdict_cache[0]['is_suspicious'] is False  # Newer than the exported verdict
+    assert verdict_cache[4] == {'timestamp': NOW - timedelta(minutes=4), 'is_suspicious': True}
+
+
+def test_import_of_a_truncated_file_is_incomplete(tmp_path, verdict_cache, written_verdicts, monkeypatch):
+    path = tmp_path / 'state.bin.gz'
+    _export_cache(path, verdict_cache, monkeypatch, users=2000)
+    truncated = tmp_path / 'truncated.bin.gz'
+    truncated.write_bytes(path.read_bytes()[:path.stat().st_size // 2])
+
+    result = asyncio.run(transfer.import_data(str(truncated), refresh_caches=False))
+    assert not result['complete']
+    assert result.get(transfer.VERDICT_CACHE, 0) < 2000
+
+
+def test_import_skips_unselected_sections(tmp_path, verdict_cache, written_verdicts, monkeypatch):
+    path = tmp_path / 'state.bin.gz'
+    _export_cache(path, verdict_cache, monkeypatch)
+    verdict_cache.clear()
+
+    result = asyncio.run(transfer.import_data(str(path), sections=[]))
+    assert result['complete']
+    assert written_verdicts == [] and verdict_cache == {}
+
+
+def test_import_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin.gz'
+    with gzip.open(path, 'wb') as f:
+        f.write(bson.encode({'hello': 'world'}))
+    with pytest.raises(ValueError):
+        asyncio.run(transfer.import_data(str(path)))